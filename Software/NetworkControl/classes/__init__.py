@@ -4,4 +4,21 @@ from .datafile_generator import DatafileGenerator
 from .dataframe_handler import DataFrameHandler
 from .email_client import EmailClient
 from .mysql_client import MySQLClient
-from .data_uploader import DataUploader
\ No newline at end of file
+from .data_uploader import DataUploader
+from .uid_watermark import UIDWatermark
+from .mailbox_watcher import MailboxWatcher
+from .imap_session import IMAPSession
+from .raw_message_store import RawMessageStore
+from .payload_layout import PayloadLayout
+from .rockblock_parser import RockBLOCKParser
+from .parallel_fetcher import ParallelFetcher
+from .local_time_converter import LocalTimeConverter
+from .quarantine_ledger import QuarantineLedger
+from .momsn_tracker import MOMSNTracker
+from .polling_scheduler import PollingScheduler
+from .rockblock_receiver import RockBLOCKReceiver
+from .mailbox_importer import MailboxImporter
+from .time_series_buffer import TimeSeriesBuffer
+from .transmission import Transmission
+from .entry_index import EntryIndex
+from .station_state_store import StationStateStore
\ No newline at end of file
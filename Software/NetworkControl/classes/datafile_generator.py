@@ -15,6 +15,7 @@ sys.path.append(ROOT_DIR)
 
 import global_variables as gv
 import utility as util
+from classes.local_time_converter import LocalTimeConverter, STORAGE_TIMEZONE
 
 #-------------------------------------------------------------
 # Class 
@@ -42,18 +43,31 @@ class DatafileGenerator():
             into a CSV file with the right information to conform with Google Maps API. 
 
             NOTE: When importing the URL of the file, include, on the plugin, the http in the URL.
+
+    The data is read from the StationStateStore (if given) when no mysql_table_df is
+    passed, so the files can be generated without querying MySQL.
+
+    The time_ids are stored with a fixed offset (CST), the table shows them in
+    the local time of the stations instead (CST or CDT).
     """
 
-    def __init__(self):
+    def __init__(self, station_state_store = None):
 
-        # Nothing really
+        # Long-lived store of the stations' recent entries and latest values
+        self.station_state_store = station_state_store
+
+        # Converts the stored time_ids into CST/CDT for display
+        self.local_time_converter = LocalTimeConverter()
 
         return None
 
-    def generate_latest_data_table(self, mysql_table_df):
+    def generate_latest_data_table(self, mysql_table_df = None):
 
         # Generates the table data CSV
 
+        if mysql_table_df is None:
+            mysql_table_df = self.station_state_store.get_latest_dataframes()
+
         self.table_df = {"Station #": [],
                          "Upload Time": [],
                          "Jugs": [],
@@ -70,9 +84,16 @@ class DatafileGenerator():
             first_index = mysql_table_df[sta_i].index[0]
             timezone = mysql_table_df[sta_i].loc[first_index,"timezone"]
             
+            # Showing the stored (fixed offset) time_id in the local time of the station
+            upload_time = first_index
+            if timezone == STORAGE_TIMEZONE:
+                local_times, abbreviations = self.local_time_converter.storage_to_local([first_index])
+                upload_time = pd.Timestamp(local_times[0])
+                timezone = abbreviations[0]
+
             # Generating a time string that includes timezone if timezone is found
-            time_string = str(first_index)
-            if timezone is not None: 
+            time_string = str(upload_time)
+            if timezone not in (None, ""): 
                 time_string += " " + timezone
             
             # Creating the dictionary to later create the dataframe
@@ -91,7 +112,11 @@ class DatafileGenerator():
         
         return None
         
-    def generate_plots(self, mysql_table_df):
+    def generate_plots(self, mysql_table_df = None, size = 30):
+
+        # Plotting the latest size entries of the StationStateStore if no mysql_table_df is given
+        if mysql_table_df is None:
+            mysql_table_df = self.station_state_store.get_dataframes(size)
 
         # Making PNGs: http://queirozf.com/entries/pandas-dataframe-plot-examples-with-matplotlib-pyplot
         # Saving PNGs to PDF: https://stackoverflow.com/a/27327984
@@ -135,10 +160,13 @@ class DatafileGenerator():
 
         return None
 
-    def generate_station_markers(self, mysql_table_df):
+    def generate_station_markers(self, mysql_table_df = None):
 
         # Creating markers data file (CSV)
 
+        if mysql_table_df is None:
+            mysql_table_df = self.station_state_store.get_latest_dataframes()
+
         station_locations = {}
         
         self.markers_df = {"id": [],
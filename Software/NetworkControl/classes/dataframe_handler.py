@@ -3,13 +3,13 @@ import os
 import sys
 
 # Third-Party Imports
-import pandas as pd
+import numpy as np
 
 # Local Imports
 ROOT_DIR = os.path.abspath("../")
 sys.path.append(ROOT_DIR)
 
-import utility as util
+from classes.time_series_buffer import TimeSeriesBuffer
 
 #--------------------------------------------------------------------------
 # Class
@@ -21,6 +21,11 @@ class DataFrameHandler():
     with the possibility of multiple emails per emails (accounts) and creates a single dataframe
     for each email account. Additionally, it removes duplicates and cleans the dataframe. Then
     the DataFrameHandler passes on this clean simple dataframe to the MySQLClient for upload. 
+
+    The entries of the Transmissions of each station are combined in a TimeSeriesBuffer, which
+    keeps them sorted and unique by time_id, instead of appending and cleaning a dataframe email
+    by email. The result is a structured array of entries per station, which the MySQLClient
+    adds to the database directly.
     """
 
     def __init__(self, email_info):
@@ -28,62 +33,49 @@ class DataFrameHandler():
         # Creating some of the primary class attributes
 
         self.email_info = email_info
-        self.all_emails_df = {}
-        self.generate_all_emails_df()
+        self.all_emails_entries = {}
+        self.buffers = {}
+        self.generate_all_emails_entries()
 
         """
-        all_emails structure
-            {"station_email": <dataframe object>}
+        all_emails_entries structure
+            {"station_email": <structured array, latest entry first>}
+
+        buffers structure
+            {"station_email": <TimeSeriesBuffer object>}
 
         """
 
         return None
 
-    def generate_all_emails_df(self):
+    def generate_all_emails_entries(self):
 
-        # Generating all_emails_df, it being the combined emails dataframe
+        # Generating all_emails_entries, it being the combined entries of the emails
 
         for station_email, uids_content in self.email_info.items():
 
-            uid_keys = list(uids_content.keys()) 
-            uid_keys.reverse() # got to reverse since last uids are the latest info
-
-            df = self.email_info[station_email][uid_keys[0]]["dataframe"]
-
-            # Appending emails into a single df
-            for i in range(1,len(uid_keys)):
-                df = df.append(uids_content[uid_keys[i]]["dataframe"])
+            # Merging all the emails at once, the later uids are the latest info so they win
+            time_series_buffer = TimeSeriesBuffer()
+            time_series_buffer.merge_entries(np.concatenate([transmission.entries for transmission in uids_content.values()]))
 
-            # Cleaning and sorting dataframe
-            df = util.sort_and_clean_df(df)
-
-            self.all_emails_df[station_email] = df
+            self.buffers[station_email] = time_series_buffer
+            self.all_emails_entries[station_email] = time_series_buffer.to_entries()
 
         return None
 
-    def trim_to_only_new_entries(self, mysql_table_df):
-
-        self.mysql_table_df = mysql_table_df
+    def trim_to_only_new_entries(self, entry_index):
 
-        #print("Pre-Trimming: {}".format(self.all_emails_df['300234067638620@rockblock.rock7.com'].shape))
-        #print(self.all_emails_df['300234067638620@rockblock.rock7.com'])
+        # Removing the entries that are already in the MySQL database, according to the EntryIndex
 
-        for station_email, mysql_df in self.mysql_table_df.items():
+        for station_email, time_series_buffer in self.buffers.items():
 
-            # Find what is shared between the mysql df and the emails df
-            shared_df_index = mysql_df.index.intersection(self.all_emails_df[station_email].index)
-            shared_df = self.all_emails_df[station_email].loc[shared_df_index]
+            is_known = entry_index.find(station_email, time_series_buffer.time_ids)
 
-            if shared_df.empty is True: # if nothing is shared, then emails df is ready
+            if not is_known.any(): # if nothing is shared, then the entries are ready
                 print("NOTHING SHARED")
-            else: # else, remove the shared from the emails df to upload to mysql server
-                unique_df_index = shared_df.index.symmetric_difference(self.all_emails_df[station_email].index)
-                unique_df = self.all_emails_df[station_email].loc[unique_df_index]
-                unique_df = util.sort_and_clean_df(unique_df)
-                self.all_emails_df[station_email] = unique_df
-
-        #print("Post-Trimming: {}".format(self.all_emails_df['300234067638620@rockblock.rock7.com'].shape))
-        #print(self.all_emails_df['300234067638620@rockblock.rock7.com'])
+            else:
+                time_series_buffer.drop(time_series_buffer.time_ids[is_known])
+                self.all_emails_entries[station_email] = time_series_buffer.to_entries()
 
         return None
 
@@ -98,6 +90,7 @@ if __name__ == "__main__":
 
     import email_client
     import mysql_client
+    import entry_index
 
     # Getting the latest email data frame
     email_client = email_client.EmailClient()
@@ -110,9 +103,10 @@ if __name__ == "__main__":
 
     # MySQL Integration
     mysql_client = mysql_client.MySQLClient()
-    mysql_client.fetch_data(limit="None")
+    entry_index = entry_index.EntryIndex()
+    entry_index.load(mysql_client)
 
     # Testing DataFrame Handler
-    dataframe_handler.trim_to_only_new_entries(mysql_client.mysql_table_df)
+    dataframe_handler.trim_to_only_new_entries(entry_index)
 
     mysql_client.close()
\ No newline at end of file
@@ -1,11 +1,14 @@
 # Library Imports
 import os
 import sys
+import concurrent.futures
+import hashlib
+import base64
+import quopri
 
 # Third-Party Imports
 import imapclient
-import pyzmail
-import pandas as pd
+import numpy as np
 import datetime
 import pytz
 
@@ -15,6 +18,38 @@ sys.path.append(ROOT_DIR)
 
 import global_variables as gv
 import utility as util
+from classes.payload_layout import PHASE_ONE_LAYOUT, get_payload_layout
+from classes.rockblock_parser import RockBLOCKParser, parse_raw_messages
+from classes.local_time_converter import LocalTimeConverter
+from classes.transmission import create_station_transmissions, parse_coordinates
+
+#-------------------------------------------------------------
+# Constants
+
+# Number of UIDs requested within a single FETCH command
+FETCH_CHUNK_SIZE = 100
+
+# Number of UIDs per FETCH command when only the envelopes (senders) are needed
+ENVELOPE_CHUNK_SIZE = 1000
+
+# Most UIDs whose envelopes are read when only the last emails of the stations are
+# needed (e.g. a station that stopped transmitting is not searched for forever)
+LAST_EMAILS_SCAN_LIMIT = 10 * ENVELOPE_CHUNK_SIZE
+
+# Number of emails sent at once to each parsing process
+PARSE_CHUNK_SIZE = 500
+
+# Bytes of the emails' text fetched to read their MOMSN without downloading them
+MOMSN_PEEK_SIZE = 512
+
+# Most missing MOMSNs searched for per station and cycle
+MAX_REFETCH_MOMSNS = 20
+
+# Folder where the processed emails of the INBOX are moved to (Gmail's archive)
+ARCHIVE_FOLDER = '[Gmail]/All Mail'
+
+# Number of UIDs moved out of the INBOX within a single command
+ARCHIVE_CHUNK_SIZE = 1000
 
 #-------------------------------------------------------------
 # Class 
@@ -35,35 +70,68 @@ class EmailClient():
     Then this processed data is passed to the MySQLClient to 
     update the MySQL database containing all the information 
     of the stations.
+
+    The fetched emails can be kept in a RawMessageStore, which then allows
+    the EmailClient to run offline: rebuilding the email_info from the store
+    without connecting to the IMAP server.
     """
 
-    def __init__(self):
+    def __init__(self, imap_session = None, raw_message_store = None, offline = False, quarantine_ledger = None):
 
         # Initializing the primary attributes of the class
 
-        self.imap_client = self.imap_client_setup()
+        # Every fetched email is kept in the RawMessageStore (if given). In offline
+        # mode, the emails are read from the store without connecting to the server
+        self.raw_message_store = raw_message_store
+        self.offline = offline
+
+        # Emails that could not be parsed are quarantined (if a QuarantineLedger
+        # is given) and skipped in the following fetches
+        self.quarantine_ledger = quarantine_ledger
+        self.quarantined_uids = set()
+
+        # UIDs dropped as duplicates, they are already processed
+        self.duplicate_uids = []
+
+        # A long-lived IMAPSession can be reused instead of logging in again
+        if self.offline is True:
+            self.imap_client = None
+        elif imap_session is not None:
+            self.imap_client = imap_session
+        else:
+            self.imap_client = self.imap_client_setup()
+
+        self.station_index = self.generate_station_index()
+        self.station_layouts = {}
+        for water_station in gv.STATION_INFO:
+            self.station_layouts[water_station["email"]] = get_payload_layout(water_station)
+
+        self.local_time_converter = LocalTimeConverter()
+
+        self.folder = None
+        self.uidvalidity = None
         self.email_info = {}
 
         """
         email_info structure
             {"station_email": 
                 {uid: {
-                    "text": str,
-                    "dataframe": {
-                        "time_id": (datetime, ...),
-                        "sensor_1": (int, ...),
-                        "sensor_2": (int, ...),
-                        "sensor_3": (int, ...),
-                        "reference": (int, ...),
-                        "weight_lbs": (int, ...),
-                        "longitude": (float, ...),
-                        "latitude": (float, ...),
-                        "timezone": (str, ...)
-                        }
+                    "raw": bytes
                     }
                 }
             }
 
+        Once parsed, the raw email of each uid is replaced by its Transmission,
+        whose entries are a structured array (the station's entry_dtype):
+            {"station_email":
+                {uid: Transmission(station_email, uid, momsn, entries[
+                        ("time_id", datetime64), ("sensor_1", int), ("sensor_2", int),
+                        ("sensor_3", int), ("reference", int), ("weight_lbs", int),
+                        ("latitude", float), ("longitude", float), ("timezone", str)
+                        ])
+                }
+            }
+
         """
 
         return None
@@ -79,6 +147,84 @@ class EmailClient():
 
         return imap_client
 
+    def generate_station_index(self):
+
+        """
+        Creating an index to find the station of an email by its sender,
+        either with the station's email or its IMEI (the email's local part).
+        """
+
+        station_index = {}
+
+        for water_station in gv.STATION_INFO:
+            station_email = water_station["email"].lower()
+            station_index[station_email] = water_station
+            station_index[station_email.split("@")[0]] = water_station
+
+        return station_index
+
+    def fleet_search_criteria(self):
+
+        # Creating a single search of all the stations: OR FROM a OR FROM b FROM c
+
+        search_criteria = []
+
+        for i, water_station in enumerate(gv.STATION_INFO):
+            if i != len(gv.STATION_INFO) - 1:
+                search_criteria.append('OR')
+            search_criteria += ['FROM', water_station["email"]]
+
+        return search_criteria
+
+    def route_uids_to_stations(self, uids, limit = None):
+
+        """
+        Since the stations' UIDs are fetched with a single search, the UIDs
+        have to be separated by station. The sender of each UID is obtained
+        from the emails' envelopes, which are fetched in chunks.
+
+        If a limit is given, only the last limit UIDs of each station are needed,
+        so the envelopes are read from the newest UIDs down and the routing stops
+        once every station has limit UIDs (or LAST_EMAILS_SCAN_LIMIT UIDs were
+        read), instead of reading the envelope of every email of the folder.
+        """
+
+        station_uids = {}
+        uids = sorted(uids, reverse = limit is not None)
+
+        for i in range(0, len(uids), ENVELOPE_CHUNK_SIZE):
+
+            if limit is not None:
+                if i >= LAST_EMAILS_SCAN_LIMIT:
+                    break
+                if all([len(station_uids.get(water_station["email"], [])) >= limit for water_station in gv.STATION_INFO]):
+                    break
+
+            envelopes = self.imap_client.fetch(uids[i:i + ENVELOPE_CHUNK_SIZE], ['ENVELOPE'])
+
+            for uid, envelope_data in envelopes.items():
+
+                envelope = envelope_data[b'ENVELOPE']
+                if not envelope.from_:
+                    continue
+
+                mailbox = (envelope.from_[0].mailbox or b"").decode().lower()
+                host = (envelope.from_[0].host or b"").decode().lower()
+
+                # Matching by email first, then by IMEI
+                water_station = self.station_index.get(mailbox + "@" + host)
+                if water_station is None:
+                    water_station = self.station_index.get(mailbox)
+                if water_station is None:
+                    continue
+
+                station_uids.setdefault(water_station["email"], []).append(uid)
+
+        for station_email in station_uids.keys():
+            station_uids[station_email].sort()
+
+        return station_uids
+
     def is_there_new_emails(self):
 
         """
@@ -94,33 +240,79 @@ class EmailClient():
 
         return False
 
-    def fetch_uids(self, fetch_type = "Last", last_quantity = 1):
+    def fetch_uids(self, fetch_type = "Last", last_quantity = 1, watermark = None, uidvalidity = None):
 
         """
         Before getting the email's juicy information, we have to get the email's 
         UIDs. We have get "All" of the email's UIDs, the "New" ones, or just the 
         "Last" ones. The "Last" fetch type has the ability of increasing the fetch 
         range of the last email's UIDs with the last_quantity attribute.
+
+        If a UIDWatermark is given, only the UIDs above the station's watermark
+        are searched ("UID n:*"). The highest UID found by the search is staged
+        for every station in the watermark, the caller has to commit it once the
+        data is in MySQL.
+
+        All the stations are searched with a single folder selection and a single
+        "OR FROM ... FROM ..." search, the UIDs are then routed to their stations
+        locally with the station index (email/IMEI) instead of a search per station.
+
+        In offline mode, the UIDs are read from the RawMessageStore, from the
+        emails stored with the given UIDVALIDITY (the latest one by default).
         """
 
+        # Selecting the folder depending on the fetch type
+        folder = get_fetch_folder(fetch_type)
+
+        self.folder = folder
+
+        if self.offline is True:
+            return self.fetch_stored_uids(fetch_type, last_quantity, uidvalidity)
+
+        folder_info = self.imap_client.select_folder(folder)
+        self.uidvalidity = folder_info[b'UIDVALIDITY']
+
+        if watermark is not None: # UIDs are only valid within the same UIDVALIDITY
+            watermark.check_uidvalidity(folder, folder_info[b'UIDVALIDITY'])
+
+        self.load_quarantined_uids()
+
+        # Searching the emails of all the stations at once
+        search_criteria = self.fleet_search_criteria()
+
+        if watermark is not None:
+            last_uids = {}
+            for water_station in gv.STATION_INFO:
+                last_uids[water_station["email"]] = watermark.get(folder, water_station["email"])
+            search_criteria = ['UID', '{}:*'.format(min(last_uids.values()) + 1)] + search_criteria
+
+        all_uids = self.imap_client.search(search_criteria)
+
+        # Only the last emails are used, e.g. the first run or after a UIDVALIDITY reset (no watermark)
+        if fetch_type == "Last":
+            station_uids = self.route_uids_to_stations(all_uids, last_quantity)
+        else:
+            station_uids = self.route_uids_to_stations(all_uids)
+
         for water_station in gv.STATION_INFO:
 
-            # Fetching emails based on selected category
-            if fetch_type == "All":
-                self.imap_client.select_folder('[Gmail]/All Mail')
-                uids = self.imap_client.search(['FROM', water_station["email"]])
+            uids = station_uids.get(water_station["email"], [])
 
-            elif fetch_type == "New":
-                self.imap_client.select_folder("INBOX")
-                uids = self.imap_client.search(["FROM", water_station["email"]])
+            # "n:*" always matches the highest UID of the folder, even if it is below n
+            if watermark is not None:
+                uids = [uid for uid in uids if uid > last_uids[water_station["email"]]]
 
-            elif fetch_type == "Last":
-                self.imap_client.select_folder('[Gmail]/All Mail')
-                uids = self.imap_client.search(['FROM', water_station["email"]])[-1 * last_quantity:]
+                # The search covered every station up to the highest UID found, so even the
+                # stations without emails (or with quarantined ones) move up to it, otherwise
+                # a silent station would keep the searches of the whole fleet starting at its UID
+                if len(all_uids) != 0:
+                    watermark.stage(folder, water_station["email"], max(all_uids))
 
-            # uids need to be in a list
-            if not isinstance(uids, list) and uids:
-                uids = [uids]
+            uids = self.skip_quarantined_uids(uids)
+
+            # Fetching emails based on selected category
+            if fetch_type == "Last":
+                uids = uids[-1 * last_quantity:]
 
             print(uids)
 
@@ -129,151 +321,717 @@ class EmailClient():
 
         return self.email_info
 
-    def fetch_emails_text(self):
+    def iter_uid_windows(self, window_size, checkpoint):
+
+        """
+        Generator for backfills: goes through the entire All Mail folder in windows
+        of window_size UIDs. For each window, the email_info is replaced with only
+        the station emails within the window and the last UID of the window is 
+        yielded, so the caller can process the window and then record it in the 
+        checkpoint (UIDWatermark). Memory stays bounded by the window size, and the
+        windows start after the UIDs already recorded in the checkpoint.
+        """
+
+        self.folder = '[Gmail]/All Mail'
+        folder_info = self.imap_client.select_folder(self.folder)
+        self.uidvalidity = folder_info[b'UIDVALIDITY']
+
+        # If the UIDVALIDITY changed, the backfill has to start all over again
+        checkpoint.check_uidvalidity(self.folder, self.uidvalidity)
+
+        self.load_quarantined_uids()
+
+        # The folder information of a reused session can be old, so asking for UIDNEXT
+        uidnext = self.imap_client.folder_status(self.folder, [b'UIDNEXT'])[b'UIDNEXT']
+
+        start_uid = min([checkpoint.get(self.folder, water_station["email"]) for water_station in gv.STATION_INFO]) + 1
+
+        for window_start in range(start_uid, uidnext, window_size):
+
+            window_end = min(window_start + window_size, uidnext) - 1
+            self.email_info = {}
+
+            search_criteria = ['UID', '{}:{}'.format(window_start, window_end)] + self.fleet_search_criteria()
+            station_uids = self.route_uids_to_stations(self.imap_client.search(search_criteria))
+
+            for station_email, uids in station_uids.items():
+                uids = self.skip_quarantined_uids(uids)
+                if len(uids) != 0:
+                    self.email_info[station_email] = dict(zip(uids,[{} for i in range(len(uids))]))
+
+            yield window_end
+
+        self.email_info = {}
+
+        return None
+
+    def fetch_stored_uids(self, fetch_type, last_quantity, uidvalidity = None):
+
+        # Offline version of fetch_uids, getting the UIDs of the given (or the latest) UIDVALIDITY from the RawMessageStore
+
+        if self.raw_message_store is None:
+            raise RuntimeError("Offline mode requires a RawMessageStore")
+
+        if uidvalidity is None:
+            uidvalidity = self.raw_message_store.latest_uidvalidity(self.folder)
+        self.uidvalidity = uidvalidity
+
+        if self.uidvalidity is None: # Nothing stored for this folder
+            return self.email_info
+
+        station_uids = self.raw_message_store.station_uids(self.folder, self.uidvalidity)
+
+        self.load_quarantined_uids()
+
+        for water_station in gv.STATION_INFO:
+
+            uids = self.skip_quarantined_uids(station_uids.get(water_station["email"], []))
+
+            if fetch_type == "Last":
+                uids = uids[-1 * last_quantity:]
+
+            if len(uids) != 0: # Only creating entries for emails that have uids
+                self.email_info[water_station["email"]] = dict(zip(uids,[{} for i in range(len(uids))]))
+
+        return self.email_info
+
+    def fetch_momsns(self, uids):
+
+        """
+        Getting the MOMSN of the emails without downloading them: only the first
+        MOMSN_PEEK_SIZE bytes of the emails' text are fetched (a partial
+        BODY.PEEK[TEXT]), which include the "MOMSN: n" line. Returns {uid: momsn}.
+        """
+
+        rockblock_parser = RockBLOCKParser()
+        momsns = {}
+        uids = sorted(uids)
+
+        for i in range(0, len(uids), ENVELOPE_CHUNK_SIZE):
+
+            fetch_data = self.imap_client.fetch(uids[i:i + ENVELOPE_CHUNK_SIZE],
+                                                ['BODY.PEEK[TEXT]<0.{}>'.format(MOMSN_PEEK_SIZE)])
+
+            for uid, uid_data in fetch_data.items():
+                for key, text in uid_data.items():
+                    if key.startswith(b'BODY[TEXT]') and text is not None:
+                        momsn = rockblock_parser.find_fields(text)["momsn"]
+                        if momsn is not None:
+                            momsns[uid] = momsn
+
+        return momsns
+
+    def drop_duplicate_emails(self, momsn_tracker):
+
+        """
+        Removing the emails whose MOMSN was already processed (or that are repeated
+        within the fetched emails) from the email_info, before their bodies are
+        downloaded. The emails without a MOMSN are kept and left to the parsing.
+        """
+
+        uids = [uid for uid_content in self.email_info.values() for uid in uid_content.keys()]
+        momsns = self.fetch_momsns(uids)
+
+        for station_email in list(self.email_info.keys()):
+
+            found_momsns = set()
+
+            for uid in sorted(self.email_info[station_email].keys()):
+
+                momsn = momsns.get(uid)
+                if momsn is None:
+                    continue
+
+                if momsn_tracker.is_processed(station_email, momsn) or momsn in found_momsns:
+                    print("SKIPPING UID {} - DUPLICATE MOMSN {}".format(uid, momsn))
+                    del self.email_info[station_email][uid]
+                    self.duplicate_uids.append(uid)
+                else:
+                    found_momsns.add(momsn)
+
+            if len(self.email_info[station_email]) == 0:
+                del self.email_info[station_email]
+
+        return self.email_info
+
+    def fetch_missing_uids(self, momsn_tracker):
+
+        """
+        Searching All Mail for the emails of the missing MOMSNs of each station (up to
+        MAX_REFETCH_MOMSNS, the latest ones), with a single search per station:
+        FROM station OR TEXT "MOMSN: a" TEXT "MOMSN: b". The found UIDs replace the
+        email_info, and each search is counted in the MOMSNTracker.
+        """
+
+        self.folder = '[Gmail]/All Mail'
+        folder_info = self.imap_client.select_folder(self.folder)
+        self.uidvalidity = folder_info[b'UIDVALIDITY']
+        self.email_info = {}
+
+        self.load_quarantined_uids()
+
+        for water_station in gv.STATION_INFO:
+
+            missing_momsns = momsn_tracker.missing(water_station["email"])[-1 * MAX_REFETCH_MOMSNS:]
+
+            if len(missing_momsns) == 0:
+                continue
+
+            search_criteria = ['FROM', water_station["email"]]
+            for i, momsn in enumerate(missing_momsns):
+                if i != len(missing_momsns) - 1:
+                    search_criteria.append('OR')
+                search_criteria += ['TEXT', 'MOMSN: {}'.format(momsn)]
+
+            uids = self.skip_quarantined_uids(sorted(self.imap_client.search(search_criteria)))
+            momsn_tracker.record_refetch_attempt(water_station["email"], missing_momsns)
+
+            print("SEARCHING {} MISSING MOMSNS OF {}: {}".format(len(missing_momsns), water_station["email"], uids))
+
+            if len(uids) != 0:
+                self.email_info[water_station["email"]] = dict(zip(uids,[{} for i in range(len(uids))]))
+
+        return self.email_info
+
+    def archive_processed_emails(self):
+
+        """
+        Moving the processed emails (the parsed ones and the duplicates) out of the
+        INBOX, a chunk of up to ARCHIVE_CHUNK_SIZE UIDs per command, so the "New"
+        search only goes through the emails that were not processed yet. This has
+        to be called only once the data is safely stored in MySQL.
+
+        UID MOVE (RFC 6851) is used if available, which in Gmail archives the
+        emails into All Mail. Otherwise the Gmail \\Inbox label is removed, or as a
+        last resort the emails are copied to the archive folder, flagged as deleted
+        and expunged from the INBOX.
+        Emails of other folders are never moved.
+        """
+
+        if self.folder != "INBOX" or self.offline is True:
+            return []
+
+        uids = [uid for uid_content in self.email_info.values() for uid in uid_content.keys()]
+        uids = sorted(uids + self.duplicate_uids)
+
+        if len(uids) == 0:
+            return uids
+
+        self.imap_client.select_folder(self.folder)
+
+        for i in range(0, len(uids), ARCHIVE_CHUNK_SIZE):
+
+            uids_chunk = uids[i:i + ARCHIVE_CHUNK_SIZE]
+
+            if self.imap_client.has_capability("MOVE"):
+                self.imap_client.move(uids_chunk, ARCHIVE_FOLDER)
+            elif self.imap_client.has_capability("X-GM-EXT-1"):
+                self.imap_client.remove_gmail_labels(uids_chunk, ["\\Inbox"])
+            else:
+                self.imap_client.copy(uids_chunk, ARCHIVE_FOLDER)
+                self.imap_client.delete_messages(uids_chunk)
+                if self.imap_client.has_capability("UIDPLUS"): # Only expunging these UIDs
+                    self.imap_client.expunge(uids_chunk)
+                else:
+                    self.imap_client.expunge()
+
+        print("ARCHIVED {} EMAILS FROM INBOX".format(len(uids)))
+
+        return uids
+
+    def stage_momsns(self, momsn_tracker):
+
+        # Staging the MOMSNs of the parsed emails in the MOMSNTracker
+
+        for station_email, uid_content in self.email_info.items():
+            for uid, transmission in uid_content.items():
+                if transmission.momsn is not None:
+                    momsn_tracker.stage(station_email, transmission.momsn)
+
+        return None
+
+    def load_uids(self, folder, uidvalidity, station_uids):
+
+        # Setting the UIDs to fetch directly, e.g. {"station_email": [uid, ...]}
+
+        self.folder = folder
+        self.uidvalidity = uidvalidity
+        self.email_info = {}
+
+        for station_email, uids in station_uids.items():
+            self.email_info[station_email] = dict(zip(uids,[{} for i in range(len(uids))]))
+
+        return self.email_info
+
+    def load_quarantined_uids(self):
+
+        # Getting the quarantined UIDs of the selected folder from the QuarantineLedger
+
+        if self.quarantine_ledger is not None and self.uidvalidity is not None:
+            self.quarantined_uids = self.quarantine_ledger.quarantined_uids(self.folder, self.uidvalidity)
+
+        return self.quarantined_uids
+
+    def skip_quarantined_uids(self, uids):
+
+        # Removing the quarantined UIDs, keeping the order
+
+        return [uid for uid in uids if uid not in self.quarantined_uids]
+
+    def fetch_emails_text(self, chunk_size = FETCH_CHUNK_SIZE, parallel_fetcher = None):
 
         """
         Now that we have the emails UIDs, now we can obtain the text information
         within the emails. 
+
+        By default, the UIDs are fetched in bulk: chunks of chunk_size UIDs are 
+        requested in a single FETCH command with BODY.PEEK[] (which does not mark
+        the emails as seen) and the responses are then matched back to their 
+        stations. This takes one server round-trip per chunk instead of one per UID,
+        e.g. a backfill of 5000 emails becomes 50 FETCH commands instead of 5000. 
+        As a rough estimate (not a measurement), with a round-trip of 100 ms the
+        per-UID loop would spend more than 8 minutes only waiting on the server
+        while the bulk fetch would wait about 5 seconds, the actual gain depends on
+        the latency to the server. Setting chunk_size to None uses the original
+        one-UID-at-a-time fetching.
+
+        If a ParallelFetcher is given, the chunks (of chunk_size UIDs as well)
+        are fetched over its pool of IMAP connections at the same time and
+        consumed here as they arrive.
+
+        In offline mode, the raw emails are read from the RawMessageStore instead.
         """
 
-        for station_email, uid_content in self.email_info.items():
+        if chunk_size is None and self.offline is False and parallel_fetcher is None:
+            return self.fetch_emails_text_per_uid()
+
+        if chunk_size is None:
+            chunk_size = FETCH_CHUNK_SIZE
 
+        # Keeping track of which station each UID belongs to
+        uid_to_station = {}
+        for station_email, uid_content in self.email_info.items():
             for uid in uid_content.keys():
+                uid_to_station[uid] = station_email
+
+        uids = sorted(uid_to_station.keys())
+
+        if self.offline is True:
+            raw_message_chunks = (self.raw_message_store.get_messages(self.folder, self.uidvalidity, uids[i:i + chunk_size])
+                                  for i in range(0, len(uids), chunk_size))
+        elif parallel_fetcher is not None:
+            raw_message_chunks = parallel_fetcher.iter_fetch(self.folder, uids, chunk_size)
+        else:
+            raw_message_chunks = self.iter_fetch_chunks(uids, chunk_size)
+
+        for raw_messages in raw_message_chunks:
+
+            # Skipping unsolicited FETCH responses
+            raw_messages = {uid: raw_message for uid, raw_message in raw_messages.items() if uid in uid_to_station}
+
+            if self.offline is False:
+                self.store_raw_messages(raw_messages, uid_to_station)
 
-                email_text = None
+            for uid, raw_message in raw_messages.items():
+                self.email_info[uid_to_station[uid]][uid]["raw"] = raw_message
+
+        return self.email_info
+
+    def iter_fetch_chunks(self, uids, chunk_size):
+
+        # Getting the raw text information of the emails, one chunk of UIDs at a time
+
+        for i in range(0, len(uids), chunk_size):
+
+            raw_messages = {}
+            for uid, fetch_data in self.imap_client.fetch(uids[i:i + chunk_size], ['BODY.PEEK[]']).items():
+                if b'BODY[]' in fetch_data:
+                    raw_messages[uid] = fetch_data[b'BODY[]']
+
+            yield raw_messages
+
+        return None
+
+    def fetch_emails_text_per_uid(self):
+
+        # Fetching the emails one UID at a time
+
+        for station_email, uid_content in self.email_info.items():
+
+            for uid in uid_content.keys():
 
                 # Getting the raw text information of the email
-                raw_message = self.imap_client.fetch(uid, ['BODY[]'])
+                raw_message = self.imap_client.fetch(uid, ['BODY[]'])[uid][b'BODY[]']
+                self.store_raw_messages({uid: raw_message}, {uid: station_email})
+
+                # Appending the raw email to the self.email_info attribute to keep track of info
+                self.email_info[station_email][uid]["raw"] = raw_message
+
+        return self.email_info
 
-                # Processing the text information to make it easier to read
-                message = pyzmail.PyzMessage.factory(raw_message[uid][b'BODY[]'])
+    def fetch_emails_attachments(self, chunk_size = FETCH_CHUNK_SIZE):
 
-                if message.html_part != None:
-                    email_text = message.html_part.get_payload().decode(message.html_part.charset)
+        """
+        Alternative to fetch_emails_text that only downloads what is needed from
+        each email instead of the entire BODY[] (with all of Gmail's headers): the
+        BODYSTRUCTURE of the emails is read first to find their text part and their
+        .sbd attachment, and then only these two sections are fetched (e.g.
+        BODY.PEEK[1] and BODY.PEEK[2]). The attachment is the raw binary payload,
+        so it is decoded directly without going through the hex data of the text.
+
+        The emails without an attachment are fetched entirely as usual. The partial
+        emails are not kept in the RawMessageStore, so they cannot be parsed again
+        offline (or replayed from the quarantine).
+        """
+
+        if self.offline is True:
+            return self.fetch_emails_text(chunk_size)
+
+        # Keeping track of which station each UID belongs to
+        uid_to_station = {}
+        for station_email, uid_content in self.email_info.items():
+            for uid in uid_content.keys():
+                uid_to_station[uid] = station_email
+
+        uids = sorted(uid_to_station.keys())
+        full_uids = []
+
+        for i in range(0, len(uids), chunk_size):
+
+            # Grouping the UIDs by the sections of their text and attachment
+            section_uids = {}
+            for uid, sections in self.fetch_sbd_sections(uids[i:i + chunk_size]).items():
+                if uid not in uid_to_station:
+                    continue
+                if sections is None:
+                    full_uids.append(uid)
+                else:
+                    section_uids.setdefault(sections, []).append(uid)
+
+            for (text_section, text_encoding, sbd_section, sbd_encoding), section_uids_chunk in section_uids.items():
+
+                text_key = 'BODY[{}]'.format(text_section).encode()
+                sbd_key = 'BODY[{}]'.format(sbd_section).encode()
 
-                if message.text_part != None:
-                    email_text = message.text_part.get_payload().decode(message.text_part.charset)
+                fetch_data = self.imap_client.fetch(section_uids_chunk, ['BODY.PEEK[{}]'.format(text_section),
+                                                                         'BODY.PEEK[{}]'.format(sbd_section)])
 
-                # Appending the text to the self.email_info attribute to keep track of info
-                self.email_info[station_email][uid]["text"] = email_text
+                for uid, uid_data in fetch_data.items():
+                    if uid not in uid_to_station or text_key not in uid_data or sbd_key not in uid_data:
+                        continue
+                    email_content = self.email_info[uid_to_station[uid]][uid]
+                    email_content["text"] = decode_section(uid_data[text_key], text_encoding)
+                    email_content["payload"] = decode_section(uid_data[sbd_key], sbd_encoding)
+
+        # Emails without an attachment
+        for raw_messages in self.iter_fetch_chunks(full_uids, chunk_size):
+            raw_messages = {uid: raw_message for uid, raw_message in raw_messages.items() if uid in uid_to_station}
+            self.store_raw_messages(raw_messages, uid_to_station)
+            for uid, raw_message in raw_messages.items():
+                self.email_info[uid_to_station[uid]][uid]["raw"] = raw_message
 
         return self.email_info
 
-    def parse_emails_text(self):
+    def fetch_sbd_sections(self, uids):
+
+        """
+        Finding the text part and the .sbd attachment of the emails within their
+        BODYSTRUCTURE. The attachment is matched by the .sbd extension of its
+        filename (or name), so other attachments or parts are never taken for the
+        payload. Returns {uid: (text_section, text_encoding, sbd_section,
+        sbd_encoding)}, or {uid: None} if the email does not have both parts.
+        """
+
+        sections = {}
+
+        for uid, uid_data in self.imap_client.fetch(uids, ['BODYSTRUCTURE']).items():
+
+            text_part = None
+            sbd_part = None
+
+            for section, part in walk_bodystructure(uid_data[b'BODYSTRUCTURE']):
+                content_type = (part[0] or b"").lower()
+                encoding = (part[5] or b"7bit").lower()
+                if content_type == b"text" and text_part is None:
+                    text_part = (section, encoding)
+                elif get_part_filename(part).lower().endswith(b".sbd") and sbd_part is None:
+                    sbd_part = (section, encoding)
+
+            if text_part is None or sbd_part is None:
+                sections[uid] = None
+            else:
+                sections[uid] = text_part + sbd_part
+
+        return sections
+
+    def store_raw_messages(self, raw_messages, uid_to_station):
+
+        # Keeping a local copy of the raw emails, if a RawMessageStore is used
+
+        if self.raw_message_store is None or len(raw_messages) == 0:
+            return None
+
+        messages = [(uid, uid_to_station[uid], raw_message) for uid, raw_message in raw_messages.items()]
+        self.raw_message_store.add_messages(self.folder, self.uidvalidity, messages)
+
+        return None
+
+    def parse_emails_text(self, workers = None):
 
         """
         This function then retrieves the information found within the text
         of the email.
+
+        The raw emails of each payload layout are parsed and decoded together with
+        parse_raw_messages. For large backfills, workers can be set to the number
+        of processes to parse the emails with a ProcessPoolExecutor, in chunks of
+        PARSE_CHUNK_SIZE emails, to use all the cores of the Raspberry Pi.
+
+        The emails fetched with fetch_emails_attachments are parsed from their text
+        part and their payload is decoded directly from the .sbd attachment.
+
+        The emails that cannot be parsed are quarantined and removed from the
+        email_info, and the parsed ones are replaced by their Transmission (the
+        raw email is dropped), with the entries of each station in a single array.
         """
 
         if self.email_info == {}:
             raise RuntimeError("Please fetch emails before parsing emails")
 
+        # Emails already quarantined (e.g. from another folder) are not parsed again
+        quarantined_hashes = {}
+        if self.quarantine_ledger is not None:
+            quarantined_hashes = self.quarantine_ledger.quarantined_hashes()
+
+        # Grouping the emails by payload layout and by how they were fetched
+        layout_emails = {}
+        failed_emails = [] # [(station_email, uid, raw_message, reason), ...]
+
         for station_email, uid_content in self.email_info.items():
 
-            #print("################################################")
-            #print(station_email)
+            payload_layout = self.station_layouts[station_email]
 
             for uid, email_content in uid_content.items():
 
-                lines = email_content["text"].split("\n")
+                # The text part and the attachment stand in for the raw email when hashing it
+                if "payload" in email_content:
+                    raw_message = email_content["text"] + email_content["payload"]
+                elif "raw" in email_content:
+                    raw_message = email_content["raw"]
+                else: # Not returned by the server (deleted email)
+                    continue
 
-                # Obtaining essential information (time and hex data) from the email's text
+                if len(quarantined_hashes) != 0:
+                    reason = quarantined_hashes.get(hashlib.sha256(raw_message).hexdigest())
+                    if reason is not None:
+                        failed_emails.append((station_email, uid, raw_message, reason))
+                        continue
 
-                original_time_id = lines[3].split(" ")[2] + lines[3].split(" ")[3].replace("\r","") # UTC timeline
-                
-                if lines[8].find("Data") is not -1:
-                    hex_data = lines[8].split(" ")[1].replace("\r","") # for all 12 hours
-                elif lines[7].find("Data") is not -1:
-                    hex_data = lines[7].split(" ")[1].replace("\r","") # for all 12 hours
+                group = (payload_layout, "payload" in email_content)
+                layout_emails.setdefault(group, []).append((station_email, uid, raw_message))
 
-                # Generating multiple entries for the individual email
+        station_parts = {} # {"station_email": [(uid, momsn, entries), ...]}
 
-                time_values = self.generate_time_id_set(original_time_id) # [time_id1, time_id2, ...]
-                
-                try:
-                    # Place into a single "data" variable to easily print and to troubleshoot output
-                    data = self.generate_data_set(hex_data) # [s1, ...],[s2, ...],[s3, ...],[ref, ...],[weight, ...] 
-                except RuntimeError:
-                    continue
-                
-                sensor1, sensor2, sensor3, ref, weight = data
+        for (payload_layout, attachment_only), emails in layout_emails.items():
 
-                # Save data to original dictionary
+            if attachment_only:
+                raw_messages = [self.email_info[station_email][uid]["text"] for station_email, uid, raw_message in emails]
+                payloads = [self.email_info[station_email][uid]["payload"] for station_email, uid, raw_message in emails]
+            else:
+                raw_messages = [raw_message for station_email, uid, raw_message in emails]
+                payloads = None
 
-                data = {"time_id": time_values,
-                        "sensor_1": sensor1,
-                        "sensor_2": sensor2,
-                        "sensor_3": sensor3,
-                        "reference": ref,
-                        "weight_lbs": weight,
-                        "latitude": [lines[4].split(" ")[2].replace("\r", "") for i in range(8)],
-                        "longitude": [lines[5].split(" ")[2].replace("\r", "") for i in range(8)],
-                        "timezone": ["CST" for i in range(8)]}
+            for offset, parsed_data in self.run_parse_stage(raw_messages, payload_layout, workers, payloads):
 
-                # Creating dataframe for UID
-                
-                df = pd.DataFrame(data)
-                df = util.sort_and_clean_df(df)
+                for index, reason in parsed_data["failures"]:
+                    failed_emails.append(emails[offset + index] + (reason,))
 
-                self.email_info[station_email][uid]["dataframe"] = df
+                entries = self.generate_entries(parsed_data, payload_layout)
+                size = payload_layout.record_count
 
-                # Printing information
+                for i, index in enumerate(parsed_data["indexes"]):
 
-                #print("UID: {}".format(uid))
-                #print(df)
-                #print("Email Information: {}".format(email_content))
+                    station_email, uid, raw_message = emails[offset + index]
+                    station_parts.setdefault(station_email, []).append((uid, parsed_data["momsns"][i],
+                                                                        entries[i * size:(i + 1) * size]))
+
+        self.quarantine_emails(failed_emails)
+
+        # Only keeping the emails that were parsed, as Transmissions (dropping the raw emails)
+        for station_email in list(self.email_info.keys()):
+
+            if station_email not in station_parts:
+                del self.email_info[station_email]
+                continue
+
+            transmissions = create_station_transmissions(station_email, station_parts[station_email])
+            self.email_info[station_email] = {uid: transmissions[uid] for uid in self.email_info[station_email].keys()
+                                              if uid in transmissions}
 
         return self.email_info
 
-    def generate_time_id_set(self, original_time_id):
+    def generate_entries(self, parsed_data, payload_layout = PHASE_ONE_LAYOUT):
+
+        """
+        Creating the entries of the parsed emails (in the format returned by
+        parse_raw_messages) as a single structured array with the layout's
+        entry_dtype: record_count entries per email, latest first, in the same
+        order as parsed_data["indexes"].
+        """
+
+        size = payload_layout.record_count
+        entries = np.empty(len(parsed_data["indexes"]) * size, dtype=payload_layout.entry_dtype)
+
+        if len(entries) == 0:
+            return entries
 
-        # 90 minutes apart for Phase 1 stations, 8 total entries
-        
-        # Time String Formatting
-        original_time_id = original_time_id.replace("T", " ", 1).replace("Z", " ")
+        # Generating the times of all the entries of the parsed emails at once
+        time_ids, timezones = self.generate_time_id_sets(parsed_data["transmit_times"], payload_layout)
+        entries["time_id"] = time_ids.ravel()
+        entries["timezone"] = timezones.ravel()
 
-        # Timezone Unaware -> Timezone Aware
-        utc_datetime = datetime.datetime.strptime(original_time_id, "%Y-%m-%d %H:%M:%S %Z")
-        #utc_datetime = utc_datetime.replace(tzinfo = pytz.UTC)
+        # e.g. [s1, ...],[s2, ...],[s3, ...],[ref, ...],[weight, ...] of the parsed emails
+        for column in payload_layout.columns:
+            entries[column] = parsed_data["data_sets"][column]
 
-        # Changing from UTC to CDT/CST Timezone
-        #cst_timezone = pytz.timezone("US/Central")
-        #cst_datetime = utc_datetime.astimezone(cst_timezone)
-        cst_datetime = utc_datetime - datetime.timedelta(hours=6)
+        entries["latitude"] = np.repeat(parse_coordinates(parsed_data["latitudes"]), size)
+        entries["longitude"] = np.repeat(parse_coordinates(parsed_data["longitudes"]), size)
 
-        # Creating list of time values
-        time_values = []
+        return entries
 
-        for i in range(8):
-            #time_values.append(cst_datetime.strftime("%Y-%m-%d %H:%M:%S"))
-            time_values.append(cst_datetime)
-            cst_datetime = cst_datetime - datetime.timedelta(minutes=90)
+    def quarantine_emails(self, failed_emails):
 
-        return time_values
+        # Recording the emails that could not be parsed in the QuarantineLedger
+
+        for station_email, uid, raw_message, reason in failed_emails:
+            print("QUARANTINED UID {} ({}): {}".format(uid, station_email, reason))
+
+        if self.quarantine_ledger is None or len(failed_emails) == 0:
+            return None
+
+        messages = [(uid, station_email, raw_message, reason) for station_email, uid, raw_message, reason in failed_emails]
+        self.quarantine_ledger.add_messages(self.folder, self.uidvalidity, messages)
+
+        return None
+
+    def run_parse_stage(self, raw_messages, payload_layout, workers = None, payloads = None):
+
+        """
+        Running parse_raw_messages on the raw emails, either within this process or
+        fanned out in chunks to a ProcessPoolExecutor. Returns a list of 
+        (offset of the chunk, parsed data of the chunk).
+        """
 
-    def generate_data_set(self, hex_data):
+        if workers is None or len(raw_messages) <= PARSE_CHUNK_SIZE:
+            return [(0, parse_raw_messages(raw_messages, payload_layout.phase, payloads))]
 
-        # 8 total entries & output = (sensor1,sensor2,sensor3,ref,weight)
+        offsets = list(range(0, len(raw_messages), PARSE_CHUNK_SIZE))
+        chunks = [raw_messages[offset:offset + PARSE_CHUNK_SIZE] for offset in offsets]
 
-        if hex_data == None: # Corrupted Data Transmission
+        if payloads is None:
+            payload_chunks = [None] * len(chunks)
+        else:
+            payload_chunks = [payloads[offset:offset + PARSE_CHUNK_SIZE] for offset in offsets]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+            parsed_chunks = list(executor.map(parse_raw_messages, chunks, [payload_layout.phase] * len(chunks), payload_chunks))
+
+        return list(zip(offsets, parsed_chunks))
+
+    def generate_time_id_set(self, original_time_id, payload_layout = PHASE_ONE_LAYOUT):
+
+        # 90 minutes apart for Phase 1 stations, 8 total entries (50 minutes and 14 entries for Phase 2)
+
+        time_ids, timezones = self.generate_time_id_sets([original_time_id], payload_layout)
+
+        return list(time_ids[0].astype(datetime.datetime))
+
+    def generate_time_id_sets(self, original_time_ids, payload_layout = PHASE_ONE_LAYOUT):
+
+        """
+        Batch version of generate_time_id_set. The transmit times (e.g.
+        "2020-01-26T17:08:22Z UTC") are converted into a single datetime64 array
+        and the times of all the records are created at once, as a matrix of
+        (emails, record_count) with the latest record first. The UTC times are then
+        shifted to the fixed offset of the stored time_ids (CST) with the
+        LocalTimeConverter, so the time_ids stay unique and continuous across the
+        DST changes (the CST/CDT time is only shown in the data files). Returns
+        the time matrix and the matching timezone abbreviations.
+        """
+
+        utc_times = np.array([original_time_id[:19] for original_time_id in original_time_ids], dtype="datetime64[s]")
+
+        record_offsets = np.arange(payload_layout.record_count) * np.timedelta64(payload_layout.record_interval * 60, "s")
+        utc_time_ids = utc_times[:, np.newaxis] - record_offsets
+
+        return self.local_time_converter.to_storage(utc_time_ids)
+
+    def generate_data_set(self, hex_data, payload_layout = PHASE_ONE_LAYOUT):
+
+        # Phase 1: 8 total entries & output = (sensor1,sensor2,sensor3,ref,weight)
+
+        if not payload_layout.is_valid_hex_data(hex_data): # Corrupted Data Transmission
             raise RuntimeError("CORRUPTED DATA TRANSMISSION")
 
-        text_data = bytearray.fromhex(hex_data) 
+        data = payload_layout.decode(hex_data)
+
+        return [data[column] for column in payload_layout.columns]
+
+#-------------------------------------------------------------
+# Functions
+
+def get_fetch_folder(fetch_type):
+
+    # Folder searched by fetch_uids: only the INBOX for the "New" emails, All Mail otherwise
+
+    if fetch_type == "New":
+        return "INBOX"
+
+    return '[Gmail]/All Mail'
+
+def walk_bodystructure(bodystructure, section = ""):
+
+    # Generator of the single parts of a BODYSTRUCTURE with their section, e.g. ("1", part), ("2", part)
+
+    if isinstance(bodystructure[0], list): # Multipart
+        for i, part in enumerate(bodystructure[0]):
+            yield from walk_bodystructure(part, "{}.{}".format(section, i + 1) if section else str(i + 1))
+    else:
+        yield (section or "1", bodystructure)
+
+def get_part_filename(part):
+
+    """
+    Getting the filename of a single part of a BODYSTRUCTURE, b"" if it has none.
+    The filename is within the Content-Disposition (e.g. (b"attachment",
+    (b"filename", b"x.sbd"))), which is after the part's fields, or else in the
+    name parameter of its Content-Type.
+    """
+
+    names = {}
+
+    for element in list(part[7:]) + [(None, part[2])]:
+
+        if not isinstance(element, tuple) or len(element) != 2 or not isinstance(element[1], tuple):
+            continue
+
+        parameters = element[1]
+        for key, value in zip(parameters[0::2], parameters[1::2]):
+            if isinstance(key, bytes) and isinstance(value, bytes):
+                names.setdefault(key.lower(), value)
+
+    return names.get(b"filename", names.get(b"name", b""))
 
-        data = [[],[],[],[],[]]
+def decode_section(data, encoding):
 
-        for i in range(8): # Obtaining information from hex data
-            data[0].append(text_data[i*5 + 2]) # sensor1
-            data[1].append(text_data[i*5 + 3]) # sensor2
-            data[2].append(text_data[i*5 + 4]) # sensor3
-            data[3].append(text_data[i*5 + 5]) # ref
-            data[4].append(text_data[i*5 + 6]) # weight_lbs   
+    # Decoding a fetched section according to its Content-Transfer-Encoding
 
-        for i in range(5): # Reversing the order of the data
-            data[i].reverse()
+    if encoding == b"base64":
+        return base64.b64decode(data)
+    elif encoding == b"quoted-printable":
+        return quopri.decodestring(data)
 
-        return data
+    return data
 
 #---------------------------------------------------------------
 # Running Code
@@ -0,0 +1,142 @@
+# Library Imports
+import os
+import sys
+import threading
+
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+#-------------------------------------------------------------
+# Constants
+
+# Number of recently added time_ids kept apart before merging them into the loaded ones
+MAX_RECENT_SIZE = 4096
+
+#-------------------------------------------------------------
+# Class
+
+class EntryIndex():
+
+    """
+    The EntryIndex class keeps the time_ids of every entry already in the MySQL
+    database, so the new entries of the emails can be found without downloading
+    the stations' tables (SELECT *) on every cycle.
+
+    The time_ids of each station are kept as sorted NumPy arrays of int64 epoch
+    seconds. The index is loaded once from MySQL (only the time_id column) and
+    then updated incrementally with the entries that are added, so finding the
+    new entries is a searchsorted of only the emails' entries and does not grow
+    with the size of the database. Since the RockBLOCKReceiver adds entries from
+    its own thread, the index is protected by a lock.
+
+    Copying the whole array of a station on every addition would make each
+    update as slow as the database is large, so the added time_ids go to a small
+    sorted array of recent time_ids instead, which is only merged into the
+    loaded ones once it holds MAX_RECENT_SIZE time_ids (a single linear merge).
+    """
+
+    def __init__(self):
+
+        self.stations = {}
+        self.lock = threading.Lock()
+
+        """
+        stations structure
+            {"station_email":
+                {"epochs": np.array (int64 epoch seconds, sorted and unique),
+                 "recent": np.array (same, the time_ids added since the last merge)
+                }
+            }
+        """
+
+        return None
+
+    def load(self, mysql_client):
+
+        # Loading the time_ids of all the stations from MySQL, only the first time
+
+        with self.lock:
+
+            if len(self.stations) != 0:
+                return None
+
+            for station_email, time_ids in mysql_client.fetch_time_ids().items():
+                self.stations[station_email] = {"epochs": np.unique(to_epoch(time_ids)),
+                                                "recent": np.array([], dtype=np.int64)}
+
+        return None
+
+    def find(self, station_email, time_ids):
+
+        # Getting the mask of the time_ids that are already in the index
+
+        epochs = to_epoch(time_ids)
+
+        with self.lock:
+            station = self.stations.get(station_email)
+
+        if station is None or len(epochs) == 0:
+            return np.zeros(len(epochs), dtype=bool)
+
+        return is_in_sorted(station["epochs"], epochs) | is_in_sorted(station["recent"], epochs)
+
+    def add(self, station_email, time_ids):
+
+        # Adding the time_ids of new entries, e.g. once they are in MySQL
+
+        epochs = np.unique(to_epoch(time_ids))
+
+        if len(epochs) == 0:
+            return None
+
+        with self.lock:
+
+            station = self.stations.get(station_email, {"epochs": np.array([], dtype=np.int64),
+                                                        "recent": np.array([], dtype=np.int64)})
+
+            epochs = epochs[~is_in_sorted(station["epochs"], epochs)]
+            recent = np.union1d(station["recent"], epochs) # Only as large as MAX_RECENT_SIZE
+
+            if len(recent) >= MAX_RECENT_SIZE: # Merging the recent time_ids into the loaded ones
+                station_epochs = np.insert(station["epochs"], np.searchsorted(station["epochs"], recent), recent)
+                recent = np.array([], dtype=np.int64)
+            else:
+                station_epochs = station["epochs"]
+
+            # New arrays instead of changing them in place, since find() reads them without the lock
+            self.stations[station_email] = {"epochs": station_epochs, "recent": recent}
+
+        return None
+
+    def add_entries(self, all_emails_entries):
+
+        # Adding the entries of the DataFrameHandler, {"station_email": entries}
+
+        for station_email, entries in all_emails_entries.items():
+            self.add(station_email, entries["time_id"])
+
+        return None
+
+#-------------------------------------------------------------
+# Functions
+
+def is_in_sorted(sorted_epochs, epochs):
+
+    # Getting the mask of the epochs that are within the sorted (and unique) epochs
+
+    if len(sorted_epochs) == 0:
+        return np.zeros(len(epochs), dtype=bool)
+
+    positions = np.searchsorted(sorted_epochs, epochs).clip(max = len(sorted_epochs) - 1)
+
+    return sorted_epochs[positions] == epochs
+
+def to_epoch(time_ids):
+
+    # Converting datetimes (datetime, datetime64, DatetimeIndex) into int64 epoch seconds
+
+    return np.asarray(time_ids, dtype="datetime64[s]").astype(np.int64)
@@ -0,0 +1,235 @@
+# Library Imports
+import os
+import sys
+import imaplib
+import zlib
+
+# Third-Party Imports
+import imapclient
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import global_variables as gv
+
+#-------------------------------------------------------------
+# Constants
+
+# Errors that mean that the connection to the server was lost
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+# Bytes read from the socket at once when the connection is compressed
+COMPRESSED_READ_SIZE = 16384
+
+#-------------------------------------------------------------
+# Class
+
+class IMAPSession():
+
+    """
+    The IMAPSession class is a long-lived IMAP connection that is reused
+    across cycles instead of logging in again every time an EmailClient is
+    created. It offers the same select_folder, search and fetch commands as
+    the IMAPClient, so the EmailClient can use it directly.
+
+    The session does the following to reduce the cost of every cycle:
+
+        Keepalive -
+            keepalive() sends a NOOP to keep the connection open between cycles.
+
+        Reconnect -
+            If the connection was dropped, the session logs in again, reselects
+            the folder and retries the command once.
+
+        Folder Caching -
+            The currently selected folder (and whether it was selected read-only,
+            EXAMINE) is remembered to skip redundant SELECTs.
+
+        Compression -
+            If the server offers COMPRESS=DEFLATE (RFC 4978), all the traffic is
+            compressed, which greatly reduces the size of the emails' text.
+    """
+
+    def __init__(self, compress = True):
+
+        self.compress = compress
+        self.imap_client = None
+        self.connect()
+
+        return None
+
+    def connect(self):
+
+        # Creating a new connection and logging in
+
+        self.imap_client = imapclient.IMAPClient(gv.IMAP_SERVER, ssl = True)
+        self.imap_client.login(gv.TRINITY_EMAIL, gv.TRINITY_EMAIL_PASSWORD)
+
+        self.selected_folder = None
+        self.selected_readonly = False
+        self.selected_folder_info = None
+        self.compressed = False
+
+        if self.compress is True and self.imap_client.has_capability("COMPRESS=DEFLATE"):
+            self.compressed = self.enable_compression()
+
+        return None
+
+    def reconnect(self):
+
+        # Dropping the broken connection and creating a new one
+
+        print("IMAP CONNECTION LOST - RECONNECTING")
+
+        try:
+            self.imap_client.shutdown()
+        except CONNECTION_ERRORS:
+            pass
+
+        self.connect()
+
+        return None
+
+    def enable_compression(self):
+
+        """
+        Negotiating COMPRESS=DEFLATE. The IMAPClient does not support it, so the
+        send/read/readline functions of the underlying imaplib connection are
+        replaced with ones that compress and decompress the raw deflate stream.
+        """
+
+        imap = self.imap_client._imap
+        typ, data = imap._simple_command("COMPRESS", "DEFLATE")
+
+        if typ != "OK":
+            return False
+
+        sock = imap.sock
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        decompressor = zlib.decompressobj(-15)
+        read_buffer = bytearray()
+
+        def fill_read_buffer():
+            compressed_data = sock.recv(COMPRESSED_READ_SIZE)
+            if not compressed_data:
+                raise imaplib.IMAP4.abort("socket error: EOF")
+            read_buffer.extend(decompressor.decompress(compressed_data))
+
+        def send(data):
+            sock.sendall(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        def read(size):
+            while len(read_buffer) < size:
+                fill_read_buffer()
+            data = bytes(read_buffer[:size])
+            del read_buffer[:size]
+            return data
+
+        def readline():
+            searched = 0
+            while read_buffer.find(b"\n", searched) == -1:
+                searched = len(read_buffer)
+                fill_read_buffer()
+            size = read_buffer.find(b"\n", searched) + 1
+            data = bytes(read_buffer[:size])
+            del read_buffer[:size]
+            return data
+
+        imap.send = send
+        imap.read = read
+        imap.readline = readline
+
+        return True
+
+    def run(self, command, *args, **kwargs):
+
+        """
+        Running an IMAPClient command. If the connection was dropped, the session
+        reconnects, reselects the folder and tries the command one more time.
+        """
+
+        try:
+            return getattr(self.imap_client, command)(*args, **kwargs)
+        except CONNECTION_ERRORS:
+            selected_folder = self.selected_folder
+            selected_readonly = self.selected_readonly
+            self.reconnect()
+
+            if selected_folder is not None and command != "select_folder":
+                self.select_folder(selected_folder, readonly = selected_readonly)
+
+            return getattr(self.imap_client, command)(*args, **kwargs)
+
+    def keepalive(self):
+
+        # Sending a NOOP to keep the connection alive, reconnecting if it was lost
+
+        try:
+            self.imap_client.noop()
+        except CONNECTION_ERRORS:
+            self.reconnect()
+
+        return None
+
+    def select_folder(self, folder, readonly = False):
+
+        # Skipping the SELECT if the folder is already selected, in the same mode (read-only or not)
+
+        if folder != self.selected_folder or readonly != self.selected_readonly:
+            self.selected_folder_info = self.run("select_folder", folder, readonly = readonly)
+            self.selected_folder = folder
+            self.selected_readonly = readonly
+
+        return self.selected_folder_info
+
+    def search(self, criteria):
+
+        return self.run("search", criteria)
+
+    def fetch(self, messages, data):
+
+        return self.run("fetch", messages, data)
+
+    def folder_status(self, folder, what = None):
+
+        return self.run("folder_status", folder, what)
+
+    def move(self, messages, folder):
+
+        return self.run("move", messages, folder)
+
+    def copy(self, messages, folder):
+
+        return self.run("copy", messages, folder)
+
+    def remove_gmail_labels(self, messages, labels):
+
+        return self.run("remove_gmail_labels", messages, labels)
+
+    def delete_messages(self, messages):
+
+        return self.run("delete_messages", messages)
+
+    def expunge(self, messages = None):
+
+        return self.run("expunge", messages)
+
+    def has_capability(self, capability):
+
+        return self.imap_client.has_capability(capability)
+
+    def logout(self):
+
+        # Closing the IMAP session
+
+        try:
+            self.imap_client.logout()
+        except CONNECTION_ERRORS:
+            pass
+
+        self.imap_client = None
+        self.selected_folder = None
+        self.selected_readonly = False
+
+        return None
@@ -0,0 +1,186 @@
+# Library Imports
+import os
+import sys
+import datetime
+import zoneinfo
+
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+#-------------------------------------------------------------
+# Constants
+
+# Timezone of the stations (CST/CDT)
+STATION_TIMEZONE = "America/Chicago"
+
+# The time_ids are stored with a fixed offset (CST all year long, like the whole
+# history of the database), so they never repeat or jump when the DST changes
+STORAGE_UTC_OFFSET = np.timedelta64(-6 * 3600, "s")
+STORAGE_TIMEZONE = "CST"
+
+#-------------------------------------------------------------
+# Class
+
+class LocalTimeConverter():
+
+    """
+    The LocalTimeConverter class converts arrays of UTC times (NumPy datetime64)
+    into the local time of the stations, including the daylight saving time
+    changes (CST in the winter, CDT in the summer).
+
+    Instead of converting every time with pytz/zoneinfo, the UTC offsets of the
+    timezone are compiled into a transition table once per year: the UTC times
+    at which the offset changes, the offset and its abbreviation. A whole batch
+    of times is then converted with a single np.searchsorted over the table.
+
+    The time_ids (the key of the MySQL tables) are not local times but UTC times
+    with the fixed STORAGE_UTC_OFFSET (to_storage), since the local times repeat
+    an hour every fall. The local times are only used for display, converting
+    the stored time_ids back with storage_to_local.
+    """
+
+    def __init__(self, timezone_name = STATION_TIMEZONE):
+
+        self.timezone = zoneinfo.ZoneInfo(timezone_name)
+        self.years = set()
+
+        # Transition table, sorted by the UTC time of the transitions
+        self.transition_times = np.array([], dtype="datetime64[s]")
+        self.offsets = np.array([], dtype="timedelta64[s]")
+        self.abbreviations = np.array([], dtype=object)
+
+        return None
+
+    def offset_at(self, timestamp):
+
+        # UTC offset (seconds) and abbreviation of the timezone at a POSIX timestamp
+
+        local_datetime = datetime.datetime.fromtimestamp(timestamp, tz=self.timezone)
+
+        return int(local_datetime.utcoffset().total_seconds()), local_datetime.tzname()
+
+    def year_transitions(self, year):
+
+        """
+        Finding the transitions of the year: the offsets are compared at the start
+        of every month and, when they change, the exact second of the change is
+        found with a bisection. The first entry is the start of the year.
+        """
+
+        month_starts = [datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc).timestamp()
+                        for month in range(1, 13)]
+        month_starts.append(datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+        transitions = [(int(month_starts[0]),) + self.offset_at(month_starts[0])]
+
+        for start, end in zip(month_starts[:-1], month_starts[1:]):
+
+            if self.offset_at(start) == self.offset_at(end):
+                continue
+
+            low, high = int(start), int(end) # offset_at(low) != offset_at(high)
+
+            while high - low > 1:
+                middle = (low + high) // 2
+                if self.offset_at(middle) == self.offset_at(low):
+                    low = middle
+                else:
+                    high = middle
+
+            transitions.append((high,) + self.offset_at(high))
+
+        return transitions
+
+    def add_years(self, years):
+
+        # Adding the transitions of the missing years to the table
+
+        missing_years = set(years) - self.years
+
+        if len(missing_years) == 0:
+            return None
+
+        transitions = list(zip(self.transition_times.astype(np.int64).tolist(),
+                               self.offsets.astype(np.int64).tolist(),
+                               self.abbreviations.tolist()))
+
+        for year in missing_years:
+            transitions += self.year_transitions(year)
+
+        transitions.sort()
+
+        self.transition_times = np.array([time for time, offset, abbreviation in transitions], dtype="datetime64[s]")
+        self.offsets = np.array([offset for time, offset, abbreviation in transitions], dtype="timedelta64[s]")
+        self.abbreviations = np.array([abbreviation for time, offset, abbreviation in transitions], dtype=object)
+        self.years |= missing_years
+
+        return None
+
+    def to_local(self, utc_times):
+
+        """
+        Converting an array (any shape) of UTC datetime64 values into local times.
+        Returns the local times (datetime64[s]) and their timezone abbreviations
+        ("CST"/"CDT"), both with the same shape as utc_times.
+        """
+
+        utc_times = np.asarray(utc_times, dtype="datetime64[s]")
+
+        if utc_times.size == 0:
+            return utc_times.copy(), np.empty(utc_times.shape, dtype=object)
+
+        first_year = int(utc_times.min().astype("datetime64[Y]").astype(np.int64)) + 1970
+        last_year = int(utc_times.max().astype("datetime64[Y]").astype(np.int64)) + 1970
+        self.add_years(range(first_year, last_year + 1))
+
+        indexes = np.searchsorted(self.transition_times, utc_times, side="right") - 1
+
+        return utc_times + self.offsets[indexes], self.abbreviations[indexes]
+
+    def to_storage(self, utc_times):
+
+        """
+        Converting an array (any shape) of UTC datetime64 values into the fixed
+        offset of the stored time_ids. Returns the times (datetime64[s]) and their
+        timezone abbreviations (always STORAGE_TIMEZONE), like to_local.
+        """
+
+        utc_times = np.asarray(utc_times, dtype="datetime64[s]")
+
+        return utc_times + STORAGE_UTC_OFFSET, np.full(utc_times.shape, STORAGE_TIMEZONE, dtype=object)
+
+    def storage_to_local(self, time_ids):
+
+        # Converting stored time_ids (fixed offset) into the local times of the stations, for display
+
+        time_ids = np.asarray(time_ids, dtype="datetime64[s]")
+
+        return self.to_local(time_ids - STORAGE_UTC_OFFSET)
+
+#---------------------------------------------------------------
+# Running Code
+
+if __name__ == "__main__":
+
+    """
+    This section is for testing purpose regarding this class
+    """
+
+    local_time_converter = LocalTimeConverter()
+
+    utc_times = np.array(["2020-03-08T07:59:59", "2020-03-08T08:00:00",
+                          "2020-11-01T06:59:59", "2020-11-01T07:00:00"], dtype="datetime64[s]")
+
+    local_times, abbreviations = local_time_converter.to_local(utc_times)
+
+    for utc_time, local_time, abbreviation in zip(utc_times, local_times, abbreviations):
+        print("{} UTC -> {} {}".format(utc_time, local_time, abbreviation))
+
+    time_ids, abbreviations = local_time_converter.to_storage(utc_times)
+
+    for utc_time, time_id, abbreviation in zip(utc_times, time_ids, abbreviations):
+        print("{} UTC -> {} {} (STORED)".format(utc_time, time_id, abbreviation))
@@ -0,0 +1,189 @@
+# Library Imports
+import os
+import sys
+import re
+import mailbox
+import email.utils
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import utility as util
+from classes.email_client import EmailClient
+
+#-------------------------------------------------------------
+# Constants
+
+# Number of station emails parsed and added to MySQL at once
+IMPORT_BATCH_SIZE = 5000
+
+# "From:" header of the raw emails (only the headers are searched)
+FROM_PATTERN = re.compile(rb"^From:[ \t]*([^\r\n]*)", re.MULTILINE | re.IGNORECASE)
+
+# End of the headers of the raw emails
+HEADER_END_PATTERN = re.compile(rb"\r?\n\r?\n")
+
+#-------------------------------------------------------------
+# Class
+
+class MailboxImporter():
+
+    """
+    The MailboxImporter class rebuilds the MySQL database from an exported
+    mailbox (the mbox file of a Google Takeout, or a maildir directory) instead
+    of downloading years of emails over IMAP, which takes hours.
+
+    The export is streamed one email at a time with the standard library's
+    mailbox module, and only the emails sent by the stations (matched by the
+    "From:" header, without parsing the rest of the email) are kept. They are
+    collected in batches of IMPORT_BATCH_SIZE emails in the same email_info
+    structure as the EmailClient's, keyed by their position in the export
+    instead of a UID, so each batch goes through the usual parse stage (with
+    worker processes, if given) and through the same DataFrameHandler ->
+    MySQLClient path (util.add_email_info_to_mysql) before the next one is read.
+    """
+
+    def __init__(self, path, batch_size = IMPORT_BATCH_SIZE, ingest = None):
+
+        if not os.path.exists(path):
+            raise FileNotFoundError("Mailbox export not found: {}".format(path))
+
+        self.path = path
+        self.batch_size = batch_size
+
+        # Only used to parse the emails, so no IMAP connection
+        self.email_client = EmailClient(offline = True)
+
+        # Function that receives the email_info of every batch
+        if ingest is None:
+            ingest = util.add_email_info_to_mysql
+        self.ingest = ingest
+
+        return None
+
+    def open_mailbox(self):
+
+        # A directory is a maildir, a file is an mbox
+
+        if os.path.isdir(self.path):
+            return mailbox.Maildir(self.path, factory = None, create = False)
+
+        return mailbox.mbox(self.path, factory = None, create = False)
+
+    def find_station_email(self, raw_message):
+
+        # Finding the station that sent the email from its "From:" header, None if not a station
+
+        header_end = HEADER_END_PATTERN.search(raw_message)
+        headers = raw_message[:header_end.start()] if header_end is not None else raw_message
+
+        match = FROM_PATTERN.search(headers)
+        if match is None:
+            return None
+
+        sender = email.utils.parseaddr(match.group(1).decode("ascii", "replace"))[1].lower()
+
+        # Matching by email first, then by IMEI
+        water_station = self.email_client.station_index.get(sender)
+        if water_station is None:
+            water_station = self.email_client.station_index.get(sender.split("@")[0])
+        if water_station is None:
+            return None
+
+        return water_station["email"]
+
+    def iter_station_messages(self):
+
+        # Streaming the export and yielding (station_email, raw_message) of the stations' emails
+
+        export = self.open_mailbox()
+
+        try:
+            for key in export.iterkeys():
+
+                raw_message = export.get_bytes(key)
+
+                station_email = self.find_station_email(raw_message)
+                if station_email is not None:
+                    yield station_email, raw_message
+
+        finally:
+            export.close()
+
+        return None
+
+    def iter_batches(self):
+
+        """
+        Collecting the stations' emails in batches of batch_size emails, in the
+        email_info structure of the EmailClient:
+            {"station_email": {index: {"raw": bytes}}}
+        where index is the position of the email among the stations' emails.
+        """
+
+        batch = {}
+        batch_size = 0
+
+        for index, (station_email, raw_message) in enumerate(self.iter_station_messages()):
+
+            batch.setdefault(station_email, {})[index] = {"raw": raw_message}
+            batch_size += 1
+
+            if batch_size == self.batch_size:
+                yield batch
+                batch = {}
+                batch_size = 0
+
+        if batch_size != 0:
+            yield batch
+
+        return None
+
+    def import_messages(self, workers = None):
+
+        """
+        Importing the whole export. Each batch is parsed (with workers processes,
+        if given) and ingested before the next one is read, so memory stays the
+        same no matter the size of the export. Returns the number of emails
+        imported.
+        """
+
+        imported_emails = 0
+        read_emails = 0
+
+        for batch in self.iter_batches():
+
+            read_emails += sum([len(index_content) for index_content in batch.values()])
+
+            self.email_client.email_info = batch
+            email_info = self.email_client.parse_emails_text(workers)
+
+            if email_info != {}: # Not every email failed to parse
+                self.ingest(email_info)
+                imported_emails += sum([len(index_content) for index_content in email_info.values()])
+
+            print("IMPORTED {} OF {} STATION EMAILS READ".format(imported_emails, read_emails))
+
+        self.email_client.email_info = {}
+
+        return imported_emails
+
+#---------------------------------------------------------------
+# Running Code
+
+if __name__ == "__main__":
+
+    """
+    This section is for testing purpose regarding this class: the given export
+    is read and its emails are parsed, printing the dataframes instead of
+    adding them to MySQL.
+    """
+
+    def print_email_info(email_info):
+        for station_email, index_content in email_info.items():
+            for index, transmission in index_content.items():
+                print("{} EMAIL {}:\n{}".format(station_email, index, transmission.to_dataframe()))
+
+    mailbox_importer = MailboxImporter(sys.argv[1], ingest = print_email_info)
+    mailbox_importer.import_messages()
@@ -0,0 +1,136 @@
+# Library Imports
+import os
+import sys
+import time
+
+# Third-Party Imports
+import imapclient
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import global_variables as gv
+
+#-------------------------------------------------------------
+# Constants
+
+# Servers drop IDLE connections after some time (RFC 2177 allows 30 minutes,
+# Gmail stops sending updates before that), so the IDLE is renewed before then
+IDLE_RENEW_TIME = 9 * 60
+
+# How often the wake event (e.g. messages received by HTTP) is checked while in IDLE
+WAKE_CHECK_TIME = 30
+
+#-------------------------------------------------------------
+# Class
+
+class MailboxWatcher():
+
+    """
+    The MailboxWatcher class keeps an IMAP connection in IDLE on a folder (INBOX)
+    to be notified by the server as soon as a new email arrives, instead of
+    polling the mailbox every 10 minutes.
+
+    The IDLE command is renewed every IDLE_RENEW_TIME seconds to avoid the server's
+    timeout. If the server does not support IDLE, the watcher falls back to
+    simply sleeping for the polling delay.
+    """
+
+    def __init__(self, folder = "INBOX"):
+
+        self.folder = folder
+        self.imap_client = imapclient.IMAPClient(gv.IMAP_SERVER, ssl = True)
+        self.imap_client.login(gv.TRINITY_EMAIL, gv.TRINITY_EMAIL_PASSWORD)
+        folder_info = self.imap_client.select_folder(self.folder, readonly = True)
+
+        # Number of emails within the folder, EXISTS reports when it grows
+        self.exists = folder_info[b'EXISTS']
+
+        self.idle_supported = self.imap_client.has_capability("IDLE")
+
+        if self.idle_supported is False:
+            print("IMAP SERVER DOES NOT SUPPORT IDLE - FALLING BACK TO POLLING")
+
+        return None
+
+    def wait_for_new_emails(self, timeout, polling_delay, wake_event = None):
+
+        """
+        Blocking until the server reports new emails (EXISTS) or until the timeout
+        (in seconds) runs out. Returns True if new emails arrived and False if the
+        timeout was reached. Without IDLE support, it sleeps for the polling delay
+        and returns True to let the caller poll the mailbox as before.
+
+        If a wake_event (threading.Event) is given, the wait also ends as soon as
+        it is set, checking it every WAKE_CHECK_TIME seconds while in IDLE.
+        """
+
+        if self.idle_supported is False:
+            if wake_event is None:
+                time.sleep(polling_delay)
+            else:
+                wake_event.wait(polling_delay)
+            return True
+
+        # Emails that arrived while the caller was busy are reported by NOOP
+        if self.new_emails_reported(self.imap_client.noop()[1]):
+            return True
+
+        deadline = time.time() + timeout
+
+        while time.time() < deadline:
+
+            if wake_event is not None and wake_event.is_set():
+                return True
+
+            idle_time = min(IDLE_RENEW_TIME, deadline - time.time())
+            if wake_event is not None:
+                idle_time = min(idle_time, WAKE_CHECK_TIME)
+
+            # Re-issuing IDLE every cycle to stay within the server's timeout
+            self.imap_client.idle()
+            try:
+                responses = self.imap_client.idle_check(timeout = idle_time)
+            finally:
+                # Responses that arrived while ending the IDLE are returned by idle_done
+                responses += self.imap_client.idle_done()[1]
+
+            if self.new_emails_reported(responses):
+                return True
+
+        return False
+
+    def new_emails_reported(self, responses):
+
+        """
+        Looking for an EXISTS response with more emails than before. Each EXPUNGE
+        (e.g. the processed emails moved out of the INBOX) lowers the count, so
+        the next EXISTS is compared with the actual number of emails.
+        """
+
+        new_emails = False
+
+        for response in responses:
+
+            if len(response) < 2:
+                continue
+
+            if response[1] == b'EXISTS':
+                if response[0] > self.exists:
+                    new_emails = True
+                self.exists = response[0]
+
+            elif response[1] == b'EXPUNGE':
+                self.exists = max(self.exists - 1, 0)
+
+        return new_emails
+
+    def close(self):
+
+        # Closing the IMAP session
+
+        self.imap_client.logout()
+        self.imap_client = None
+
+        return None
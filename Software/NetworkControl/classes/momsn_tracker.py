@@ -0,0 +1,185 @@
+# Library Imports
+import os
+import sys
+import json
+import threading
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import utility as util
+
+#-------------------------------------------------------------
+# Constants
+
+# A MOMSN this far below the last one means the modem's counter was reset (or wrapped at 65535)
+MOMSN_RESET_GAP = 10000
+
+# Larger gaps are not tracked (most likely a reset of the counter instead of lost emails)
+MAX_GAP_SIZE = 200
+
+# Number of times a missing MOMSN is searched for before giving up on it
+MAX_REFETCH_ATTEMPTS = 3
+
+#-------------------------------------------------------------
+# Class
+
+class MOMSNTracker():
+
+    """
+    The MOMSNTracker class keeps track of the MOMSNs (Mobile Originated Message
+    Sequence Numbers) of every station. Each RockBLOCK modem numbers its
+    transmissions sequentially, which is used for two things:
+
+        De-duplication -
+            A MOMSN that was already processed is the same transmission (e.g. the
+            same email found in INBOX and in All Mail), so the email can be dropped
+            before its body is downloaded and parsed.
+
+        Gap Detection -
+            When a MOMSN is skipped, it is recorded as missing, so the EmailClient
+            can search for exactly those emails instead of fetching more of the
+            latest emails to be safe.
+
+    For each station, the tracker stores the last MOMSN and the missing MOMSNs
+    below it (with the number of times they have been searched for). Just like
+    the UIDWatermark, new MOMSNs are staged and only written to the disk with
+    commit(), once the data has been safely stored in MySQL.
+
+    A single tracker is shared by the email cycles and the RockBLOCKReceiver's
+    worker thread (util.get_momsn_tracker), so it is protected by a lock and
+    the file is only ever written by one of them at a time.
+    """
+
+    def __init__(self, file_path = None):
+
+        if file_path is None:
+            file_path = os.path.join(util.LOCAL_DATA_PATH, "momsn_tracker.json")
+
+        self.file_path = file_path
+        self.lock = threading.RLock()
+        self.stations = self.load()
+        self.staged = {}
+
+        """
+        stations structure
+            {"station_email":
+                {"last": int,
+                 "missing": {"momsn": int (refetch attempts), ...}
+                }
+            }
+
+        staged structure
+            {"station_email": set(momsn, ...)}
+        """
+
+        return None
+
+    def load(self):
+
+        # Reading the tracker file, if it does not exist start from scratch
+
+        if not os.path.exists(self.file_path):
+            return {}
+
+        with open(self.file_path, "r") as tracker_file:
+            return json.load(tracker_file)
+
+    def save(self):
+
+        # Writing to a temporary file first to never leave a half-written file behind
+
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+        temp_file_path = self.file_path + ".tmp"
+        with open(temp_file_path, "w") as tracker_file:
+            json.dump(self.stations, tracker_file, indent=4, sort_keys=True)
+
+        os.replace(temp_file_path, self.file_path)
+
+        return None
+
+    def is_processed(self, station_email, momsn):
+
+        # Checking if the MOMSN of the station was already processed
+
+        with self.lock:
+
+            station = self.stations.get(station_email)
+
+            if station is None or momsn > station["last"]:
+                return False
+
+            if station["last"] - momsn > MOMSN_RESET_GAP: # New counter
+                return False
+
+            return str(momsn) not in station["missing"]
+
+    def missing(self, station_email):
+
+        # Getting the missing MOMSNs of the station, in ascending order
+
+        with self.lock:
+
+            station = self.stations.get(station_email)
+
+            if station is None:
+                return []
+
+            return sorted([int(momsn) for momsn in station["missing"].keys()])
+
+    def stage(self, station_email, momsn):
+
+        # Keeping the processed MOMSN in memory until commit() is called
+
+        with self.lock:
+            self.staged.setdefault(station_email, set()).add(momsn)
+
+        return None
+
+    def record_refetch_attempt(self, station_email, momsns):
+
+        # Counting a search for the missing MOMSNs, giving up after MAX_REFETCH_ATTEMPTS
+
+        with self.lock:
+
+            missing = self.stations[station_email]["missing"]
+
+            for momsn in momsns:
+                attempts = missing.get(str(momsn), 0) + 1
+                if attempts >= MAX_REFETCH_ATTEMPTS:
+                    missing.pop(str(momsn), None)
+                else:
+                    missing[str(momsn)] = attempts
+
+        return None
+
+    def commit(self):
+
+        # Moving the staged MOMSNs into the tracker, detecting the gaps, and saving it
+
+        with self.lock:
+
+            for station_email, momsns in self.staged.items():
+
+                for momsn in sorted(momsns):
+
+                    station = self.stations.get(station_email)
+
+                    if station is None or station["last"] - momsn > MOMSN_RESET_GAP: # First MOMSN or new counter
+                        self.stations[station_email] = {"last": momsn, "missing": {}}
+
+                    elif momsn > station["last"]:
+                        if momsn - station["last"] - 1 <= MAX_GAP_SIZE:
+                            for missing_momsn in range(station["last"] + 1, momsn):
+                                station["missing"][str(missing_momsn)] = 0
+                        station["last"] = momsn
+
+                    else: # A missing MOMSN was found
+                        station["missing"].pop(str(momsn), None)
+
+            self.staged = {}
+            self.save()
+
+        return None
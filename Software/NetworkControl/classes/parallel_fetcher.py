@@ -0,0 +1,142 @@
+# Library Imports
+import os
+import sys
+import queue
+import threading
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+from classes.imap_session import IMAPSession
+
+#-------------------------------------------------------------
+# Class
+
+class ParallelFetcher():
+
+    """
+    The ParallelFetcher class downloads large UID ranges (full-history backfills
+    or catching up after an outage) over a small pool of IMAP connections at
+    the same time, so the fetching is limited by the bandwidth instead of the
+    round-trips of a single connection.
+
+    The UIDs are split into chunks that the connections' threads take from a
+    work queue. Every fetched chunk ({uid: raw_message}) is put into a shared
+    parse queue, which is consumed (in the caller's thread) with iter_fetch().
+    The parse queue is bounded to keep the memory usage low if the parsing is
+    slower than the fetching.
+    """
+
+    def __init__(self, connections = 4, chunk_size = 100):
+
+        self.chunk_size = chunk_size
+        self.sessions = [IMAPSession() for i in range(connections)]
+        self.stop_event = threading.Event()
+
+        return None
+
+    def iter_fetch(self, folder, uids, chunk_size = None):
+
+        """
+        Generator that fetches the raw emails (BODY.PEEK[]) of the UIDs within the
+        folder and yields them as they arrive, one {uid: raw_message} chunk at a time.
+        The chunks have chunk_size UIDs (the fetcher's chunk_size by default).
+        If any connection fails, the error is raised here and the others stop.
+        """
+
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        uids = sorted(uids)
+        work_queue = queue.Queue()
+        parse_queue = queue.Queue(maxsize = 2 * len(self.sessions))
+
+        for i in range(0, len(uids), chunk_size):
+            work_queue.put(uids[i:i + chunk_size])
+
+        self.stop_event.clear()
+        threads = []
+
+        for session in self.sessions:
+            thread = threading.Thread(target = self.fetch_worker,
+                                      args = (session, folder, work_queue, parse_queue),
+                                      daemon = True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            finished_threads = 0
+
+            while finished_threads < len(threads):
+
+                item = parse_queue.get()
+
+                if item is None: # A thread ran out of chunks
+                    finished_threads += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+
+        finally:
+            # Stopping the other threads if anything went wrong
+            self.stop_event.set()
+
+            for thread in threads:
+                thread.join()
+
+        return None
+
+    def fetch_worker(self, session, folder, work_queue, parse_queue):
+
+        # Thread of a single connection: fetching chunks until the work queue is empty
+
+        try:
+            session.keepalive()
+            session.select_folder(folder)
+
+            while not self.stop_event.is_set():
+
+                try:
+                    uids = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                raw_messages = {}
+                for uid, fetch_data in session.fetch(uids, ['BODY.PEEK[]']).items():
+                    if b'BODY[]' in fetch_data:
+                        raw_messages[uid] = fetch_data[b'BODY[]']
+
+                self.put_in_queue(parse_queue, raw_messages)
+
+        except Exception as error:
+            self.put_in_queue(parse_queue, error)
+
+        self.put_in_queue(parse_queue, None)
+
+        return None
+
+    def put_in_queue(self, parse_queue, item):
+
+        # Waiting for space in the parse queue, unless the fetching was stopped
+
+        while not self.stop_event.is_set():
+            try:
+                parse_queue.put(item, timeout = 1)
+                return None
+            except queue.Full:
+                continue
+
+        return None
+
+    def close(self):
+
+        # Closing all the IMAP sessions
+
+        for session in self.sessions:
+            session.logout()
+
+        self.sessions = []
+
+        return None
@@ -0,0 +1,233 @@
+# Library Imports
+import os
+import sys
+import re
+import struct
+
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+#-------------------------------------------------------------
+# Class
+
+class PayloadLayout():
+
+    """
+    The PayloadLayout class describes the binary layout of the hex data that a
+    station transmits and decodes it. Each layout is compiled once into a NumPy
+    structured dtype (for decoding many emails at once) and a struct.Struct (for
+    decoding a single email), so all the hardware generations go through the
+    same decoding path.
+
+    The hex data is made of a header, a number of records (the sensor values
+    taken every record_interval minutes) and, for ring buffers, the byte with
+    the index of the latest record. The decoded records are always returned with
+    the latest record first.
+    """
+
+    def __init__(self, phase, payload_size, header_fields, record_offset, record_count,
+                 record_fields, record_interval, ring_index_offset = None, message_columns = ()):
+
+        self.phase = phase
+        self.payload_size = payload_size                # bytes
+        self.header_fields = header_fields              # {"name": offset, ...}
+        self.record_offset = record_offset              # offset of the first record
+        self.record_count = record_count
+        self.record_fields = record_fields              # (("column", scale), ...)
+        self.record_interval = record_interval          # minutes between records
+        self.ring_index_offset = ring_index_offset      # 1-based index of the latest record
+        self.message_columns = message_columns          # header fields added to every row
+
+        self.columns = tuple([column for column, scale in self.record_fields]) + tuple(self.message_columns)
+        self.hex_pattern = re.compile("[0-9a-fA-F]{{{}}}".format(self.payload_size * 2))
+
+        self.compile()
+
+        return None
+
+    def compile(self):
+
+        # Creating the NumPy dtype and the struct.Struct of the payload
+
+        record_dtype = np.dtype([(column, np.uint8) for column, scale in self.record_fields])
+
+        names = list(self.header_fields.keys()) + ["records"]
+        formats = [np.uint8 for name in self.header_fields] + [(record_dtype, (self.record_count,))]
+        offsets = list(self.header_fields.values()) + [self.record_offset]
+
+        if self.ring_index_offset is not None:
+            names.append("ring_index")
+            formats.append(np.uint8)
+            offsets.append(self.ring_index_offset)
+
+        self.dtype = np.dtype({"names": names,
+                               "formats": formats,
+                               "offsets": offsets,
+                               "itemsize": self.payload_size})
+
+        self.struct = struct.Struct("{}B".format(self.payload_size))
+
+        # One entry (database row) per record, e.g. for the Transmission records
+        entry_fields = [("time_id", "datetime64[ns]")]
+        entry_fields += [(column, np.int16 if scale == 1 else np.float64) for column, scale in self.record_fields]
+        entry_fields += [(column, np.int16) for column in self.message_columns]
+        entry_fields += [("latitude", np.float64), ("longitude", np.float64), ("timezone", "U3")]
+
+        self.entry_dtype = np.dtype(entry_fields)
+
+        return None
+
+    def is_valid_hex_data(self, hex_data):
+
+        # Checking that the hex data is long enough and only has hex characters
+
+        return hex_data is not None and self.hex_pattern.match(hex_data) is not None
+
+    def is_valid_payload(self, payload):
+
+        # Checking that the raw payload (e.g. the .sbd attachment) is long enough
+
+        return payload is not None and len(payload) >= self.payload_size
+
+    def record_order(self, ring_index):
+
+        """
+        Position of the records within the payload, latest record first. For
+        ring buffers, this depends on the ring index of each email.
+        """
+
+        if self.ring_index_offset is None:
+            positions = np.arange(self.record_count - 1, -1, -1)
+            return np.broadcast_to(positions, (len(ring_index), self.record_count))
+
+        latest = ring_index.astype(np.int64)[:, np.newaxis] - 1
+        return (latest - np.arange(self.record_count)) % self.record_count
+
+    def decode_batch(self, hex_data_list):
+
+        """
+        Decoding the hex data of many emails at once. The hex data is converted
+        into a single contiguous buffer (one copy, by bytes.fromhex) that is
+        viewed with the layout's structured dtype: the header and record fields
+        sit at their byte offsets, so no slice of the buffer is reshaped. The
+        records are then copied once, when they are put in latest-first order,
+        and once more into the output columns. Returns the column arrays
+        (record_count rows per email, in email order, latest record first) and
+        the mask of emails that have a valid ring index.
+        """
+
+        hex_buffer = "".join([hex_data[:self.payload_size * 2] for hex_data in hex_data_list])
+
+        return self.decode_buffer(bytes.fromhex(hex_buffer))
+
+    def decode_payload_batch(self, payload_list):
+
+        # Same as decode_batch, but for raw payloads (the .sbd attachments) without any hex conversion
+
+        return self.decode_buffer(b"".join([payload[:self.payload_size] for payload in payload_list]))
+
+    def decode_buffer(self, buffer):
+
+        # Decoding the contiguous buffer of payload_size bytes per email (payloads is a view of it)
+
+        payloads = np.frombuffer(buffer, dtype=self.dtype)
+
+        if self.ring_index_offset is not None:
+            ring_index = payloads["ring_index"]
+            valid = (ring_index >= 1) & (ring_index <= self.record_count)
+        else:
+            ring_index = np.zeros(len(payloads), dtype=np.uint8)
+            valid = np.ones(len(payloads), dtype=bool)
+
+        order = self.record_order(ring_index)
+        records = np.take_along_axis(payloads["records"], order, axis=1)
+
+        data_sets = {}
+
+        for column, scale in self.record_fields:
+            if scale == 1:
+                data_sets[column] = records[column].astype(np.int64).ravel()
+            else:
+                data_sets[column] = (records[column] / scale).ravel()
+
+        for column in self.message_columns:
+            data_sets[column] = np.repeat(payloads[column].astype(np.int64), self.record_count)
+
+        return data_sets, valid
+
+    def decode(self, hex_data):
+
+        # Decoding a single email, returns {"column": [latest, ...], ...}
+
+        payload = self.struct.unpack_from(bytes.fromhex(hex_data[:self.payload_size * 2]))
+
+        if self.ring_index_offset is not None:
+            ring_index = payload[self.ring_index_offset]
+            if ring_index < 1 or ring_index > self.record_count:
+                raise RuntimeError("CORRUPTED DATA TRANSMISSION")
+        else:
+            ring_index = 0
+
+        order = self.record_order(np.array([ring_index]))[0]
+        record_size = len(self.record_fields)
+
+        data = {}
+
+        for i, (column, scale) in enumerate(self.record_fields):
+            values = [payload[self.record_offset + position * record_size + i] for position in order]
+            data[column] = [value / scale if scale != 1 else value for value in values]
+
+        for column in self.message_columns:
+            data[column] = [payload[self.header_fields[column]] for i in range(self.record_count)]
+
+        return data
+
+#-------------------------------------------------------------
+# Payload Layouts
+
+# Phase 1: 2 header bytes followed by 8 records of 5 bytes, 90 minutes apart
+PHASE_ONE_LAYOUT = PayloadLayout(phase = 1,
+                                 payload_size = 42,
+                                 header_fields = {"transmitted_number": 0, "alarm": 1},
+                                 record_offset = 2,
+                                 record_count = 8,
+                                 record_fields = (("sensor_1", 1),
+                                                  ("sensor_2", 1),
+                                                  ("sensor_3", 1),
+                                                  ("reference", 1),
+                                                  ("weight_lbs", 1)),
+                                 record_interval = 90)
+
+# Phase 2: 2 header bytes followed by a ring buffer of 14 records of 3 bytes (50 minutes
+# apart), the index of the latest record (byte 44) and the present values (bytes 45-47),
+# which are the same as the latest record
+PHASE_TWO_LAYOUT = PayloadLayout(phase = 2,
+                                 payload_size = 48,
+                                 header_fields = {"transmitted_number": 0, "alarm": 1,
+                                                  "present_weight": 45, "present_amps": 46,
+                                                  "present_volts": 47},
+                                 record_offset = 2,
+                                 record_count = 14,
+                                 record_fields = (("weight_lbs", 1),
+                                                  ("amps", 100),
+                                                  ("volts", 10)),
+                                 record_interval = 50,
+                                 ring_index_offset = 44,
+                                 message_columns = ("alarm",))
+
+PAYLOAD_LAYOUTS = {1: PHASE_ONE_LAYOUT, 2: PHASE_TWO_LAYOUT}
+
+def get_payload_layout(water_station):
+
+    # Selecting the layout of a station by its "phase" within STATION_INFO (Phase 1 by default)
+
+    phase = int(water_station.get("phase", 1))
+
+    if phase not in PAYLOAD_LAYOUTS:
+        raise RuntimeError("NO PAYLOAD LAYOUT FOR PHASE {} STATIONS".format(phase))
+
+    return PAYLOAD_LAYOUTS[phase]
@@ -0,0 +1,202 @@
+# Library Imports
+import os
+import sys
+import datetime
+
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import global_variables as gv
+from classes.payload_layout import get_payload_layout
+from classes.local_time_converter import LocalTimeConverter
+
+#-------------------------------------------------------------
+# Constants
+
+# Delay between polls while a station's transmission is expected
+DENSE_POLLING_DELAY = 2 * 60
+
+# Delay between polls while a station is overdue
+OVERDUE_POLLING_DELAY = 5 * 60
+
+# Longest delay between polls, even if no transmission is expected
+SPARSE_POLLING_DELAY = 60 * 60
+
+# The expected arrival window goes from EARLY_MARGIN before to LATE_MARGIN after the expected time
+EARLY_MARGIN = 20 * 60
+LATE_MARGIN = 60 * 60
+
+# Number of observed transmission periods used to learn the period of each station
+PERIOD_HISTORY_SIZE = 10
+
+#-------------------------------------------------------------
+# Class
+
+class PollingScheduler():
+
+    """
+    The PollingScheduler class decides how long to wait before checking the
+    emails again, instead of always polling every 10 minutes. Each station
+    transmits once per period (8 records 90 minutes apart, 12 hours, for Phase 1
+    stations), so the arrival of its next email can be expected:
+
+        Phase -
+            The latest time_id of the station in MySQL is the transmit time of its
+            latest email (the latest record), and the next email is expected one
+            period later.
+
+        Period -
+            The period starts as the nominal one of the station's PayloadLayout
+            (record_count * record_interval) and is then learned from the changes
+            of the latest time_id observed between updates (the median of the last
+            PERIOD_HISTORY_SIZE periods, skipped transmissions taken into account).
+            When the scheduler is created, it is seeded with the recent time_ids of
+            each station (seed), so the period does not start over on every restart.
+
+    Then, the polling is dense (DENSE_POLLING_DELAY) within the expected arrival
+    window of any station, sparse otherwise (waiting until the next window, at
+    most SPARSE_POLLING_DELAY) and escalated to OVERDUE_POLLING_DELAY when a
+    station is later than its window.
+    """
+
+    def __init__(self):
+
+        self.local_time_converter = LocalTimeConverter()
+        self.stations = {}
+
+        for water_station in gv.STATION_INFO:
+            payload_layout = get_payload_layout(water_station)
+            nominal_period = payload_layout.record_count * payload_layout.record_interval * 60
+            self.stations[water_station["email"]] = {"number": water_station["number"],
+                                                     "nominal_period": nominal_period,
+                                                     "record_interval": payload_layout.record_interval * 60,
+                                                     "latest_time_id": None,
+                                                     "periods": []}
+
+        """
+        stations structure
+            {"station_email":
+                {"number": int,
+                 "nominal_period": int (seconds),
+                 "record_interval": int (seconds),
+                 "latest_time_id": np.datetime64 (stored time_id),
+                 "periods": [int (seconds), ...]
+                }
+            }
+        """
+
+        return None
+
+    def seed(self, time_ids_by_station):
+
+        """
+        Learning the phase and the period of the stations from their recent
+        time_ids (e.g. the StationStateStore's entries), all the records of the
+        transmissions: {"station_email": array of time_ids}. The records of a
+        transmission are exactly record_interval apart, so the latest record of
+        each transmission is found where that spacing breaks, and those are given
+        to update() in order, like if they had been observed one by one.
+        """
+
+        for station_email, time_ids in time_ids_by_station.items():
+
+            if station_email not in self.stations or len(time_ids) == 0:
+                continue
+
+            time_ids = np.unique(np.asarray(time_ids, dtype="datetime64[s]"))
+            spacings = np.diff(time_ids) / np.timedelta64(1, "s")
+
+            is_latest_record = np.append(spacings != self.stations[station_email]["record_interval"], True)
+
+            for latest_time_id in time_ids[is_latest_record]:
+                self.update({station_email: latest_time_id})
+
+        return None
+
+    def update(self, latest_time_ids):
+
+        """
+        Updating the stations' latest time_id (stored, fixed offset), e.g. from the MySQL
+        database, and learning their periods from how much it moved forward.
+        latest_time_ids structure: {"station_email": datetime or None}
+        """
+
+        for station_email, latest_time_id in latest_time_ids.items():
+
+            if station_email not in self.stations or latest_time_id is None:
+                continue
+
+            station = self.stations[station_email]
+            latest_time_id = np.datetime64(latest_time_id, "s")
+            previous_time_id = station["latest_time_id"]
+
+            if previous_time_id is not None and latest_time_id > previous_time_id:
+
+                # Dividing by the number of periods, in case transmissions were skipped
+                elapsed_time = int((latest_time_id - previous_time_id) / np.timedelta64(1, "s"))
+                number_of_periods = max(1, round(elapsed_time / station["nominal_period"]))
+                period = elapsed_time / number_of_periods
+
+                # Ignoring periods that are too far off (e.g. after a long outage)
+                if 0.5 * station["nominal_period"] <= period <= 1.5 * station["nominal_period"]:
+                    station["periods"] = (station["periods"] + [period])[-1 * PERIOD_HISTORY_SIZE:]
+
+            if previous_time_id is None or latest_time_id > previous_time_id:
+                station["latest_time_id"] = latest_time_id
+
+        return None
+
+    def get_period(self, station_email):
+
+        # Learned period of the station (seconds), the nominal one until enough is observed
+
+        station = self.stations[station_email]
+
+        if len(station["periods"]) == 0:
+            return station["nominal_period"]
+
+        return float(np.median(station["periods"]))
+
+    def get_station_delay(self, station_email, now):
+
+        # Seconds until the station should be polled again
+
+        station = self.stations[station_email]
+
+        if station["latest_time_id"] is None: # Nothing known about the station
+            return SPARSE_POLLING_DELAY
+
+        period = self.get_period(station_email)
+        expected_time = station["latest_time_id"] + np.timedelta64(int(period), "s")
+        time_until_expected = (expected_time - now) / np.timedelta64(1, "s")
+
+        if time_until_expected > EARLY_MARGIN: # Waiting for the window to start
+            return min(time_until_expected - EARLY_MARGIN, SPARSE_POLLING_DELAY)
+
+        if time_until_expected >= -1 * LATE_MARGIN: # Within the expected arrival window
+            return DENSE_POLLING_DELAY
+
+        print("STATION {} IS OVERDUE BY {} MINUTES".format(station["number"], int(-1 * time_until_expected / 60)))
+
+        return OVERDUE_POLLING_DELAY
+
+    def get_polling_delay(self, now = None):
+
+        """
+        Seconds to wait before the next poll: the shortest delay of all the stations.
+        now is the current UTC time (datetime), which is converted to the fixed
+        offset of the time_ids to be compared with them.
+        """
+
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        stored_now, timezone = self.local_time_converter.to_storage(np.datetime64(now, "s"))
+
+        delays = [self.get_station_delay(station_email, stored_now) for station_email in self.stations.keys()]
+
+        return int(min(delays + [SPARSE_POLLING_DELAY]))
@@ -0,0 +1,128 @@
+# Library Imports
+import os
+import sys
+import sqlite3
+import hashlib
+import datetime
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import utility as util
+
+#-------------------------------------------------------------
+# Class
+
+class QuarantineLedger():
+
+    """
+    The QuarantineLedger class keeps track of the emails that could not be
+    parsed (missing or corrupted data, invalid ring index, etc.), so that the
+    same bad emails are not downloaded and parsed again on every cycle.
+
+    The ledger is a SQLite database with one entry per quarantined email: its
+    location in the IMAP server (folder, UIDVALIDITY and UID), the station that
+    sent it, the SHA-256 hash of its raw email and the reason of the failure.
+    The EmailClient skips the quarantined UIDs before fetching, and the
+    quarantined hashes while parsing (the same email in another folder).
+
+    The quarantined emails can be listed and parsed again with quarantine.py.
+    """
+
+    def __init__(self, file_path = None):
+
+        if file_path is None:
+            file_path = os.path.join(util.LOCAL_DATA_PATH, "quarantine.sqlite3")
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        self.file_path = file_path
+        self.cnx = sqlite3.connect(self.file_path)
+        self.create_tables()
+
+        return None
+
+    def create_tables(self):
+
+        # Creating the table if this is a new ledger
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS quarantine ("
+                         "folder TEXT NOT NULL, "
+                         "uidvalidity INTEGER NOT NULL, "
+                         "uid INTEGER NOT NULL, "
+                         "station_email TEXT NOT NULL, "
+                         "hash TEXT NOT NULL, "
+                         "reason TEXT NOT NULL, "
+                         "quarantined_at TEXT NOT NULL, "
+                         "PRIMARY KEY (folder, uidvalidity, uid))")
+
+        self.cnx.execute("CREATE INDEX IF NOT EXISTS quarantine_hash ON quarantine (hash)")
+
+        self.cnx.commit()
+
+        return None
+
+    def add_messages(self, folder, uidvalidity, messages):
+
+        """
+        Quarantining emails in a single transaction.
+        messages is a list of (uid, station_email, raw_message, reason) tuples.
+        """
+
+        quarantined_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+
+        for uid, station_email, raw_message, reason in messages:
+            message_hash = hashlib.sha256(raw_message).hexdigest()
+            rows.append((folder, int(uidvalidity), uid, station_email, message_hash, reason, quarantined_at))
+
+        with self.cnx:
+            self.cnx.executemany("INSERT OR REPLACE INTO quarantine VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        return None
+
+    def quarantined_uids(self, folder, uidvalidity):
+
+        # Getting the set of quarantined UIDs of the folder
+
+        rows = self.cnx.execute("SELECT uid FROM quarantine WHERE folder = ? AND uidvalidity = ?",
+                                (folder, uidvalidity))
+
+        return set([row[0] for row in rows])
+
+    def quarantined_hashes(self):
+
+        # Getting the hashes of all the quarantined emails with their reasons, {hash: reason}
+
+        rows = self.cnx.execute("SELECT hash, reason FROM quarantine")
+
+        return dict(rows.fetchall())
+
+    def entries(self):
+
+        # Getting all the quarantined emails as dictionaries, oldest first
+
+        rows = self.cnx.execute("SELECT folder, uidvalidity, uid, station_email, hash, reason, quarantined_at "
+                                "FROM quarantine ORDER BY quarantined_at, folder, uid")
+        keys = ("folder", "uidvalidity", "uid", "station_email", "hash", "reason", "quarantined_at")
+
+        return [dict(zip(keys, row)) for row in rows]
+
+    def release(self, folder, uidvalidity, uids):
+
+        # Removing emails from the quarantine (before parsing them again)
+
+        with self.cnx:
+            self.cnx.executemany("DELETE FROM quarantine WHERE folder = ? AND uidvalidity = ? AND uid = ?",
+                                 [(folder, uidvalidity, uid) for uid in uids])
+
+        return None
+
+    def close(self):
+
+        # Closing the SQLite connection
+
+        self.cnx.close()
+
+        return None
@@ -0,0 +1,150 @@
+# Library Imports
+import os
+import sys
+import sqlite3
+import hashlib
+import zlib
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import utility as util
+
+#-------------------------------------------------------------
+# Class
+
+class RawMessageStore():
+
+    """
+    The RawMessageStore class keeps a local copy of every raw email (BODY[])
+    fetched from the IMAP server, so that the emails can be parsed again (after
+    a parser fix, for example) without downloading them all over again.
+
+    The store is a SQLite database with two tables:
+
+        blobs -
+            The zlib-compressed raw emails, keyed by their SHA-256 hash. An email
+            found in multiple folders (INBOX and All Mail) is only stored once.
+
+        messages -
+            The location of the emails in the IMAP server (folder, UIDVALIDITY
+            and UID), the station that sent it and the hash of its raw email.
+    """
+
+    def __init__(self, file_path = None):
+
+        if file_path is None:
+            file_path = os.path.join(util.LOCAL_DATA_PATH, "raw_messages.sqlite3")
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        self.file_path = file_path
+        self.cnx = sqlite3.connect(self.file_path)
+        self.create_tables()
+
+        return None
+
+    def create_tables(self):
+
+        # Creating the tables if this is a new store
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS blobs ("
+                         "hash TEXT PRIMARY KEY, "
+                         "body BLOB NOT NULL)")
+
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS messages ("
+                         "folder TEXT NOT NULL, "
+                         "uidvalidity INTEGER NOT NULL, "
+                         "uid INTEGER NOT NULL, "
+                         "station_email TEXT NOT NULL, "
+                         "hash TEXT NOT NULL, "
+                         "PRIMARY KEY (folder, uidvalidity, uid))")
+
+        self.cnx.commit()
+
+        return None
+
+    def add_messages(self, folder, uidvalidity, messages):
+
+        """
+        Storing the raw emails in a single transaction.
+        messages is a list of (uid, station_email, raw_message) tuples.
+        """
+
+        blob_rows = []
+        message_rows = []
+
+        for uid, station_email, raw_message in messages:
+            message_hash = hashlib.sha256(raw_message).hexdigest()
+            blob_rows.append((message_hash, zlib.compress(raw_message)))
+            message_rows.append((folder, int(uidvalidity), uid, station_email, message_hash))
+
+        with self.cnx:
+            self.cnx.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", blob_rows)
+            self.cnx.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?)", message_rows)
+
+        return None
+
+    def latest_uidvalidity(self, folder):
+
+        # UIDVALIDITY of the most recently stored emails of the folder, None if empty
+
+        row = self.cnx.execute("SELECT uidvalidity FROM messages WHERE folder = ? "
+                               "ORDER BY rowid DESC LIMIT 1", (folder,)).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def uidvalidities(self, folder):
+
+        # Every UIDVALIDITY the emails of the folder were stored with, oldest first
+
+        rows = self.cnx.execute("SELECT uidvalidity FROM messages WHERE folder = ? "
+                                "GROUP BY uidvalidity ORDER BY MIN(rowid)", (folder,))
+
+        return [row[0] for row in rows]
+
+    def station_uids(self, folder, uidvalidity):
+
+        # Getting all the stored UIDs of the folder, by station and in ascending order
+
+        station_uids = {}
+
+        rows = self.cnx.execute("SELECT station_email, uid FROM messages "
+                                "WHERE folder = ? AND uidvalidity = ? ORDER BY uid",
+                                (folder, uidvalidity))
+
+        for station_email, uid in rows:
+            station_uids.setdefault(station_email, []).append(uid)
+
+        return station_uids
+
+    def get_messages(self, folder, uidvalidity, uids):
+
+        # Reading the raw emails of the UIDs, returns {uid: raw_message}
+
+        raw_messages = {}
+
+        for i in range(0, len(uids), 500): # SQLite limits the number of parameters
+
+            uids_chunk = list(uids[i:i + 500])
+            command = ("SELECT messages.uid, blobs.body FROM messages "
+                       "JOIN blobs ON blobs.hash = messages.hash "
+                       "WHERE messages.folder = ? AND messages.uidvalidity = ? "
+                       "AND messages.uid IN ({})".format(",".join("?" * len(uids_chunk))))
+
+            for uid, body in self.cnx.execute(command, [folder, uidvalidity] + uids_chunk):
+                raw_messages[uid] = zlib.decompress(body)
+
+        return raw_messages
+
+    def close(self):
+
+        # Closing the SQLite connection
+
+        self.cnx.close()
+
+        return None
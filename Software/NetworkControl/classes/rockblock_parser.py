@@ -0,0 +1,253 @@
+# Library Imports
+import os
+import sys
+import re
+import time
+import email.parser
+import email.policy
+
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+from classes.payload_layout import PAYLOAD_LAYOUTS
+
+#-------------------------------------------------------------
+# Constants
+
+# "Field: value" lines of the RockBLOCK emails' text
+FIELD_PATTERN = re.compile(rb"^(IMEI|MOMSN|Transmit Time|Iridium Latitude|Iridium Longitude|Iridium CEP|Data): *([^\r\n]*)",
+                           re.MULTILINE)
+
+# A quoted-printable part, where the fields can be soft-wrapped ("=" line endings)
+QUOTED_PRINTABLE_PATTERN = re.compile(rb"^Content-Transfer-Encoding:[ \t]*quoted-printable", re.MULTILINE | re.IGNORECASE)
+
+FIELD_NAMES = {b"IMEI": "imei",
+               b"MOMSN": "momsn",
+               b"Transmit Time": "transmit_time",
+               b"Iridium Latitude": "latitude",
+               b"Iridium Longitude": "longitude",
+               b"Iridium CEP": "cep",
+               b"Data": "data"}
+
+#-------------------------------------------------------------
+# Class
+
+class RockBLOCKParser():
+
+    """
+    The RockBLOCKParser class extracts the information of the RockBLOCK emails
+    (transmit time, location, CEP, MOMSN and the hex data) directly from the
+    raw email in a single pass, instead of building a complete PyzMessage and
+    looking for the information at fixed line numbers.
+
+    The text of the RockBLOCK emails is not encoded, so the fields are normally
+    found with one regular expression search over the raw bytes. Only if the
+    essential fields are not found (a base64 text part, for example), or if the
+    email has a quoted-printable part (whose long lines, like the hex data, are
+    soft-wrapped and would be cut), the email is parsed with the standard
+    library and only the text part is decoded.
+    """
+
+    def __init__(self):
+
+        self.bytes_parser = email.parser.BytesParser(policy = email.policy.compat32)
+
+        return None
+
+    def parse(self, raw_message):
+
+        """
+        Returns the fields of the email:
+            {"imei": str, "momsn": int, "transmit_time": str, "latitude": str,
+             "longitude": str, "cep": str, "data": str}
+        with None for the fields that were not found.
+        """
+
+        fields = self.find_fields(raw_message)
+
+        if fields["transmit_time"] is None or fields["data"] is None or QUOTED_PRINTABLE_PATTERN.search(raw_message):
+            text = self.decode_text_part(raw_message)
+            if text is not None:
+                fields = self.find_fields(text)
+
+        return fields
+
+    def find_fields(self, text):
+
+        # Single pass over the text looking for the "Field: value" lines
+
+        fields = dict.fromkeys(FIELD_NAMES.values())
+
+        for match in FIELD_PATTERN.finditer(text):
+            field_name = FIELD_NAMES[match.group(1)]
+            if fields[field_name] is None: # Keeping the first occurrence
+                fields[field_name] = match.group(2).strip().decode("ascii", "replace")
+
+        if fields["momsn"] is not None:
+            try:
+                fields["momsn"] = int(fields["momsn"])
+            except ValueError:
+                fields["momsn"] = None
+
+        return fields
+
+    def decode_text_part(self, raw_message):
+
+        # Parsing the email and decoding only its first text/plain part
+
+        message = self.bytes_parser.parsebytes(raw_message)
+
+        for part in message.walk():
+            if part.get_content_type() == "text/plain":
+                return part.get_payload(decode = True)
+
+        return None
+
+#-------------------------------------------------------------
+# Functions
+
+def parse_raw_messages(raw_messages, phase, payloads = None):
+
+    """
+    Parsing and decoding a list of raw emails of stations with the same payload
+    layout (phase). This is a module-level function to be able to run it within a
+    ProcessPoolExecutor, and it returns compact lists and arrays instead of
+    DataFrames to keep the transfer between the processes small.
+
+    If the raw payloads (the .sbd attachments) are given, raw_messages can be only
+    the text parts of the emails, and the payloads are decoded directly instead of
+    the hex data of the text:
+
+        {"indexes": [int, ...],         # Position of the valid emails in raw_messages
+         "transmit_times": [str, ...],
+         "latitudes": [str, ...],
+         "longitudes": [str, ...],
+         "momsns": [int, ...],
+         "data_sets": {"column": array, ...},   # record_count entries per valid email
+         "failures": [(int, str), ...]}         # Position and reason of the invalid emails
+    """
+
+    payload_layout = PAYLOAD_LAYOUTS[phase]
+    rockblock_parser = RockBLOCKParser()
+
+    parsed_data = {"indexes": [], "transmit_times": [], "latitudes": [], "longitudes": [], "momsns": [], "failures": []}
+    hex_data_list = []
+    payload_list = []
+
+    for i, raw_message in enumerate(raw_messages):
+
+        try:
+            fields = rockblock_parser.parse(raw_message)
+        except Exception as error:
+            parsed_data["failures"].append((i, "PARSING ERROR: {}".format(error)))
+            continue
+
+        # Corrupted Data Transmission
+        if fields["transmit_time"] is None:
+            parsed_data["failures"].append((i, "MISSING TRANSMIT TIME"))
+            continue
+
+        # Same conversion as EmailClient.generate_time_id_sets (e.g. "2020-01-26T17:08:22Z UTC")
+        try:
+            np.datetime64(fields["transmit_time"][:19], "s")
+        except ValueError:
+            parsed_data["failures"].append((i, "INVALID TRANSMIT TIME"))
+            continue
+
+        if payloads is not None:
+            if not payload_layout.is_valid_payload(payloads[i]):
+                parsed_data["failures"].append((i, "INVALID PAYLOAD SIZE"))
+                continue
+            payload_list.append(payloads[i])
+        else:
+            if fields["data"] is None:
+                parsed_data["failures"].append((i, "MISSING DATA"))
+                continue
+            if not payload_layout.is_valid_hex_data(fields["data"]):
+                parsed_data["failures"].append((i, "INVALID HEX DATA"))
+                continue
+            hex_data_list.append(fields["data"])
+
+        parsed_data["indexes"].append(i)
+        parsed_data["transmit_times"].append(fields["transmit_time"])
+        parsed_data["latitudes"].append(fields["latitude"])
+        parsed_data["longitudes"].append(fields["longitude"])
+        parsed_data["momsns"].append(fields["momsn"])
+
+    if payloads is not None:
+        data_sets, valid = payload_layout.decode_payload_batch(payload_list)
+    else:
+        data_sets, valid = payload_layout.decode_batch(hex_data_list)
+
+    # Removing the emails that could not be decoded (corrupted ring index)
+    if not valid.all():
+        for index, is_valid in zip(parsed_data["indexes"], valid):
+            if not is_valid:
+                parsed_data["failures"].append((index, "INVALID RING INDEX"))
+        for key in ("indexes", "transmit_times", "latitudes", "longitudes", "momsns"):
+            parsed_data[key] = [value for value, is_valid in zip(parsed_data[key], valid) if is_valid]
+        for column, values in data_sets.items():
+            data_sets[column] = values.reshape(len(valid), payload_layout.record_count)[valid].ravel()
+
+    parsed_data["data_sets"] = data_sets
+
+    return parsed_data
+
+#---------------------------------------------------------------
+# Running Code
+
+if __name__ == "__main__":
+
+    """
+    This section is a micro-benchmark comparing the RockBLOCKParser with the
+    previous parsing (PyzMessage + fixed line numbers), in messages per second.
+    """
+
+    import pyzmail
+
+    raw_message = (b"From: 300234067638620@rockblock.rock7.com\r\n"
+                   b"Subject: SBD Msg From Unit: 300234067638620\r\n"
+                   b"MIME-Version: 1.0\r\n"
+                   b"Content-Type: multipart/mixed; boundary=\"BOUNDARY\"\r\n\r\n"
+                   b"--BOUNDARY\r\n"
+                   b"Content-Type: text/plain; charset=\"us-ascii\"\r\n\r\n"
+                   b"IMEI: 300234067638620\r\n\r\n"
+                   b"MOMSN: 1234\r\n"
+                   b"Transmit Time: 2020-01-26T17:08:22Z UTC\r\n"
+                   b"Iridium Latitude: 26.3041\r\n"
+                   b"Iridium Longitude: -98.1632\r\n"
+                   b"Iridium CEP: 3.0\r\n"
+                   b"Iridium Session Status: 0\r\n"
+                   b"Data: " + b"0a" * 48 + b"\r\n\r\n"
+                   b"--BOUNDARY\r\n"
+                   b"Content-Type: application/octet-stream; name=\"300234067638620_001234.sbd\"\r\n"
+                   b"Content-Transfer-Encoding: base64\r\n\r\n"
+                   b"CgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoK\r\n\r\n"
+                   b"--BOUNDARY--\r\n")
+
+    def previous_parsing(raw_message):
+        message = pyzmail.PyzMessage.factory(raw_message)
+        email_text = message.text_part.get_payload().decode(message.text_part.charset)
+        lines = email_text.split("\n")
+        original_time_id = lines[3].split(" ")[2] + lines[3].split(" ")[3].replace("\r","")
+        hex_data = lines[8].split(" ")[1].replace("\r","")
+        latitude = lines[4].split(" ")[2].replace("\r", "")
+        longitude = lines[5].split(" ")[2].replace("\r", "")
+        return original_time_id, hex_data, latitude, longitude
+
+    rockblock_parser = RockBLOCKParser()
+    number_of_messages = 5000
+
+    for name, parse in (("PyzMessage + line numbers", previous_parsing),
+                        ("RockBLOCKParser", rockblock_parser.parse)):
+
+        start_time = time.perf_counter()
+        for i in range(number_of_messages):
+            parse(raw_message)
+        elapsed_time = time.perf_counter() - start_time
+
+        print("{}: {:.0f} messages/second".format(name, number_of_messages / elapsed_time))
@@ -0,0 +1,383 @@
+# Library Imports
+import os
+import sys
+import json
+import hmac
+import queue
+import threading
+import datetime
+import http.server
+import urllib.parse
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import global_variables as gv
+import utility as util
+from classes.email_client import EmailClient
+from classes.transmission import create_station_transmissions
+
+#-------------------------------------------------------------
+# Constants
+
+# Address where the RockBLOCK HTTP POSTs are received, only the local interface
+# since the receiver is meant to sit behind a reverse proxy (which handles HTTPS)
+RECEIVER_HOST = "127.0.0.1"
+RECEIVER_PORT = 8080
+
+# Secret expected in the "token" query parameter of the delivery URL configured
+# in RockBLOCK (e.g. https://example.com/rockblock?token=...), None to not check it
+RECEIVER_TOKEN = os.environ.get("ROCKBLOCK_RECEIVER_TOKEN")
+
+# Time to wait for more messages before ingesting a batch, and the largest batch
+BATCH_DELAY = 5
+MAX_BATCH_SIZE = 500
+
+#-------------------------------------------------------------
+# Class
+
+class RockBLOCKReceiver():
+
+    """
+    The RockBLOCKReceiver class is an alternative to the emails: a small HTTP
+    server that receives the messages that RockBLOCK delivers by HTTP POST as
+    soon as they are transmitted, without the latency of Gmail and IMAP.
+
+    Each POST (form-encoded or JSON) has the fields imei, momsn, transmit_time,
+    iridium_latitude, iridium_longitude, iridium_cep and data (hex). The request
+    handler only validates the message and puts it in a work queue, so RockBLOCK
+    gets its response right away. A worker thread takes the messages from the
+    queue in batches, decodes them like the emails (PayloadLayout and the
+    EmailClient's time_id generation) and ingests them through the same
+    DataFrameHandler -> MySQLClient path (util.add_email_info_to_mysql).
+
+    Only the local interface is listened to by default, the receiver being
+    exposed through a reverse proxy. When a token is given, the POSTs without
+    it in the query string of their URL are rejected (403).
+
+    After every ingested batch the new_data event is set, so the email cycle
+    (util.has_received_new_data) generates and uploads the data files even
+    though the emails of these messages are then skipped as duplicates.
+
+    The MOMSNs of the ingested messages are recorded in the MOMSNTracker, so
+    the emails of the same messages are skipped when they arrive later. The
+    tracker is the one shared with the email cycles (util.get_momsn_tracker),
+    so both never write the tracker file over each other.
+    """
+
+    def __init__(self, host = RECEIVER_HOST, port = RECEIVER_PORT, ingest = None, momsn_tracker = None,
+                 token = RECEIVER_TOKEN):
+
+        # Only used to decode the messages, so no IMAP connection
+        self.email_client = EmailClient(offline = True)
+
+        # Function that receives the email_info-like dictionary of every batch
+        if ingest is None:
+            ingest = util.add_email_info_to_mysql
+        self.ingest = ingest
+
+        # Records the MOMSNs of the ingested messages
+        if momsn_tracker is None:
+            momsn_tracker = util.get_momsn_tracker()
+        self.momsn_tracker = momsn_tracker
+
+        self.token = token
+
+        self.work_queue = queue.Queue()
+        self.worker_thread = None
+        self.stop_event = threading.Event()
+
+        # Set once messages are ingested, until the email cycle generates the data files
+        self.new_data = threading.Event()
+
+        self.server = http.server.ThreadingHTTPServer((host, port), self.create_request_handler())
+
+        return None
+
+    def create_request_handler(self):
+
+        # Creating the request handler class, bound to this receiver
+
+        receiver = self
+
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_POST(self):
+
+                if not receiver.is_authorized(self.path):
+                    self.send_text(403, "ERROR: INVALID TOKEN")
+                    return None
+
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    self.send_text(400, "ERROR: INVALID CONTENT-LENGTH")
+                    return None
+                body = self.rfile.read(length)
+
+                try:
+                    message = receiver.parse_post(body, self.headers.get("Content-Type", ""))
+                except ValueError as error:
+                    self.send_text(400, "ERROR: {}".format(error))
+                    return None
+
+                receiver.work_queue.put(message)
+                self.send_text(200, "OK")
+
+                return None
+
+            def send_text(self, code, text):
+
+                self.send_response(code)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(text)))
+                self.end_headers()
+                self.wfile.write(text.encode())
+
+                return None
+
+            def log_message(self, format, *args):
+
+                print("ROCKBLOCK POST: " + format % args)
+
+                return None
+
+        return RequestHandler
+
+    def is_authorized(self, path):
+
+        # Checking the token in the query string of the POST's URL, if the receiver has one
+
+        if self.token is None:
+            return True
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        token = query.get("token", [""])[0]
+
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def parse_post(self, body, content_type):
+
+        """
+        Validating a POST and converting it into a message:
+            {"station_email": str, "momsn": int, "transmit_time": str,
+             "latitude": str, "longitude": str, "data": str}
+        Raises a ValueError if the message cannot be ingested.
+        """
+
+        if content_type.startswith("application/json"):
+            try:
+                fields = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise ValueError("INVALID JSON")
+            if not isinstance(fields, dict): # e.g. a list or a number
+                raise ValueError("INVALID JSON")
+
+            # Same string values as the form-encoded POSTs (e.g. the MOMSN can be a JSON number)
+            for key, value in fields.items():
+                if isinstance(value, (dict, list, bool)):
+                    raise ValueError("INVALID JSON FIELD: {}".format(key))
+                if value is not None:
+                    fields[key] = str(value)
+        else:
+            fields = {key: values[0] for key, values in urllib.parse.parse_qs(body.decode("ascii", "replace")).items()}
+
+        water_station = self.email_client.station_index.get(str(fields.get("imei", "")))
+        if water_station is None:
+            raise ValueError("UNKNOWN IMEI")
+
+        payload_layout = self.email_client.station_layouts[water_station["email"]]
+        if not payload_layout.is_valid_hex_data(fields.get("data")):
+            raise ValueError("INVALID HEX DATA")
+
+        try:
+            momsn = int(fields["momsn"])
+            transmit_time = format_transmit_time(fields["transmit_time"])
+        except (KeyError, ValueError):
+            raise ValueError("INVALID MOMSN OR TRANSMIT TIME")
+
+        message = {"station_email": water_station["email"],
+                   "momsn": momsn,
+                   "transmit_time": transmit_time,
+                   "latitude": str(fields.get("iridium_latitude", "")),
+                   "longitude": str(fields.get("iridium_longitude", "")),
+                   "data": fields["data"]}
+
+        return message
+
+    def worker(self):
+
+        # Taking the messages from the work queue in batches until the receiver is stopped
+
+        while not self.stop_event.is_set():
+
+            try:
+                messages = [self.work_queue.get(timeout = 1)]
+            except queue.Empty:
+                continue
+
+            # Waiting a little for other messages to ingest them together
+            try:
+                while len(messages) < MAX_BATCH_SIZE:
+                    messages.append(self.work_queue.get(timeout = BATCH_DELAY))
+            except queue.Empty:
+                pass
+
+            try:
+                self.process_messages(messages)
+            except Exception as error: # Keeping the receiver alive
+                print("FAILED TO INGEST {} ROCKBLOCK MESSAGES: {}".format(len(messages), error))
+
+        return None
+
+    def process_messages(self, messages):
+
+        """
+        Decoding a batch of messages and ingesting them. The email_info given to
+        the ingest function is keyed by MOMSN instead of UID:
+            {"station_email": {momsn: Transmission}}
+        """
+
+        # Grouping the messages by payload layout
+        layout_messages = {}
+        for message in messages:
+            payload_layout = self.email_client.station_layouts[message["station_email"]]
+            layout_messages.setdefault(payload_layout, []).append(message)
+
+        station_parts = {} # {"station_email": [(momsn, momsn, entries), ...]}
+
+        for payload_layout, layout_group in layout_messages.items():
+
+            data_sets, valid = payload_layout.decode_batch([message["data"] for message in layout_group])
+
+            # Same format as parse_raw_messages
+            parsed_data = {"indexes": [], "transmit_times": [], "latitudes": [], "longitudes": [], "momsns": []}
+
+            for i, message in enumerate(layout_group):
+                if not valid[i]:
+                    print("CORRUPTED ROCKBLOCK MESSAGE: MOMSN {} OF {}".format(message["momsn"], message["station_email"]))
+                    continue
+                parsed_data["indexes"].append(i)
+                parsed_data["transmit_times"].append(message["transmit_time"])
+                parsed_data["latitudes"].append(message["latitude"])
+                parsed_data["longitudes"].append(message["longitude"])
+                parsed_data["momsns"].append(message["momsn"])
+
+            if not valid.all():
+                for column, values in data_sets.items():
+                    data_sets[column] = values.reshape(len(valid), payload_layout.record_count)[valid].ravel()
+            parsed_data["data_sets"] = data_sets
+
+            entries = self.email_client.generate_entries(parsed_data, payload_layout)
+            size = payload_layout.record_count
+
+            for i, index in enumerate(parsed_data["indexes"]):
+                message = layout_group[index]
+                station_parts.setdefault(message["station_email"], []).append((message["momsn"], message["momsn"],
+                                                                                entries[i * size:(i + 1) * size]))
+
+        email_info = {}
+        for station_email, parts in station_parts.items():
+            email_info[station_email] = create_station_transmissions(station_email, parts)
+
+        if email_info == {}:
+            return None
+
+        self.ingest(email_info)
+
+        # The emails of these messages do not have to be processed anymore
+        for station_email, momsn_content in email_info.items():
+            for momsn in momsn_content.keys():
+                self.momsn_tracker.stage(station_email, momsn)
+        self.momsn_tracker.commit()
+
+        # Letting the email cycle know that the data files are out of date
+        self.new_data.set()
+
+        print("INGESTED {} ROCKBLOCK MESSAGES".format(sum([len(momsn_content) for momsn_content in email_info.values()])))
+
+        return None
+
+    def start(self):
+
+        # Running the server and the worker in background threads
+
+        self.stop_event.clear()
+
+        self.worker_thread = threading.Thread(target = self.worker, daemon = True)
+        self.worker_thread.start()
+
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+        return None
+
+    def stop(self):
+
+        # Stopping the server, then letting the worker finish the queued messages
+
+        self.server.shutdown()
+        self.server.server_close()
+
+        while not self.work_queue.empty():
+            self.stop_event.wait(0.1)
+
+        self.stop_event.set()
+        if self.worker_thread is not None:
+            self.worker_thread.join()
+
+        return None
+
+#-------------------------------------------------------------
+# Functions
+
+def format_transmit_time(transmit_time):
+
+    """
+    Converting RockBLOCK's transmit time (UTC, e.g. "21-03-15 10:41:50") into the
+    format of the emails' transmit time (e.g. "2021-03-15T10:41:50Z UTC").
+    """
+
+    transmit_time = transmit_time.strip()
+
+    try:
+        utc_datetime = datetime.datetime.strptime(transmit_time, "%y-%m-%d %H:%M:%S")
+    except ValueError: # Already in the format of the emails (ISO 8601)
+        utc_datetime = datetime.datetime.strptime(transmit_time[:19], "%Y-%m-%dT%H:%M:%S")
+
+    return utc_datetime.strftime("%Y-%m-%dT%H:%M:%SZ UTC")
+
+#---------------------------------------------------------------
+# Running Code
+
+if __name__ == "__main__":
+
+    """
+    This section is for testing purpose regarding this class: the receiver is
+    started locally and a RockBLOCK POST is sent to it, printing the dataframes
+    instead of adding them to MySQL.
+    """
+
+    import urllib.request
+
+    def print_email_info(email_info):
+        for station_email, momsn_content in email_info.items():
+            for momsn, transmission in momsn_content.items():
+                print("{} MOMSN {}:\n{}".format(station_email, momsn, transmission.to_dataframe()))
+
+    rockblock_receiver = RockBLOCKReceiver("127.0.0.1", RECEIVER_PORT, ingest = print_email_info, token = None)
+    rockblock_receiver.start()
+
+    imei = gv.STATION_INFO[0]["email"].split("@")[0]
+    post_data = urllib.parse.urlencode({"imei": imei,
+                                        "momsn": 1234,
+                                        "transmit_time": "20-01-26 17:08:22",
+                                        "iridium_latitude": "26.3041",
+                                        "iridium_longitude": "-98.1632",
+                                        "iridium_cep": "3.0",
+                                        "data": "0a" * 48}).encode()
+
+    with urllib.request.urlopen("http://127.0.0.1:{}".format(RECEIVER_PORT), data = post_data) as response:
+        print("RESPONSE: {} {}".format(response.status, response.read().decode()))
+
+    rockblock_receiver.stop()
@@ -0,0 +1,260 @@
+# Library Imports
+import os
+import sys
+import threading
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import global_variables as gv
+from classes.payload_layout import get_payload_layout
+from classes.time_series_buffer import TimeSeriesBuffer
+from classes.transmission import parse_coordinates
+
+#-------------------------------------------------------------
+# Constants
+
+# Number of recent entries kept for each station (the plot file uses the last 30)
+RECENT_ENTRY_CAPACITY = 240
+
+#-------------------------------------------------------------
+# Class
+
+class StationStateStore():
+
+    """
+    The StationStateStore class keeps the recent state of every station in
+    memory for the whole life of the process, so the data files (table, plot
+    and markers) can be generated without querying MySQL for the entries that
+    the process added seconds earlier:
+
+        Recent Entries -
+            A fixed-size ring buffer (RECENT_ENTRY_CAPACITY entries) of each
+            station's latest entries, as a structured array with the station's
+            entry_dtype. New entries overwrite the oldest ones. Entries older than
+            the latest one (e.g. refetched missing emails) are merged back in
+            time_id order instead.
+
+        Latest Snapshot -
+            The values of each station's latest entry, for the table and markers
+            files.
+
+    The store is loaded once from MySQL (the latest RECENT_ENTRY_CAPACITY
+    entries of each table), then updated by the ingest stage with the entries
+    added to MySQL. Since the RockBLOCKReceiver ingests from its own thread, the
+    store is protected by a lock.
+    """
+
+    def __init__(self, capacity = RECENT_ENTRY_CAPACITY):
+
+        self.capacity = capacity
+        self.loaded = False
+        self.lock = threading.Lock()
+
+        self.stations = {}
+        self.snapshots = {}
+
+        for water_station in gv.STATION_INFO:
+            entry_dtype = get_payload_layout(water_station).entry_dtype
+            self.stations[water_station["email"]] = {"entries": np.zeros(self.capacity, dtype=entry_dtype),
+                                                     "head": 0,
+                                                     "count": 0}
+
+        """
+        stations structure
+            {"station_email":
+                {"entries": np.array (ring buffer, entry_dtype),
+                 "head": int (position of the next entry),
+                 "count": int (number of entries in the ring)
+                }
+            }
+
+        snapshots structure
+            {"station_email": {"time_id": datetime, "weight_lbs": int, ..., "timezone": str}}
+        """
+
+        return None
+
+    def load(self, mysql_client):
+
+        # Filling the store with the latest entries of each table, only the first time
+
+        with self.lock:
+
+            if self.loaded:
+                return None
+
+            mysql_client.fetch_data(limit = self.capacity)
+
+            for station_email, df in mysql_client.mysql_table_df.items():
+                if station_email in self.stations:
+                    self.update_station(station_email, self.dataframe_to_entries(station_email, df))
+
+            self.loaded = True
+
+        return None
+
+    def dataframe_to_entries(self, station_email, df):
+
+        # Converting a MySQL table's dataframe (indexed by time_id) into entries of the station's entry_dtype
+
+        entries = np.zeros(len(df), dtype=self.stations[station_email]["entries"].dtype)
+        entries["time_id"] = df.index.values.astype("datetime64[ns]")
+
+        for name in entries.dtype.names:
+
+            if name == "time_id" or name not in df.columns:
+                continue
+
+            if name in ("latitude", "longitude"):
+                entries[name] = parse_coordinates(df[name].tolist())
+            elif name == "timezone":
+                entries[name] = df[name].fillna("").astype(str).to_numpy()
+            else:
+                entries[name] = df[name].fillna(0).to_numpy()
+
+        return entries
+
+    def add_entries(self, all_emails_entries):
+
+        """
+        Adding the entries of the DataFrameHandler {"station_email": entries} once
+        they are in MySQL. Nothing is done until the store is loaded, since the
+        entries are then loaded from MySQL with the rest.
+        """
+
+        with self.lock:
+
+            if not self.loaded:
+                return None
+
+            for station_email, entries in all_emails_entries.items():
+                if station_email in self.stations and len(entries) != 0:
+                    self.update_station(station_email, entries)
+
+        return None
+
+    def update_station(self, station_email, entries):
+
+        # Writing the entries into the station's ring buffer and updating its snapshot
+
+        station = self.stations[station_email]
+        ring = station["entries"]
+
+        if len(entries) == 0:
+            return None
+
+        # Ascending time_id order, keeping only what fits in the ring
+        entries = entries[np.argsort(entries["time_id"], kind="stable")][-1 * self.capacity:]
+
+        latest_time_id = ring["time_id"][(station["head"] - 1) % self.capacity] if station["count"] != 0 else None
+
+        if latest_time_id is None or entries["time_id"][0] > latest_time_id: # Usual case, newer entries
+
+            positions = (station["head"] + np.arange(len(entries))) % self.capacity
+            for name in ring.dtype.names:
+                ring[name][positions] = entries[name]
+
+            station["head"] = int((station["head"] + len(entries)) % self.capacity)
+            station["count"] = min(station["count"] + len(entries), self.capacity)
+
+        else: # Older or repeated entries, merging them with the ring in time_id order
+
+            time_series_buffer = TimeSeriesBuffer()
+            time_series_buffer.merge_entries(self.get_entries(station_email, self.capacity)[::-1])
+            time_series_buffer.merge_entries(entries)
+            merged_entries = time_series_buffer.to_entries(ascending = True)[-1 * self.capacity:]
+
+            for name in ring.dtype.names:
+                ring[name][:len(merged_entries)] = merged_entries[name]
+
+            station["head"] = len(merged_entries) % self.capacity
+            station["count"] = len(merged_entries)
+
+        latest_entry = ring[(station["head"] - 1) % self.capacity]
+        snapshot = {name: latest_entry[name].item() for name in ring.dtype.names}
+        snapshot["time_id"] = latest_entry["time_id"].astype("datetime64[us]").item()
+
+        # Missing coordinates are NaN in the entries, but NULL (None) in MySQL
+        for name in ("latitude", "longitude"):
+            if name in snapshot and np.isnan(snapshot[name]):
+                snapshot[name] = None
+
+        self.snapshots[station_email] = snapshot
+
+        return None
+
+    def get_entries(self, station_email, size):
+
+        # Getting the latest size entries of the station (at most the capacity), latest first
+
+        station = self.stations[station_email]
+        positions = (station["head"] - 1 - np.arange(min(size, station["count"]))) % self.capacity
+
+        return station["entries"][positions]
+
+    def get_dataframes(self, size):
+
+        """
+        Getting the latest size entries of every station as dataframes indexed by
+        time_id (latest first), in the format of MySQLClient.mysql_table_df.
+        """
+
+        with self.lock:
+
+            dfs = {}
+
+            for station_email in self.stations.keys():
+                entries = self.get_entries(station_email, size)
+                dfs[station_email] = restore_missing_coordinates(pd.DataFrame(entries).set_index("time_id"))
+
+        return dfs
+
+    def get_time_ids(self):
+
+        # Getting the time_ids of every station's recent entries, {"station_email": np.array (oldest first)}
+
+        with self.lock:
+            return {station_email: self.get_entries(station_email, self.capacity)["time_id"][::-1]
+                    for station_email in self.stations.keys()}
+
+    def get_latest_time_ids(self):
+
+        # Getting the time_id of each station's latest entry, {"station_email": datetime or None}
+
+        with self.lock:
+            return {station_email: self.snapshots.get(station_email, {}).get("time_id") for station_email in self.stations.keys()}
+
+    def get_latest_dataframes(self):
+
+        # Getting the snapshot of every station as a single-row dataframe indexed by time_id
+
+        with self.lock:
+
+            dfs = {}
+
+            for station_email in self.stations.keys():
+                snapshot = self.snapshots.get(station_email)
+                rows = [snapshot] if snapshot is not None else []
+                dfs[station_email] = pd.DataFrame(rows, columns = self.stations[station_email]["entries"].dtype.names)
+                dfs[station_email] = dfs[station_email].set_index("time_id")
+
+        return dfs
+
+#-------------------------------------------------------------
+# Functions
+
+def restore_missing_coordinates(df):
+
+    # Converting the missing coordinates (NaN in the entries) back into None, like the NULLs of MySQL
+
+    for name in ("latitude", "longitude"):
+        if name in df.columns:
+            df[name] = df[name].astype(object).where(df[name].notna(), None)
+
+    return df
@@ -0,0 +1,261 @@
+# Library Imports
+import os
+import sys
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+#-------------------------------------------------------------
+# Class
+
+class TimeSeriesBuffer():
+
+    """
+    The TimeSeriesBuffer class holds the entries of a station with a unique and
+    sorted time_id as an invariant, so the dataframes of many emails can be
+    combined without appending them one by one and sorting and de-duplicating
+    the whole dataframe after every step (util.sort_and_clean_df).
+
+    The entries are kept as NumPy arrays (the time_ids in ascending order and
+    one array per column). A batch of dataframes is merged with a single concat,
+    a stable sort of only the batch, and a searchsorted-based merge into the
+    existing entries, which is linear in the size of the buffer. When a time_id
+    is found more than once, the latest entry wins (the later dataframe of the
+    batch, and the batch over the existing entries).
+
+    The entries can also be merged and handed out as structured NumPy arrays
+    (e.g. the entries of the Transmissions) with merge_entries() and
+    to_entries(). DataFrames are only created at the edges, with to_dataframe(),
+    in the usual format of the repository (indexed by time_id, latest first).
+    """
+
+    def __init__(self, index_name = "time_id"):
+
+        self.index_name = index_name
+        self.time_ids = np.array([], dtype="datetime64[ns]")
+        self.columns = {}
+
+        """
+        columns structure
+            {"column": np.array (same order as time_ids), ...}
+        """
+
+        return None
+
+    def __len__(self):
+
+        return len(self.time_ids)
+
+    def merge(self, dfs):
+
+        """
+        Merging a dataframe, or a list of dataframes (oldest first), into the buffer.
+        The dataframes are indexed by time_id or have a time_id column.
+        """
+
+        if isinstance(dfs, pd.DataFrame):
+            dfs = [dfs]
+
+        dfs = [df for df in dfs if not df.empty]
+        if len(dfs) == 0:
+            return None
+
+        batch = pd.concat(dfs) if len(dfs) > 1 else dfs[0]
+        if self.index_name in batch.columns:
+            batch = batch.set_index(self.index_name)
+
+        columns = {column: batch[column].to_numpy() for column in batch.columns}
+
+        return self.merge_arrays(batch.index.values, columns)
+
+    def merge_entries(self, entries):
+
+        # Merging a structured array of entries (with a time_id field), the later entries win
+
+        if len(entries) == 0:
+            return None
+
+        columns = {name: entries[name] for name in entries.dtype.names if name != self.index_name}
+
+        return self.merge_arrays(entries[self.index_name], columns)
+
+    def merge_arrays(self, time_ids, columns):
+
+        """
+        Merging a batch given as its time_ids and the arrays of its columns
+        {"column": array}, in the order of the batch (the later rows win).
+        """
+
+        time_ids = np.asarray(time_ids).astype("datetime64[ns]")
+
+        # Sorting the batch (stable, so the later rows of a time_id stay last) and keeping the last row of each time_id
+        order = np.argsort(time_ids, kind="stable")
+        time_ids = time_ids[order]
+        is_last = np.append(time_ids[1:] != time_ids[:-1], True)
+        order = order[is_last]
+        time_ids = time_ids[is_last]
+
+        columns = {column: np.asarray(values)[order] for column, values in columns.items()}
+
+        if len(self.columns) == 0: # First batch
+            self.time_ids = time_ids
+            self.columns = columns
+            return None
+
+        if set(columns.keys()) != set(self.columns.keys()):
+            raise ValueError("The columns of the batch do not match the buffer: {}".format(list(columns.keys())))
+
+        # Dropping the existing entries that are replaced by the batch
+        replaced = self.find(time_ids)
+        old_time_ids = self.time_ids[~replaced]
+
+        # Each entry of the batch goes to its insertion point plus the number of batch entries before it
+        positions = np.searchsorted(old_time_ids, time_ids) + np.arange(len(time_ids))
+        is_new = np.zeros(len(old_time_ids) + len(time_ids), dtype=bool)
+        is_new[positions] = True
+
+        merged_time_ids = np.empty(len(is_new), dtype="datetime64[ns]")
+        merged_time_ids[positions] = time_ids
+        merged_time_ids[~is_new] = old_time_ids
+
+        for column, old_values in self.columns.items():
+            new_values = columns[column]
+            merged_values = np.empty(len(is_new), dtype=np.result_type(old_values.dtype, new_values.dtype))
+            merged_values[positions] = new_values
+            merged_values[~is_new] = old_values[~replaced]
+            self.columns[column] = merged_values
+
+        self.time_ids = merged_time_ids
+
+        return None
+
+    def find(self, time_ids):
+
+        # Getting the mask of the buffer's entries whose time_id is within time_ids
+
+        time_ids = np.unique(np.asarray(time_ids, dtype="datetime64[ns]"))
+
+        if len(time_ids) == 0 or len(self.time_ids) == 0:
+            return np.zeros(len(self.time_ids), dtype=bool)
+
+        positions = np.searchsorted(time_ids, self.time_ids).clip(max = len(time_ids) - 1)
+
+        return time_ids[positions] == self.time_ids
+
+    def drop(self, time_ids):
+
+        # Removing the entries with these time_ids (e.g. the ones already in MySQL), returns how many were removed
+
+        found = self.find(time_ids)
+
+        self.time_ids = self.time_ids[~found]
+        for column in self.columns.keys():
+            self.columns[column] = self.columns[column][~found]
+
+        return int(found.sum())
+
+    def to_dataframe(self, ascending = False):
+
+        # Creating the dataframe of the entries, indexed by time_id (latest first by default)
+
+        step = 1 if ascending else -1
+
+        index = pd.DatetimeIndex(self.time_ids[::step], name = self.index_name)
+        data = {column: values[::step] for column, values in self.columns.items()}
+
+        return pd.DataFrame(data, index = index)
+
+    def to_entries(self, ascending = False):
+
+        # Creating a structured array of the entries, with the time_id first (latest first by default)
+
+        step = 1 if ascending else -1
+
+        dtype = [(self.index_name, self.time_ids.dtype)]
+        dtype += [(column, values.dtype) for column, values in self.columns.items()]
+
+        entries = np.empty(len(self.time_ids), dtype=dtype)
+        entries[self.index_name] = self.time_ids[::step]
+        for column, values in self.columns.items():
+            entries[column] = values[::step]
+
+        return entries
+
+#---------------------------------------------------------------
+# Running Code
+
+if __name__ == "__main__":
+
+    """
+    This section is a benchmark of the TimeSeriesBuffer against the previous
+    approach (appending the emails' dataframes one by one and cleaning the
+    whole dataframe with util.sort_and_clean_df), with thousands of emails per
+    station, some of them duplicated.
+    """
+
+    import time
+    import utility as util
+
+    NUMBER_OF_STATIONS = 5
+    EMAILS_PER_STATION = 3000
+    RECORD_COUNT = 8
+
+    rng = np.random.default_rng(0)
+    start_time = np.datetime64("2020-01-01T00:00:00", "ns")
+
+    stations = []
+    for station in range(NUMBER_OF_STATIONS):
+
+        dfs = []
+        email_times = start_time + np.arange(EMAILS_PER_STATION) * np.timedelta64(12, "h")
+        email_times = np.concatenate([email_times, rng.choice(email_times, EMAILS_PER_STATION // 10)]) # Duplicated emails
+
+        for email_time in email_times:
+            time_ids = email_time - np.arange(RECORD_COUNT) * np.timedelta64(90, "m")
+            dfs.append(pd.DataFrame({"time_id": time_ids,
+                                     "weight_lbs": rng.integers(0, 2000, RECORD_COUNT),
+                                     "latitude": ["26.3041"] * RECORD_COUNT,
+                                     "longitude": ["-98.1632"] * RECORD_COUNT,
+                                     "timezone": ["CST"] * RECORD_COUNT}).set_index("time_id"))
+        stations.append(dfs)
+
+    # Previous approach: one append (concat) and one sort_and_clean_df per email
+    benchmark_start = time.time()
+    previous_dfs = []
+    for dfs in stations:
+        df = dfs[0]
+        for i in range(1, len(dfs)):
+            df = util.sort_and_clean_df(pd.concat([df, dfs[i]]))
+        previous_dfs.append(df)
+    previous_time = time.time() - benchmark_start
+
+    # TimeSeriesBuffer: a single merge of all the emails of each station
+    benchmark_start = time.time()
+    buffer_dfs = []
+    for dfs in stations:
+        time_series_buffer = TimeSeriesBuffer()
+        time_series_buffer.merge(dfs)
+        buffer_dfs.append(time_series_buffer.to_dataframe())
+    buffer_time = time.time() - benchmark_start
+
+    # TimeSeriesBuffer: merging the emails in batches of 100, like the fetch chunks
+    benchmark_start = time.time()
+    for dfs in stations:
+        time_series_buffer = TimeSeriesBuffer()
+        for i in range(0, len(dfs), 100):
+            time_series_buffer.merge(dfs[i:i + 100])
+        time_series_buffer.to_dataframe()
+    batch_time = time.time() - benchmark_start
+
+    for previous_df, buffer_df in zip(previous_dfs, buffer_dfs):
+        assert previous_df.index.equals(buffer_df.index)
+
+    print("{} STATIONS x {} EMAILS".format(NUMBER_OF_STATIONS, len(stations[0])))
+    print("APPEND + SORT_AND_CLEAN_DF: {:.3f} s".format(previous_time))
+    print("TIMESERIESBUFFER (SINGLE MERGE): {:.3f} s".format(buffer_time))
+    print("TIMESERIESBUFFER (BATCHES OF 100): {:.3f} s".format(batch_time))
@@ -0,0 +1,97 @@
+# Library Imports
+import os
+import sys
+
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+#-------------------------------------------------------------
+# Class
+
+class Transmission():
+
+    """
+    The Transmission class is the compact record of a parsed email (or RockBLOCK
+    message), which replaces the raw email and its own small DataFrame within
+    the email_info once the email is parsed:
+
+        station_email, uid (or any other key, e.g. the MOMSN), momsn -
+            The identity of the transmission.
+
+        entries -
+            The entries of the transmission (one per record, latest first) as a
+            view of the structured NumPy array of its station's batch, with the
+            dtype of the station's PayloadLayout (entry_dtype).
+
+    The class uses __slots__, so every transmission only costs a few pointers
+    instead of a dictionary, and the entries of all the transmissions of a
+    station share a single contiguous array. DataFrames are only created at the
+    edges, with to_dataframe().
+    """
+
+    __slots__ = ("station_email", "uid", "momsn", "entries")
+
+    def __init__(self, station_email, uid, momsn, entries):
+
+        self.station_email = station_email
+        self.uid = uid
+        self.momsn = momsn
+        self.entries = entries
+
+        return None
+
+    def __repr__(self):
+
+        return "Transmission({}, uid={}, momsn={}, {} entries)".format(self.station_email, self.uid,
+                                                                       self.momsn, len(self.entries))
+
+    def to_dataframe(self):
+
+        # Creating the dataframe of the entries, indexed by time_id (for printing, etc.)
+
+        df = pd.DataFrame(self.entries)
+
+        return df.set_index("time_id")
+
+#-------------------------------------------------------------
+# Functions
+
+def create_station_transmissions(station_email, parts):
+
+    """
+    Creating the Transmissions of a station from its parsed emails, given as a
+    list of (uid, momsn, entries). The entries are copied into a single array
+    for the station's batch, and each Transmission gets a view of its part.
+    Returns {uid: Transmission}.
+    """
+
+    station_entries = np.concatenate([entries for uid, momsn, entries in parts])
+
+    transmissions = {}
+    start = 0
+
+    for uid, momsn, entries in parts:
+        stop = start + len(entries)
+        transmissions[uid] = Transmission(station_email, uid, momsn, station_entries[start:stop])
+        start = stop
+
+    return transmissions
+
+def parse_coordinates(coordinates):
+
+    # Converting the latitudes or longitudes of the emails (str) into floats, NaN if missing
+
+    values = np.full(len(coordinates), np.nan)
+
+    for i, coordinate in enumerate(coordinates):
+        try:
+            values[i] = float(coordinate)
+        except (TypeError, ValueError):
+            pass
+
+    return values
@@ -0,0 +1,169 @@
+# Library Imports
+import os
+import sys
+import json
+
+# Local Imports
+ROOT_DIR = os.path.abspath("../")
+sys.path.append(ROOT_DIR)
+
+import utility as util
+
+#-------------------------------------------------------------
+# Class
+
+class UIDWatermark():
+
+    """
+    The UIDWatermark class keeps track of the highest email UID that has already
+    been processed for each station, per IMAP folder. With it, the EmailClient
+    only has to ask the server for "UID n:*" instead of searching the entire
+    folder on every cycle.
+
+    IMAP UIDs are only meaningful together with the folder's UIDVALIDITY value.
+    If the server ever changes the UIDVALIDITY of a folder, all the stored UIDs
+    of that folder are discarded, which makes the next fetch a full rescan. The
+    duplicates of a full rescan are later removed by the DataFrameHandler when
+    comparing against the MySQL database.
+
+    New UIDs are first staged and only written to the disk with commit(), which
+    should be called once the data has been safely stored in MySQL.
+
+    The watermark also keeps the STATUS (UIDVALIDITY, UIDNEXT and MESSAGES) of a
+    folder at the last completed cycle, so a single STATUS command tells if
+    anything arrived since then and the whole cycle can be skipped otherwise.
+    """
+
+    def __init__(self, file_path = None):
+
+        if file_path is None:
+            file_path = os.path.join(util.LOCAL_DATA_PATH, "uid_watermark.json")
+
+        self.file_path = file_path
+        self.folders = self.load()
+        self.staged = {}
+
+        """
+        folders structure
+            {"folder_name":
+                {"uidvalidity": int,
+                 "stations": {"station_email": int, ...},
+                 "status": {"uidvalidity": int, "uidnext": int, "messages": int}
+                }
+            }
+
+        staged structure
+            {"folder_name": {"station_email": int, ...}}
+        """
+
+        return None
+
+    def load(self):
+
+        # Reading the watermark file, if it does not exist start from scratch
+
+        if not os.path.exists(self.file_path):
+            return {}
+
+        with open(self.file_path, "r") as watermark_file:
+            return json.load(watermark_file)
+
+    def save(self):
+
+        # Writing to a temporary file first to never leave a half-written file behind
+
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+        temp_file_path = self.file_path + ".tmp"
+        with open(temp_file_path, "w") as watermark_file:
+            json.dump(self.folders, watermark_file, indent=4, sort_keys=True)
+
+        os.replace(temp_file_path, self.file_path)
+
+        return None
+
+    def check_uidvalidity(self, folder, uidvalidity):
+
+        """
+        Comparing the server's UIDVALIDITY of the folder with the stored one.
+        If they differ, the stored UIDs are not valid anymore and are reset,
+        forcing a full rescan of the folder. Returns False when a reset occurred.
+        """
+
+        uidvalidity = int(uidvalidity)
+        folder_info = self.folders.get(folder)
+
+        if folder_info is not None and folder_info["uidvalidity"] == uidvalidity:
+            return True
+
+        if folder_info is not None:
+            print("UIDVALIDITY CHANGED FOR {} - RESCANNING FOLDER".format(folder))
+
+        self.folders[folder] = {"uidvalidity": uidvalidity, "stations": {}}
+        self.staged.pop(folder, None)
+
+        return folder_info is None
+
+    def get(self, folder, station_email):
+
+        # Highest processed UID of the station, 0 if nothing has been processed
+
+        if folder not in self.folders:
+            return 0
+
+        return self.folders[folder]["stations"].get(station_email, 0)
+
+    def stage(self, folder, station_email, uid):
+
+        # Keeping the new highest UID in memory until commit() is called
+
+        folder_staged = self.staged.setdefault(folder, {})
+        folder_staged[station_email] = max(uid, folder_staged.get(station_email, 0))
+
+        return None
+
+    def has_folder_changed(self, folder, folder_status):
+
+        # Comparing the STATUS of the folder with the one recorded at the last completed cycle
+
+        recorded_status = self.folders.get(folder, {}).get("status")
+
+        return recorded_status != status_to_dict(folder_status)
+
+    def record_folder_status(self, folder, folder_status):
+
+        # Saving the STATUS of the folder once the cycle that followed it is completed
+
+        folder_info = self.folders.setdefault(folder, {"uidvalidity": int(folder_status[b'UIDVALIDITY']),
+                                                       "stations": {}})
+        folder_info["status"] = status_to_dict(folder_status)
+        self.save()
+
+        return None
+
+    def commit(self):
+
+        # Moving the staged UIDs into the watermark and saving it
+
+        for folder, stations in self.staged.items():
+
+            folder_stations = self.folders[folder]["stations"]
+
+            for station_email, uid in stations.items():
+                folder_stations[station_email] = max(uid, folder_stations.get(station_email, 0))
+
+        self.staged = {}
+        self.save()
+
+        return None
+
+#-------------------------------------------------------------
+# Functions
+
+def status_to_dict(folder_status):
+
+    # Converting the STATUS response ({b'UIDNEXT': int, ...}) into what is stored in the file
+
+    return {"uidvalidity": int(folder_status[b'UIDVALIDITY']),
+            "uidnext": int(folder_status[b'UIDNEXT']),
+            "messages": int(folder_status[b'MESSAGES'])}
@@ -0,0 +1,42 @@
+# Common Core Libraries
+import argparse
+import os
+import time
+
+# Local Imports
+import classes as clss
+
+#--------------------------------------------------------------------
+# Main Functions
+
+def main():
+
+    """
+    Command line interface of the MailboxImporter, to rebuild the MySQL
+    database from an exported mailbox instead of fetching it over IMAP:
+
+        python import_mailbox.py Takeout/Mail/All.mbox          # Google Takeout export
+        python import_mailbox.py ~/Maildir --workers 4          # maildir, parsing with 4 processes
+    """
+
+    parser = argparse.ArgumentParser(description = "Import the stations' emails of an mbox or maildir export into MySQL")
+    parser.add_argument("path", help = "mbox file or maildir directory")
+    parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "Parsing processes (all the cores by default)")
+    parser.add_argument("--batch-size", type = int, default = clss.mailbox_importer.IMPORT_BATCH_SIZE,
+                        help = "Emails parsed and added to MySQL at once")
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    mailbox_importer = clss.MailboxImporter(args.path, args.batch_size)
+    imported_emails = mailbox_importer.import_messages(args.workers)
+
+    print("IMPORTED {} EMAILS IN {} SECONDS".format(imported_emails, round(time.time() - start_time)))
+
+    return None
+
+#--------------------------------------------------------------------
+# Main Code
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,21 @@ import os
 import utility as util
 import classes as clss
 
+#--------------------------------------------------------------------
+# Constants
+
+# Running as a daemon with IMAP IDLE (python main.py --idle) instead of polling
+IDLE_MODE = "--idle" in sys.argv
+
+# Longest wait between cycles, even if no emails arrive while in IDLE
+IDLE_MAX_WAIT = 60 * 60
+
+# Also receiving the RockBLOCK messages by HTTP POST (python main.py --http)
+HTTP_MODE = "--http" in sys.argv
+
+# Only downloading the text part and the .sbd attachment of the emails (python main.py --attachments)
+ATTACHMENT_MODE = "--attachments" in sys.argv
+
 #--------------------------------------------------------------------
 # Main Functions
 
@@ -16,30 +31,66 @@ def main():
 
     # Reporting time when routines are executed
     print("CHECKING EMAILS AT " + str(datetime.datetime.now()))
-    
-    # First update mysql database
-    print("UPDATING MYSQL DATABASE")
-    util.update_mysql_database("New", 1)
-    util.update_mysql_database("Last", 2)
-
-    # Generate all output files
-    print("GENERATING OUTPUT FILES")
-    util.generate_table_file()
-    util.generate_plot_file(30)
-    util.generate_markers_file()
-
-    # Upload data to server
-    print("UPLOADING DATA TO SERVER")
-    util.upload_all_data_files()
-
-    # Sleeping for 10 minutes
-    print("SLEEPING FOR 10 minutes")
-    time.sleep(10 * 60)
+
+    # Checking with a single STATUS command if anything arrived since the last cycle
+    mailbox_status = util.probe_mailbox()
+    mailbox_changed = util.has_mailbox_changed(mailbox_status)
+    new_data = []
+
+    if mailbox_changed:
+
+        # First update mysql database
+        print("UPDATING MYSQL DATABASE")
+        new_data = [util.update_mysql_database("New", 1, attachment_only = ATTACHMENT_MODE),
+                    util.update_mysql_database("Last", 2, attachment_only = ATTACHMENT_MODE),
+                    util.refetch_missing_emails()]
+
+    else:
+        print("NO NEW EMAILS")
+
+    # Messages received by HTTP are already in MySQL (their emails are then skipped as duplicates)
+    if util.has_received_new_data():
+        print("NEW ROCKBLOCK MESSAGES RECEIVED")
+        new_data.append(True)
+
+    if any(new_data):
+
+        # Generate all output files
+        print("GENERATING OUTPUT FILES")
+        util.generate_table_file()
+        util.generate_plot_file(30)
+        util.generate_markers_file()
+
+        # Upload data to server
+        print("UPLOADING DATA TO SERVER")
+        util.upload_all_data_files()
+
+    else:
+        print("NO NEW STATION DATA - SKIPPING OUTPUT FILES")
+
+    if mailbox_changed:
+        # Everything up to the probed STATUS is now processed
+        util.record_mailbox_status(mailbox_status)
+
+    # Polling densely when a station is expected to transmit, sparsely otherwise
+    polling_delay = util.get_polling_delay(any(new_data))
+
+    if IDLE_MODE:
+        # Waiting for the server to report a new email
+        print("WAITING FOR NEW EMAILS (IMAP IDLE)")
+        util.wait_for_new_emails(IDLE_MAX_WAIT, polling_delay)
+    else:
+        # Sleeping until the next poll
+        print("SLEEPING FOR {} minutes".format(round(polling_delay / 60, 1)))
+        util.sleep_until_next_poll(polling_delay)
 
     return None
 
 #--------------------------------------------------------------------
 # Main Code
 
+if HTTP_MODE:
+    util.start_rockblock_receiver()
+
 main()
 
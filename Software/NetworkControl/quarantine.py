@@ -0,0 +1,63 @@
+# Common Core Libraries
+import argparse
+
+# Local Imports
+import utility as util
+import classes as clss
+
+#--------------------------------------------------------------------
+# Main Functions
+
+def list_quarantined_emails():
+
+    # Printing the quarantined emails with the reason of their failure
+
+    quarantine_ledger = clss.QuarantineLedger()
+    entries = quarantine_ledger.entries()
+    quarantine_ledger.close()
+
+    for entry in entries:
+        print("{quarantined_at}  {folder}:{uidvalidity}:{uid} ({station_email}): {reason}".format(**entry))
+
+    print("{} QUARANTINED EMAILS".format(len(entries)))
+
+    return None
+
+def parse_location(location):
+
+    # Converting a "folder:uidvalidity:uid" argument (as listed) into a (folder, uidvalidity, uid) tuple
+
+    try:
+        folder, uidvalidity, uid = location.rsplit(":", 2)
+        return (folder, int(uidvalidity), int(uid))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected FOLDER:UIDVALIDITY:UID, got {}".format(location))
+
+def main():
+
+    """
+    Command line interface of the QuarantineLedger:
+
+        python quarantine.py list                       # Listing the quarantined emails
+        python quarantine.py replay                     # Parsing all of them again
+        python quarantine.py replay INBOX:7:1234        # Parsing only these emails again (as listed)
+    """
+
+    parser = argparse.ArgumentParser(description = "List or replay the quarantined emails")
+    parser.add_argument("command", choices = ["list", "replay"])
+    parser.add_argument("locations", nargs = "*", type = parse_location,
+                        help = "FOLDER:UIDVALIDITY:UID of the emails to replay (all by default)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_quarantined_emails()
+    elif args.command == "replay":
+        util.replay_quarantined_emails(set(args.locations) if args.locations else None)
+
+    return None
+
+#--------------------------------------------------------------------
+# Main Code
+
+if __name__ == "__main__":
+    main()
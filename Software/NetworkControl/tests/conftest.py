@@ -0,0 +1,25 @@
+# Library Imports
+import os
+import sys
+import types
+
+# The tests run without the (encrypted) global_variables.py, IMAP or MySQL:
+# a small configuration with two stations is installed in its place
+
+NETWORK_CONTROL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NETWORK_CONTROL_DIR)
+
+STATION_INFO = [{"number": 1, "email": "300234067638620@rockblock.rock7.com", "table": "station_1"},
+                {"number": 2, "email": "300234067639570@rockblock.rock7.com", "table": "station_2"}]
+
+global_variables = types.ModuleType("global_variables")
+global_variables.IMAP_SERVER = "imap.example.com"
+global_variables.TRINITY_EMAIL = "station.reports@example.com"
+global_variables.TRINITY_EMAIL_PASSWORD = "password"
+global_variables.STATION_INFO = STATION_INFO
+global_variables.EMAIL2TABLE = {station["email"]: station["table"] for station in STATION_INFO}
+global_variables.AUTOPLOT_VALUE_SIZE_LIMIT = 30
+global_variables.JUG_WEIGHT = 40
+global_variables.MYSQL_INFO = {}
+
+sys.modules["global_variables"] = global_variables
@@ -0,0 +1,142 @@
+# Library Imports
+import types
+
+# Local Imports
+from classes.email_client import EmailClient, get_part_filename
+from classes.raw_message_store import RawMessageStore
+from classes.uid_watermark import UIDWatermark
+
+#-------------------------------------------------------------
+# Helpers
+
+TEXT_PART = (b"text", b"plain", (b"charset", b"us-ascii"), None, None, b"7bit", 200, 5, None, None, None, None)
+IMAGE_PART = (b"image", b"png", (b"name", b"logo.png"), None, None, b"base64", 60, None,
+              (b"inline", (b"filename", b"logo.png")), None, None)
+SBD_PART = (b"application", b"octet-stream", (b"name", b"300234067638620_000012.sbd"), None, None, b"base64", 66, None,
+            (b"attachment", (b"filename", b"300234067638620_000012.sbd")), None, None)
+
+class FakeIMAPClient():
+
+    # Returns the given BODYSTRUCTURE of every UID
+
+    def __init__(self, bodystructures):
+
+        self.bodystructures = bodystructures
+
+        return None
+
+    def fetch(self, uids, data):
+
+        return {uid: {b"BODYSTRUCTURE": self.bodystructures[uid]} for uid in uids}
+
+class FakeMailbox():
+
+    # A folder of emails {uid: sender}, answering the UID searches and the ENVELOPE fetches
+
+    def __init__(self, senders):
+
+        self.senders = senders
+        self.envelope_fetches = 0
+
+        return None
+
+    def select_folder(self, folder, readonly = False):
+
+        return {b"UIDVALIDITY": 1}
+
+    def search(self, criteria):
+
+        # Only the "UID n:*" part of the criteria, the other senders are filtered by the routing
+        first_uid = int(criteria[1].split(":")[0]) if criteria[0] == "UID" else 1
+        uids = [uid for uid in self.senders.keys() if uid >= first_uid]
+
+        # "n:*" always matches the highest UID of the folder
+        return uids if len(uids) != 0 else [max(self.senders.keys())]
+
+    def fetch(self, uids, data):
+
+        self.envelope_fetches += len(uids)
+
+        envelopes = {}
+        for uid in uids:
+            mailbox, host = self.senders[uid].split("@")
+            address = types.SimpleNamespace(mailbox = mailbox.encode(), host = host.encode())
+            envelopes[uid] = {b"ENVELOPE": types.SimpleNamespace(from_ = (address,))}
+
+        return envelopes
+
+#-------------------------------------------------------------
+# Tests
+
+def test_get_part_filename():
+
+    assert get_part_filename(SBD_PART) == b"300234067638620_000012.sbd"
+    assert get_part_filename(TEXT_PART) == b""
+
+    # Only the name parameter of the Content-Type
+    assert get_part_filename(SBD_PART[:8] + (None, None, None)) == b"300234067638620_000012.sbd"
+
+def test_fetch_sbd_sections_matches_the_sbd_attachment():
+
+    email_client = EmailClient(offline = True)
+    email_client.imap_client = FakeIMAPClient({1: ([TEXT_PART, SBD_PART], b"mixed"),
+                                               2: ([TEXT_PART, IMAGE_PART, SBD_PART], b"mixed"),
+                                               3: ([TEXT_PART, IMAGE_PART], b"mixed")})
+
+    assert email_client.fetch_sbd_sections([1, 2, 3]) == {1: ("1", b"7bit", "2", b"base64"),
+                                                          2: ("1", b"7bit", "3", b"base64"),
+                                                          3: None}
+
+def test_silent_station_watermark_follows_the_search(tmp_path):
+
+    active_station = "300234067638620@rockblock.rock7.com"
+    silent_station = "300234067639570@rockblock.rock7.com"
+
+    # Only the first station keeps transmitting
+    senders = {uid: active_station for uid in range(1, 41)}
+    senders[2] = silent_station
+
+    watermark = UIDWatermark(str(tmp_path / "uid_watermark.json"))
+
+    email_client = EmailClient(offline = True)
+    email_client.offline = False
+    email_client.imap_client = FakeMailbox(senders)
+    email_client.fetch_uids("New", watermark = watermark)
+    watermark.commit()
+
+    assert watermark.get("INBOX", active_station) == 40
+    assert watermark.get("INBOX", silent_station) == 40
+
+    # The next search starts after the highest UID, for the whole fleet
+    senders[41] = active_station
+    email_client.imap_client = FakeMailbox(senders)
+    email_client.email_info = {}
+    email_client.fetch_uids("New", watermark = watermark)
+
+    assert email_client.imap_client.envelope_fetches == 1
+    assert list(email_client.email_info[active_station].keys()) == [41]
+
+def test_stored_emails_of_every_uidvalidity(tmp_path):
+
+    station_email = "300234067638620@rockblock.rock7.com"
+
+    # The INBOX was stored before and after a UIDVALIDITY change
+    raw_message_store = RawMessageStore(str(tmp_path / "raw_messages.sqlite3"))
+    raw_message_store.add_messages("INBOX", 7, [(1, station_email, b"old 1"), (2, station_email, b"old 2")])
+    raw_message_store.add_messages("INBOX", 8, [(1, station_email, b"new 1")])
+
+    assert raw_message_store.uidvalidities("INBOX") == [7, 8]
+
+    email_client = EmailClient(raw_message_store = raw_message_store, offline = True)
+    email_client.fetch_uids("New")
+
+    assert email_client.uidvalidity == 8
+    assert list(email_client.email_info[station_email].keys()) == [1]
+
+    email_client = EmailClient(raw_message_store = raw_message_store, offline = True)
+    email_client.fetch_uids("New", uidvalidity = 7)
+    email_client.fetch_emails_text()
+
+    assert [content["raw"] for content in email_client.email_info[station_email].values()] == [b"old 1", b"old 2"]
+
+    raw_message_store.close()
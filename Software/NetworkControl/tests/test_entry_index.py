@@ -0,0 +1,90 @@
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+import classes.entry_index as entry_index_module
+from classes.entry_index import EntryIndex
+
+#-------------------------------------------------------------
+# Helpers
+
+STATION_EMAIL = "300234067638620@rockblock.rock7.com"
+
+class FakeMySQLClient():
+
+    # Returns the given time_ids of each table, counting the queries
+
+    def __init__(self, time_ids):
+
+        self.time_ids = time_ids
+        self.queries = 0
+
+        return None
+
+    def fetch_time_ids(self):
+
+        self.queries += 1
+
+        return self.time_ids
+
+def hours(values):
+
+    return np.datetime64("2020-01-01T00:00:00", "s") + np.array(values) * np.timedelta64(1, "h")
+
+#-------------------------------------------------------------
+# Tests
+
+def test_load_only_once():
+
+    mysql_client = FakeMySQLClient({STATION_EMAIL: hours([3, 1, 2])})
+
+    entry_index = EntryIndex()
+    entry_index.load(mysql_client)
+    entry_index.load(mysql_client)
+
+    assert mysql_client.queries == 1
+    assert entry_index.find(STATION_EMAIL, hours([0, 1, 2, 3, 4])).tolist() == [False, True, True, True, False]
+    assert entry_index.find("unknown@rockblock.rock7.com", hours([1])).tolist() == [False]
+
+def test_added_time_ids_are_found():
+
+    entry_index = EntryIndex()
+    entry_index.load(FakeMySQLClient({STATION_EMAIL: hours([10, 20])}))
+
+    entry_index.add(STATION_EMAIL, hours([30, 31])) # Newer
+    entry_index.add(STATION_EMAIL, hours([15, 20])) # Older and repeated
+
+    assert entry_index.find(STATION_EMAIL, hours([10, 15, 20, 25, 30, 31])).tolist() == [True, True, True, False, True, True]
+
+def test_recent_time_ids_are_merged(monkeypatch):
+
+    monkeypatch.setattr(entry_index_module, "MAX_RECENT_SIZE", 8)
+
+    rng = np.random.default_rng(0)
+    loaded_hours = np.arange(0, 1000, 2)
+    added_hours = set()
+
+    entry_index = EntryIndex()
+    entry_index.load(FakeMySQLClient({STATION_EMAIL: hours(loaded_hours)}))
+
+    for i in range(50):
+        new_hours = rng.integers(0, 1200, 3)
+        entry_index.add(STATION_EMAIL, hours(new_hours))
+        added_hours.update(new_hours.tolist())
+        assert len(entry_index.stations[STATION_EMAIL]["recent"]) < 8
+
+    expected_hours = set(loaded_hours.tolist()) | added_hours
+    epochs = entry_index.stations[STATION_EMAIL]["epochs"]
+
+    assert (np.diff(epochs) > 0).all()
+    assert entry_index.find(STATION_EMAIL, hours(np.arange(1200))).tolist() == [hour in expected_hours for hour in range(1200)]
+
+def test_add_entries():
+
+    entries = np.zeros(2, dtype=[("time_id", "datetime64[ns]"), ("weight_lbs", np.int16)])
+    entries["time_id"] = hours([5, 4])
+
+    entry_index = EntryIndex()
+    entry_index.add_entries({STATION_EMAIL: entries})
+
+    assert entry_index.find(STATION_EMAIL, hours([4, 5, 6])).tolist() == [True, True, False]
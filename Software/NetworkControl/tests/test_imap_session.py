@@ -0,0 +1,114 @@
+# Library Imports
+import socket
+import zlib
+
+# Local Imports
+from classes.imap_session import IMAPSession
+
+#-------------------------------------------------------------
+# Helpers
+
+class FakeIMAPClient():
+
+    # Records the SELECTs, like the IMAPClient they return the folder's info
+
+    def __init__(self):
+
+        self.selects = []
+
+        return None
+
+    def select_folder(self, folder, readonly = False):
+
+        self.selects.append((folder, readonly))
+
+        return {b"UIDVALIDITY": 1, b"READ-ONLY": readonly}
+
+class FakeImaplib():
+
+    # The imaplib connection under the IMAPClient, with a real socket
+
+    def __init__(self, sock):
+
+        self.sock = sock
+        self.commands = []
+
+        return None
+
+    def _simple_command(self, *args):
+
+        self.commands.append(args)
+
+        return "OK", [b"DEFLATE active"]
+
+def create_session(imap_client):
+
+    # Creating a session around a fake client, without connecting to a server
+
+    imap_session = IMAPSession.__new__(IMAPSession)
+    imap_session.compress = True
+    imap_session.imap_client = imap_client
+    imap_session.selected_folder = None
+    imap_session.selected_readonly = False
+    imap_session.selected_folder_info = None
+    imap_session.compressed = False
+
+    return imap_session
+
+#-------------------------------------------------------------
+# Tests
+
+def test_select_folder_skips_the_same_folder():
+
+    imap_session = create_session(FakeIMAPClient())
+
+    imap_session.select_folder("INBOX")
+    imap_session.select_folder("INBOX")
+    imap_session.select_folder("[Gmail]/All Mail")
+    imap_session.select_folder("INBOX")
+
+    assert imap_session.imap_client.selects == [("INBOX", False), ("[Gmail]/All Mail", False), ("INBOX", False)]
+
+def test_select_folder_reselects_when_readonly_changes():
+
+    imap_session = create_session(FakeIMAPClient())
+
+    imap_session.select_folder("INBOX", readonly = True)
+    folder_info = imap_session.select_folder("INBOX")
+    imap_session.select_folder("INBOX")
+
+    assert imap_session.imap_client.selects == [("INBOX", True), ("INBOX", False)]
+    assert folder_info[b"READ-ONLY"] is False
+
+def test_compression_round_trip():
+
+    client_sock, server_sock = socket.socketpair()
+    imap_client = FakeIMAPClient()
+    imap_client._imap = FakeImaplib(client_sock)
+    imap_session = create_session(imap_client)
+
+    try:
+        assert imap_session.enable_compression() is True
+        assert imap_client._imap.commands == [("COMPRESS", "DEFLATE")]
+
+        imap = imap_client._imap
+
+        # Client -> server: every command is compressed and flushed right away
+        imap.send(b"a001 NOOP\r\n")
+        server_decompressor = zlib.decompressobj(-15)
+        assert server_decompressor.decompress(server_sock.recv(4096)) == b"a001 NOOP\r\n"
+
+        # Server -> client: lines and literals come out of the decompressed stream
+        server_compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        literal = bytes(range(256)) * 8
+        response = b"* 1 FETCH (BODY[] {" + str(len(literal)).encode() + b"}\r\n" + literal + b")\r\na001 OK\r\n"
+        server_sock.sendall(server_compressor.compress(response) + server_compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        assert imap.readline() == b"* 1 FETCH (BODY[] {2048}\r\n"
+        assert imap.read(len(literal)) == literal
+        assert imap.readline() == b")\r\n"
+        assert imap.readline() == b"a001 OK\r\n"
+
+    finally:
+        client_sock.close()
+        server_sock.close()
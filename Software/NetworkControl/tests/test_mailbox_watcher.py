@@ -0,0 +1,74 @@
+# Library Imports
+import threading
+
+# Local Imports
+from classes.mailbox_watcher import MailboxWatcher
+
+#-------------------------------------------------------------
+# Helpers
+
+def create_watcher(exists):
+
+    # Creating a watcher without connecting to a server
+
+    mailbox_watcher = MailboxWatcher.__new__(MailboxWatcher)
+    mailbox_watcher.exists = exists
+
+    return mailbox_watcher
+
+#-------------------------------------------------------------
+# Tests
+
+def test_exists_reports_new_emails():
+
+    mailbox_watcher = create_watcher(5)
+
+    assert mailbox_watcher.new_emails_reported([(5, b"EXISTS")]) is False
+    assert mailbox_watcher.new_emails_reported([(6, b"EXISTS")]) is True
+    assert mailbox_watcher.exists == 6
+
+def test_expunge_lowers_the_count():
+
+    mailbox_watcher = create_watcher(5)
+
+    # Two emails moved out of the INBOX, then a new one arrives
+    assert mailbox_watcher.new_emails_reported([(5, b"EXPUNGE"), (4, b"EXPUNGE")]) is False
+    assert mailbox_watcher.exists == 3
+    assert mailbox_watcher.new_emails_reported([(4, b"EXISTS")]) is True
+
+def test_expunge_never_goes_below_zero():
+
+    mailbox_watcher = create_watcher(1)
+
+    mailbox_watcher.new_emails_reported([(1, b"EXPUNGE"), (1, b"EXPUNGE"), (b"OK", )])
+
+    assert mailbox_watcher.exists == 0
+
+def test_wake_event_ends_the_wait():
+
+    class FakeIMAPClient():
+
+        def __init__(self):
+            self.idles = 0
+
+        def noop(self):
+            return (b"OK", [])
+
+        def idle(self):
+            self.idles += 1
+            wake_event.set() # e.g. messages received by HTTP while in IDLE
+
+        def idle_check(self, timeout = None):
+            return []
+
+        def idle_done(self):
+            return (b"", [])
+
+    wake_event = threading.Event()
+
+    mailbox_watcher = create_watcher(5)
+    mailbox_watcher.idle_supported = True
+    mailbox_watcher.imap_client = FakeIMAPClient()
+
+    assert mailbox_watcher.wait_for_new_emails(3600, 600, wake_event) is True
+    assert mailbox_watcher.imap_client.idles == 1
@@ -0,0 +1,72 @@
+# Local Imports
+from classes.momsn_tracker import MOMSNTracker, MAX_GAP_SIZE, MAX_REFETCH_ATTEMPTS
+
+#-------------------------------------------------------------
+# Tests
+
+STATION_EMAIL = "300234067638620@rockblock.rock7.com"
+
+def commit_momsns(momsn_tracker, momsns):
+
+    for momsn in momsns:
+        momsn_tracker.stage(STATION_EMAIL, momsn)
+    momsn_tracker.commit()
+
+    return None
+
+def test_gaps_are_recorded_as_missing(tmp_path):
+
+    momsn_tracker = MOMSNTracker(str(tmp_path / "momsn_tracker.json"))
+    commit_momsns(momsn_tracker, [10, 11, 14, 16])
+
+    assert momsn_tracker.missing(STATION_EMAIL) == [12, 13, 15]
+    assert momsn_tracker.is_processed(STATION_EMAIL, 11) is True
+    assert momsn_tracker.is_processed(STATION_EMAIL, 13) is False
+    assert momsn_tracker.is_processed(STATION_EMAIL, 17) is False
+
+    # A missing MOMSN that arrives later fills its gap
+    commit_momsns(momsn_tracker, [13])
+
+    assert momsn_tracker.missing(STATION_EMAIL) == [12, 15]
+    assert momsn_tracker.is_processed(STATION_EMAIL, 13) is True
+
+def test_staged_momsns_are_only_saved_on_commit(tmp_path):
+
+    file_path = str(tmp_path / "momsn_tracker.json")
+
+    momsn_tracker = MOMSNTracker(file_path)
+    momsn_tracker.stage(STATION_EMAIL, 10)
+
+    assert momsn_tracker.is_processed(STATION_EMAIL, 10) is False
+
+    momsn_tracker.commit()
+
+    assert MOMSNTracker(file_path).is_processed(STATION_EMAIL, 10) is True
+
+def test_large_gaps_and_counter_resets(tmp_path):
+
+    momsn_tracker = MOMSNTracker(str(tmp_path / "momsn_tracker.json"))
+
+    commit_momsns(momsn_tracker, [10, 10 + MAX_GAP_SIZE + 2])
+    assert momsn_tracker.missing(STATION_EMAIL) == []
+
+    # The modem's counter starts over
+    commit_momsns(momsn_tracker, [40000, 40001])
+    commit_momsns(momsn_tracker, [3])
+
+    assert momsn_tracker.is_processed(STATION_EMAIL, 3) is True
+    assert momsn_tracker.is_processed(STATION_EMAIL, 4) is False
+    assert momsn_tracker.missing(STATION_EMAIL) == []
+
+def test_refetch_attempts_give_up(tmp_path):
+
+    momsn_tracker = MOMSNTracker(str(tmp_path / "momsn_tracker.json"))
+    commit_momsns(momsn_tracker, [10, 12])
+
+    for attempt in range(MAX_REFETCH_ATTEMPTS - 1):
+        momsn_tracker.record_refetch_attempt(STATION_EMAIL, [11])
+        assert momsn_tracker.missing(STATION_EMAIL) == [11]
+
+    momsn_tracker.record_refetch_attempt(STATION_EMAIL, [11])
+
+    assert momsn_tracker.missing(STATION_EMAIL) == []
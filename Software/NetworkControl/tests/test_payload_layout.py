@@ -0,0 +1,80 @@
+# Third-Party Imports
+import numpy as np
+
+# Local Imports
+from classes.payload_layout import PHASE_ONE_LAYOUT, PHASE_TWO_LAYOUT
+
+#-------------------------------------------------------------
+# Helpers
+
+def create_payload(payload_layout, seed, ring_index = None):
+
+    # Random payload bytes, with the ring index of Phase 2 payloads
+
+    payload = bytearray(np.random.default_rng(seed).integers(0, 256, payload_layout.payload_size, dtype=np.uint8).tobytes())
+
+    if payload_layout.ring_index_offset is not None:
+        payload[payload_layout.ring_index_offset] = ring_index
+
+    return bytes(payload)
+
+#-------------------------------------------------------------
+# Tests
+
+def test_phase_one_records_latest_first():
+
+    # Header (2 bytes) and 8 records of 5 bytes, record n has the values 10n + field
+    payload = bytes([3, 0] + [10 * record + field for record in range(8) for field in range(5)])
+
+    data_sets, valid = PHASE_ONE_LAYOUT.decode_batch([payload.hex()])
+
+    assert valid.tolist() == [True]
+    assert data_sets["sensor_1"].tolist() == [70, 60, 50, 40, 30, 20, 10, 0]
+    assert data_sets["weight_lbs"].tolist() == [74, 64, 54, 44, 34, 24, 14, 4]
+
+def test_phase_two_ring_buffer_order():
+
+    # Ring index 3: the records are 3, 2, 1, 14, 13, ... (1-based), latest first
+    payload = bytearray(PHASE_TWO_LAYOUT.payload_size)
+    for record in range(14):
+        payload[2 + record * 3] = record + 1        # weight_lbs
+        payload[2 + record * 3 + 1] = 100            # amps (x100)
+        payload[2 + record * 3 + 2] = 125            # volts (x10)
+    payload[1] = 1 # alarm
+    payload[44] = 3
+
+    data_sets, valid = PHASE_TWO_LAYOUT.decode_batch([bytes(payload).hex()])
+
+    assert valid.tolist() == [True]
+    assert data_sets["weight_lbs"].tolist() == [3, 2, 1, 14, 13, 12, 11, 10, 9, 8, 7, 6, 5, 4]
+    assert data_sets["amps"].tolist() == [1.0] * 14
+    assert data_sets["volts"].tolist() == [12.5] * 14
+    assert data_sets["alarm"].tolist() == [1] * 14
+
+def test_batch_decode_matches_single_decode():
+
+    for payload_layout in (PHASE_ONE_LAYOUT, PHASE_TWO_LAYOUT):
+
+        payloads = [create_payload(payload_layout, seed, ring_index = seed % 14 + 1) for seed in range(20)]
+
+        data_sets, valid = payload_layout.decode_batch([payload.hex() for payload in payloads])
+        payload_data_sets, payload_valid = payload_layout.decode_payload_batch(payloads)
+
+        assert valid.all() and payload_valid.all()
+
+        for i, payload in enumerate(payloads):
+            data = payload_layout.decode(payload.hex())
+            rows = slice(i * payload_layout.record_count, (i + 1) * payload_layout.record_count)
+            for column in payload_layout.columns:
+                assert data_sets[column][rows].tolist() == data[column]
+                assert payload_data_sets[column][rows].tolist() == data[column]
+
+def test_invalid_ring_index_is_masked():
+
+    payloads = [create_payload(PHASE_TWO_LAYOUT, 1, ring_index = 5),
+                create_payload(PHASE_TWO_LAYOUT, 2, ring_index = 0),
+                create_payload(PHASE_TWO_LAYOUT, 3, ring_index = 15)]
+
+    data_sets, valid = PHASE_TWO_LAYOUT.decode_payload_batch(payloads)
+
+    assert valid.tolist() == [True, False, False]
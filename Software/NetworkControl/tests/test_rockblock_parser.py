@@ -0,0 +1,73 @@
+# Library Imports
+import email.charset
+import email.mime.text
+
+# Local Imports
+from classes.rockblock_parser import RockBLOCKParser, parse_raw_messages
+
+#-------------------------------------------------------------
+# Helpers
+
+def create_raw_message(momsn, transmit_time = "2020-01-26T17:08:22Z", data = "0a" * 42):
+
+    # Raw RockBLOCK email, with its fields in the plain text
+
+    text = ("IMEI: 300234067638620\r\n\r\n"
+            "MOMSN: {}\r\n"
+            "Transmit Time: {} UTC\r\n"
+            "Iridium Latitude: 26.3041\r\n"
+            "Iridium Longitude: -98.1632\r\n"
+            "Iridium CEP: 3.0\r\n"
+            "Data: {}\r\n").format(momsn, transmit_time, data)
+
+    headers = ("From: 300234067638620@rockblock.rock7.com\r\n"
+               "Subject: SBD Msg From Unit: 300234067638620\r\n"
+               "Content-Type: text/plain\r\n\r\n")
+
+    return (headers + text).encode()
+
+#-------------------------------------------------------------
+# Tests
+
+def test_parse_fields():
+
+    fields = RockBLOCKParser().parse(create_raw_message(12))
+
+    assert fields["momsn"] == 12
+    assert fields["transmit_time"] == "2020-01-26T17:08:22Z UTC"
+    assert fields["latitude"] == "26.3041"
+    assert fields["data"] == "0a" * 42
+
+def test_invalid_emails_are_reported():
+
+    raw_messages = [create_raw_message(1),
+                    create_raw_message(2, transmit_time = "2020-13-45T99:08:22Z"),
+                    create_raw_message(3, data = "zz" * 42),
+                    create_raw_message(4, transmit_time = "2020-01-26T18:08:22Z")]
+
+    parsed_data = parse_raw_messages(raw_messages, 1)
+
+    assert parsed_data["indexes"] == [0, 3]
+    assert parsed_data["momsns"] == [1, 4]
+    assert parsed_data["failures"] == [(1, "INVALID TRANSMIT TIME"), (2, "INVALID HEX DATA")]
+    assert parsed_data["data_sets"]["weight_lbs"].tolist() == [10] * 16
+
+def test_quoted_printable_text_part():
+
+    # The hex data line is longer than 76 characters, so it is soft-wrapped with "="
+    text_charset = email.charset.Charset("utf-8")
+    text_charset.body_encoding = email.charset.QP
+
+    raw_message = create_raw_message(5)
+    text = raw_message[raw_message.index(b"IMEI:"):].decode()
+    message = email.mime.text.MIMEText(text, "plain", text_charset)
+    message["From"] = "300234067638620@rockblock.rock7.com"
+    raw_message = message.as_bytes()
+
+    assert b"=\n" in raw_message
+
+    parsed_data = parse_raw_messages([raw_message], 1)
+
+    assert parsed_data["failures"] == []
+    assert parsed_data["momsns"] == [5]
+    assert parsed_data["data_sets"]["weight_lbs"].tolist() == [10] * 8
@@ -0,0 +1,88 @@
+# Third-Party Imports
+import pytest
+
+# Local Imports
+from classes.rockblock_receiver import RockBLOCKReceiver
+
+#-------------------------------------------------------------
+# Helpers
+
+IMEI = "300234067638620"
+
+class FakeMOMSNTracker():
+
+    # Records the committed MOMSNs
+
+    def __init__(self):
+
+        self.staged = []
+        self.committed = []
+
+        return None
+
+    def stage(self, station_email, momsn):
+
+        self.staged.append((station_email, momsn))
+
+        return None
+
+    def commit(self):
+
+        self.committed += self.staged
+        self.staged = []
+
+        return None
+
+def create_receiver(ingested):
+
+    # Listening on any free local port, without starting the server
+
+    return RockBLOCKReceiver("127.0.0.1", 0, ingest = ingested.append, momsn_tracker = FakeMOMSNTracker(), token = None)
+
+def create_post(momsn):
+
+    return "imei={}&momsn={}&transmit_time=20-01-26%2017:08:22&iridium_latitude=26.3041&iridium_longitude=-98.1632&data={}".format(
+        IMEI, momsn, "0a" * 42).encode()
+
+#-------------------------------------------------------------
+# Tests
+
+def test_ingested_messages_set_new_data():
+
+    ingested = []
+    rockblock_receiver = create_receiver(ingested)
+
+    try:
+        assert not rockblock_receiver.new_data.is_set()
+
+        messages = [rockblock_receiver.parse_post(create_post(momsn), "application/x-www-form-urlencoded") for momsn in (7, 8)]
+        rockblock_receiver.process_messages(messages)
+
+        assert rockblock_receiver.new_data.is_set()
+        assert sorted(ingested[0][IMEI + "@rockblock.rock7.com"].keys()) == [7, 8]
+        assert rockblock_receiver.momsn_tracker.committed == [(IMEI + "@rockblock.rock7.com", 7), (IMEI + "@rockblock.rock7.com", 8)]
+
+    finally:
+        rockblock_receiver.server.server_close()
+
+def test_invalid_json_fields_are_rejected():
+
+    ingested = []
+    rockblock_receiver = create_receiver(ingested)
+
+    try:
+        for body in (b'[1, 2]', b'{"imei": "' + IMEI.encode() + b'", "data": 123}',
+                     b'{"imei": "' + IMEI.encode() + b'", "momsn": [1], "data": "' + b"0a" * 42 + b'"}',
+                     b'{"imei": ' + IMEI.encode() + b', "momsn": 7, "transmit_time": 5, "data": "' + b"0a" * 42 + b'"}'):
+            with pytest.raises(ValueError):
+                rockblock_receiver.parse_post(body, "application/json")
+
+        # Numbers are accepted like their strings
+        message = rockblock_receiver.parse_post(b'{"imei": ' + IMEI.encode() + b', "momsn": 7, "transmit_time": "20-01-26 17:08:22", '
+                                                b'"data": "' + b"0a" * 42 + b'"}', "application/json")
+
+        assert message["momsn"] == 7
+        assert message["transmit_time"] == "2020-01-26T17:08:22Z UTC"
+
+    finally:
+        rockblock_receiver.server.server_close()
@@ -0,0 +1,120 @@
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from classes.payload_layout import PHASE_ONE_LAYOUT
+from classes.station_state_store import StationStateStore
+
+#-------------------------------------------------------------
+# Helpers
+
+STATION_EMAIL = "300234067638620@rockblock.rock7.com"
+
+class FakeMySQLClient():
+
+    # Returns the given dataframes of the tables, like MySQLClient.fetch_data
+
+    def __init__(self, mysql_table_df):
+
+        self.mysql_table_df = {}
+        self.table_dfs = mysql_table_df
+
+        return None
+
+    def fetch_data(self, limit = None):
+
+        self.mysql_table_df = {station_email: df.iloc[:limit] for station_email, df in self.table_dfs.items()}
+
+        return None
+
+def create_entries(hours, weights):
+
+    entries = np.zeros(len(hours), dtype=PHASE_ONE_LAYOUT.entry_dtype)
+    entries["time_id"] = np.datetime64("2020-01-01T00:00:00", "ns") + np.array(hours) * np.timedelta64(1, "h")
+    entries["weight_lbs"] = weights
+    entries["latitude"] = 26.3041
+    entries["longitude"] = -98.1632
+    entries["timezone"] = "CST"
+
+    return entries
+
+def create_store(capacity):
+
+    station_state_store = StationStateStore(capacity)
+    station_state_store.load(FakeMySQLClient({}))
+
+    return station_state_store
+
+#-------------------------------------------------------------
+# Tests
+
+def test_ring_keeps_the_latest_entries():
+
+    station_state_store = create_store(4)
+
+    station_state_store.add_entries({STATION_EMAIL: create_entries([1, 2, 3], [10, 20, 30])})
+    station_state_store.add_entries({STATION_EMAIL: create_entries([5, 4, 6], [50, 40, 60])}) # Wraps around
+
+    df = station_state_store.get_dataframes(10)[STATION_EMAIL]
+
+    assert df["weight_lbs"].tolist() == [60, 50, 40, 30]
+    assert df.index.is_monotonic_decreasing
+    assert station_state_store.get_dataframes(2)[STATION_EMAIL]["weight_lbs"].tolist() == [60, 50]
+    assert station_state_store.get_latest_time_ids()[STATION_EMAIL] == pd.Timestamp("2020-01-01T06:00:00")
+
+def test_older_entries_are_merged_in_order():
+
+    station_state_store = create_store(4)
+
+    station_state_store.add_entries({STATION_EMAIL: create_entries([1, 3, 5], [10, 30, 50])})
+    station_state_store.add_entries({STATION_EMAIL: create_entries([4, 3], [40, 31])}) # Refetched emails
+
+    df = station_state_store.get_dataframes(10)[STATION_EMAIL]
+
+    assert df["weight_lbs"].tolist() == [50, 40, 31, 10]
+    assert station_state_store.get_latest_dataframes()[STATION_EMAIL]["weight_lbs"].tolist() == [50]
+
+    # The ring keeps working from the merged entries
+    station_state_store.add_entries({STATION_EMAIL: create_entries([6], [60])})
+
+    assert station_state_store.get_dataframes(10)[STATION_EMAIL]["weight_lbs"].tolist() == [60, 50, 40, 31]
+
+def test_entries_are_ignored_until_loaded():
+
+    station_state_store = StationStateStore(4)
+    station_state_store.add_entries({STATION_EMAIL: create_entries([1], [10])})
+
+    assert station_state_store.get_dataframes(10)[STATION_EMAIL].empty
+    assert station_state_store.get_latest_time_ids()[STATION_EMAIL] is None
+
+def test_load_from_mysql():
+
+    time_ids = pd.DatetimeIndex(["2020-01-01T03:00:00", "2020-01-01T02:00:00", "2020-01-01T01:00:00"], name = "time_id")
+    table_df = pd.DataFrame({"sensor_1": [1, 2, 3], "sensor_2": [1, 2, 3], "sensor_3": [1, 2, 3],
+                             "reference": [1, 2, 3], "weight_lbs": [30, 20, 10],
+                             "latitude": ["26.3041", None, "26.3041"], "longitude": ["-98.1632", None, "-98.1632"],
+                             "timezone": ["CST", "CST", "CST"]}, index = time_ids)
+
+    station_state_store = StationStateStore(2)
+    station_state_store.load(FakeMySQLClient({STATION_EMAIL: table_df}))
+
+    df = station_state_store.get_dataframes(10)[STATION_EMAIL]
+
+    assert df["weight_lbs"].tolist() == [30, 20]
+    assert df["latitude"].tolist() == [26.3041, None]
+
+def test_missing_coordinates_are_none():
+
+    entries = create_entries([1, 2], [10, 20])
+    entries["latitude"][1] = np.nan
+    entries["longitude"][1] = np.nan
+
+    station_state_store = create_store(4)
+    station_state_store.add_entries({STATION_EMAIL: entries})
+
+    latest_df = station_state_store.get_latest_dataframes()[STATION_EMAIL]
+
+    assert latest_df["latitude"].tolist() == [None]
+    assert latest_df["longitude"].tolist() == [None]
+    assert station_state_store.get_dataframes(10)[STATION_EMAIL]["latitude"].tolist() == [None, 26.3041]
@@ -0,0 +1,82 @@
+# Third-Party Imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local Imports
+from classes.time_series_buffer import TimeSeriesBuffer
+
+#-------------------------------------------------------------
+# Helpers
+
+def create_df(hours, weights):
+
+    time_ids = pd.DatetimeIndex(np.datetime64("2020-01-01T00:00:00", "ns") + np.array(hours) * np.timedelta64(1, "h"),
+                                name = "time_id")
+
+    return pd.DataFrame({"weight_lbs": weights}, index = time_ids)
+
+#-------------------------------------------------------------
+# Tests
+
+def test_merge_sorts_and_later_entries_win():
+
+    time_series_buffer = TimeSeriesBuffer()
+    time_series_buffer.merge([create_df([5, 1, 3], [50, 10, 30]),
+                              create_df([3, 2], [31, 20])])
+    time_series_buffer.merge(create_df([1, 6], [11, 60]))
+
+    df = time_series_buffer.to_dataframe()
+
+    assert df.index.is_monotonic_decreasing and df.index.is_unique
+    assert df["weight_lbs"].tolist() == [60, 50, 31, 20, 11]
+    assert time_series_buffer.to_dataframe(ascending = True)["weight_lbs"].tolist() == [11, 20, 31, 50, 60]
+
+def test_merge_matches_sort_and_clean():
+
+    rng = np.random.default_rng(0)
+    dfs = [create_df(rng.integers(0, 200, 8), rng.integers(0, 2000, 8)) for i in range(50)]
+
+    time_series_buffer = TimeSeriesBuffer()
+    for i in range(0, len(dfs), 7):
+        time_series_buffer.merge(dfs[i:i + 7])
+
+    # Keeping the last row of each time_id, latest time_id first
+    expected_df = pd.concat(dfs)
+    expected_df = expected_df.loc[~expected_df.index.duplicated(keep="last")].sort_index(ascending = False)
+
+    pd.testing.assert_frame_equal(time_series_buffer.to_dataframe(), expected_df, check_freq = False)
+
+def test_find_and_drop():
+
+    time_series_buffer = TimeSeriesBuffer()
+    time_series_buffer.merge(create_df([1, 2, 3, 4], [10, 20, 30, 40]))
+
+    dropped_time_ids = create_df([2, 4, 9], [0, 0, 0]).index
+
+    assert time_series_buffer.find(dropped_time_ids).tolist() == [False, True, False, True]
+    assert time_series_buffer.drop(dropped_time_ids) == 2
+    assert time_series_buffer.to_dataframe()["weight_lbs"].tolist() == [30, 10]
+
+def test_entries_round_trip():
+
+    time_series_buffer = TimeSeriesBuffer()
+    time_series_buffer.merge(create_df([3, 1, 2], [30, 10, 20]))
+
+    entries = time_series_buffer.to_entries(ascending = True)
+
+    assert entries.dtype.names == ("time_id", "weight_lbs")
+    assert entries["weight_lbs"].tolist() == [10, 20, 30]
+
+    merged_buffer = TimeSeriesBuffer()
+    merged_buffer.merge_entries(entries[::-1])
+
+    assert merged_buffer.to_entries().tolist() == time_series_buffer.to_entries().tolist()
+
+def test_mismatched_columns():
+
+    time_series_buffer = TimeSeriesBuffer()
+    time_series_buffer.merge(create_df([1], [10]))
+
+    with pytest.raises(ValueError):
+        time_series_buffer.merge(create_df([2], [20]).rename(columns = {"weight_lbs": "volts"}))
@@ -0,0 +1,65 @@
+# Local Imports
+from classes.uid_watermark import UIDWatermark
+
+#-------------------------------------------------------------
+# Tests
+
+STATION_EMAIL = "300234067638620@rockblock.rock7.com"
+
+def test_staged_uids_are_only_saved_on_commit(tmp_path):
+
+    file_path = str(tmp_path / "uid_watermark.json")
+
+    watermark = UIDWatermark(file_path)
+    watermark.check_uidvalidity("INBOX", 7)
+    watermark.stage("INBOX", STATION_EMAIL, 120)
+    watermark.stage("INBOX", STATION_EMAIL, 110)
+
+    assert watermark.get("INBOX", STATION_EMAIL) == 0
+    assert UIDWatermark(file_path).get("INBOX", STATION_EMAIL) == 0
+
+    watermark.commit()
+
+    assert watermark.get("INBOX", STATION_EMAIL) == 120
+    assert UIDWatermark(file_path).get("INBOX", STATION_EMAIL) == 120
+
+def test_watermark_never_moves_back(tmp_path):
+
+    watermark = UIDWatermark(str(tmp_path / "uid_watermark.json"))
+    watermark.check_uidvalidity("INBOX", 7)
+    watermark.stage("INBOX", STATION_EMAIL, 120)
+    watermark.commit()
+
+    watermark.stage("INBOX", STATION_EMAIL, 90)
+    watermark.commit()
+
+    assert watermark.get("INBOX", STATION_EMAIL) == 120
+
+def test_uidvalidity_change_resets_the_folder(tmp_path):
+
+    watermark = UIDWatermark(str(tmp_path / "uid_watermark.json"))
+
+    assert watermark.check_uidvalidity("INBOX", 7) is True # First time
+    watermark.stage("INBOX", STATION_EMAIL, 120)
+    watermark.commit()
+
+    assert watermark.check_uidvalidity("INBOX", 7) is True
+    assert watermark.get("INBOX", STATION_EMAIL) == 120
+
+    watermark.stage("INBOX", STATION_EMAIL, 130) # Staged with the old UIDVALIDITY
+    assert watermark.check_uidvalidity("INBOX", 8) is False
+    watermark.commit()
+
+    assert watermark.get("INBOX", STATION_EMAIL) == 0
+
+def test_folder_status_change(tmp_path):
+
+    watermark = UIDWatermark(str(tmp_path / "uid_watermark.json"))
+    folder_status = {b"UIDVALIDITY": 7, b"UIDNEXT": 200, b"MESSAGES": 50}
+
+    assert watermark.has_folder_changed("[Gmail]/All Mail", folder_status) is True
+
+    watermark.record_folder_status("[Gmail]/All Mail", folder_status)
+
+    assert watermark.has_folder_changed("[Gmail]/All Mail", folder_status) is False
+    assert watermark.has_folder_changed("[Gmail]/All Mail", {**folder_status, b"UIDNEXT": 201}) is True
@@ -1,4 +1,5 @@
 # Common Core Libraries
+import os
 import sys
 import time
 
@@ -13,6 +14,32 @@ from email.mime.multipart import MIMEMultipart
 import classes as clss
 import global_variables as gv
 
+# Local state (watermarks, etc.) is kept out of generated_data since
+# every file within generated_data is uploaded to the website
+LOCAL_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_data")
+
+# Long-lived IMAP connections, kept between cycles
+imap_session = None
+mailbox_watcher = None
+
+# Learns when the stations transmit, kept between cycles
+polling_scheduler = None
+
+# Receives the RockBLOCK HTTP POSTs in the background
+rockblock_receiver = None
+
+# time_ids already in MySQL, loaded once and kept between cycles
+entry_index = None
+
+# Recent entries and latest values of the stations, kept between cycles
+station_state_store = None
+
+# MOMSNs of the stations, shared by the email cycles and the RockBLOCKReceiver
+momsn_tracker = None
+
+# Every station email ends up in All Mail, so its STATUS shows if anything arrived
+PROBE_FOLDER = '[Gmail]/All Mail'
+
 #----------------------------------------------------------------
 # Functions 
 
@@ -22,74 +49,449 @@ def sort_and_clean_df(df, index="time_id", asc_order = False):
         df = df.set_index(index)
     except:
         pass
+
+    # Already sorted and unique (e.g. rows fetched from the ordered MySQL tables)
+    if df.index.is_unique and (df.index.is_monotonic_increasing if asc_order else df.index.is_monotonic_decreasing):
+        return df
+
     df = df.sort_values(by=index, ascending=asc_order)
     df = df.loc[~df.index.duplicated(keep="first")]
 
     return df
 
-def update_mysql_database(fetch_type, number_of_emails_per_station):
+def get_imap_session():
+
+    # Reusing the same IMAP session across cycles, keeping it alive with a NOOP
+
+    global imap_session
+
+    if imap_session is None:
+        imap_session = clss.IMAPSession()
+    else:
+        imap_session.keepalive()
+
+    return imap_session
+
+def probe_mailbox():
+
+    # Getting the STATUS of the probe folder with a single command (no SELECT or SEARCH)
+
+    return get_imap_session().folder_status(PROBE_FOLDER, [b'UIDVALIDITY', b'UIDNEXT', b'MESSAGES'])
+
+def has_mailbox_changed(mailbox_status):
+
+    # Checking if anything arrived (or was removed) since the last completed cycle
+
+    return clss.UIDWatermark().has_folder_changed(PROBE_FOLDER, mailbox_status)
+
+def record_mailbox_status(mailbox_status):
+
+    # Recording the STATUS probed at the start of a cycle once the cycle is completed
+
+    clss.UIDWatermark().record_folder_status(PROBE_FOLDER, mailbox_status)
+
+    return None
+
+def update_mysql_database(fetch_type, number_of_emails_per_station, attachment_only = False):
+
+    # Returns True if new emails were added to the MySQL database
+
+    # Only asking for the emails after the last processed UIDs
+    watermark = clss.UIDWatermark()
+
+    # Keeping a local copy of every fetched email
+    raw_message_store = clss.RawMessageStore()
+
+    # Skipping the emails that could not be parsed before
+    quarantine_ledger = clss.QuarantineLedger()
+
+    # Skipping the transmissions (MOMSNs) that were already processed
+    momsn_tracker = get_momsn_tracker()
 
     # Getting the latest email data frame
-    email_client = clss.email_client.EmailClient()
-    email_client.fetch_uids(fetch_type, number_of_emails_per_station)
+    email_client = clss.email_client.EmailClient(get_imap_session(), raw_message_store,
+                                                 quarantine_ledger = quarantine_ledger)
+    email_client.fetch_uids(fetch_type, number_of_emails_per_station, watermark)
+
+    if email_client.email_info != {}:
+        email_client.drop_duplicate_emails(momsn_tracker)
     
-    if email_client.email_info == {}: # No fetched UIDS
-        return None # Leave the function
+    if email_client.email_info != {}:
+        if attachment_only: # Only downloading the text part and the .sbd attachment
+            email_client.fetch_emails_attachments()
+        else:
+            email_client.fetch_emails_text()
+        email_client.parse_emails_text()
+
+    raw_message_store.close()
+    quarantine_ledger.close()
+
+    if email_client.email_info == {}: # No fetched UIDS (or all of them duplicated/quarantined)
+        watermark.commit() # Keeping track of any UIDVALIDITY change
+        email_client.archive_processed_emails() # Duplicates
+        return False # Leave the function
+
+    add_email_info_to_mysql(email_client.email_info)
+
+    # Data is safely in MySQL, now the watermark and the MOMSNs can move forward
+    watermark.commit()
+    email_client.stage_momsns(momsn_tracker)
+    momsn_tracker.commit()
+
+    # And the processed emails can leave the INBOX
+    email_client.archive_processed_emails()
+
+    return True
+
+def refetch_missing_emails():
+
+    # Fetching only the emails of the MOMSNs missing from each station's sequence,
+    # returns True if any of them were added to the MySQL database
+
+    momsn_tracker = get_momsn_tracker()
+    raw_message_store = clss.RawMessageStore()
+    quarantine_ledger = clss.QuarantineLedger()
+
+    email_client = clss.email_client.EmailClient(get_imap_session(), raw_message_store,
+                                                 quarantine_ledger = quarantine_ledger)
+    email_client.fetch_missing_uids(momsn_tracker)
+    momsn_tracker.commit() # Counting the searches
+
+    if email_client.email_info != {}:
+        email_client.drop_duplicate_emails(momsn_tracker)
+
+    if email_client.email_info != {}:
+        email_client.fetch_emails_text()
+        email_client.parse_emails_text()
+
+    raw_message_store.close()
+    quarantine_ledger.close()
+
+    if email_client.email_info == {}: # No missing emails found
+        return False
+
+    add_email_info_to_mysql(email_client.email_info)
+
+    email_client.stage_momsns(momsn_tracker)
+    momsn_tracker.commit()
+
+    return True
+
+def reparse_stored_emails(fetch_type = "All", number_of_emails_per_station = 1):
+
+    # Parsing the locally stored emails again (after a parser fix) without using IMAP,
+    # including the ones stored before a UIDVALIDITY change of the folder
+
+    raw_message_store = clss.RawMessageStore()
+    quarantine_ledger = clss.QuarantineLedger()
+
+    folder = clss.email_client.get_fetch_folder(fetch_type)
+
+    for uidvalidity in raw_message_store.uidvalidities(folder):
+
+        email_client = clss.email_client.EmailClient(raw_message_store = raw_message_store, offline = True,
+                                                     quarantine_ledger = quarantine_ledger)
+        email_client.fetch_uids(fetch_type, number_of_emails_per_station, uidvalidity = uidvalidity)
+
+        if email_client.email_info != {}:
+            email_client.fetch_emails_text()
+            email_client.parse_emails_text()
+
+        if email_client.email_info != {}: # Not everything was quarantined
+            add_email_info_to_mysql(email_client.email_info)
+
+    raw_message_store.close()
+    quarantine_ledger.close()
+
+    return None
+
+def replay_quarantined_emails(locations = None):
+
+    """
+    Parsing the quarantined emails (or only the given (folder, uidvalidity, uid)
+    locations) again from the RawMessageStore, after a parser fix for example.
+    The emails that are parsed now are added to MySQL and only then released
+    from the QuarantineLedger; the ones that still fail stay quarantined.
+    """
+
+    raw_message_store = clss.RawMessageStore()
+    quarantine_ledger = clss.QuarantineLedger()
+
+    # Grouping the quarantined emails by their location and station
+    folder_station_uids = {}
+
+    for entry in quarantine_ledger.entries():
+        if locations is None or (entry["folder"], entry["uidvalidity"], entry["uid"]) in locations:
+            folder = (entry["folder"], entry["uidvalidity"])
+            folder_station_uids.setdefault(folder, {}).setdefault(entry["station_email"], []).append(entry["uid"])
+
+    for (folder, uidvalidity), station_uids in folder_station_uids.items():
+
+        # Without the ledger, the quarantined hashes are not skipped and the failures are only printed
+        email_client = clss.email_client.EmailClient(raw_message_store = raw_message_store, offline = True)
+        email_client.load_uids(folder, uidvalidity, station_uids)
+        email_client.fetch_emails_text()
+        email_client.parse_emails_text()
+
+        replayed_uids = [uid for uid_content in email_client.email_info.values() for uid in uid_content.keys()]
+        print("REPLAYED {} OF {} EMAILS FROM {}".format(len(replayed_uids), len(sum(station_uids.values(), [])), folder))
+
+        if email_client.email_info != {}:
+            add_email_info_to_mysql(email_client.email_info)
+
+            # The emails are safely in MySQL, now they can leave the quarantine
+            quarantine_ledger.release(folder, uidvalidity, replayed_uids)
+
+    raw_message_store.close()
+    quarantine_ledger.close()
+
+    return None
+
+def backfill_mysql_database(window_size = 2000, workers = None, connections = None, attachment_only = False):
+
+    """
+    Importing the entire history of the stations' emails into MySQL, going through
+    the All Mail folder in windows of window_size UIDs. Each window is fetched,
+    parsed (with workers processes, if given) and committed to MySQL before the
+    next one, and then recorded in a checkpoint. Memory stays the same no matter
+    how many years of emails are imported, and an interrupted backfill continues
+    after the last committed window when it is run again. If connections is given,
+    each window is downloaded over that many IMAP connections at the same time.
+    With attachment_only, only the text part and the .sbd attachment of the
+    emails are downloaded (see EmailClient.fetch_emails_attachments) over the
+    main IMAP connection.
+    """
+
+    checkpoint = clss.UIDWatermark(os.path.join(LOCAL_DATA_PATH, "backfill_checkpoint.json"))
+    raw_message_store = clss.RawMessageStore()
+    quarantine_ledger = clss.QuarantineLedger()
 
-    email_client.fetch_emails_text()
-    email_client.parse_emails_text()
+    email_client = clss.email_client.EmailClient(get_imap_session(), raw_message_store,
+                                                 quarantine_ledger = quarantine_ledger)
+
+    parallel_fetcher = None
+    if connections is not None:
+        parallel_fetcher = clss.ParallelFetcher(connections)
+
+    for window_end in email_client.iter_uid_windows(window_size, checkpoint):
+
+        if email_client.email_info != {}:
+            if attachment_only:
+                email_client.fetch_emails_attachments()
+            else:
+                email_client.fetch_emails_text(parallel_fetcher = parallel_fetcher)
+            email_client.parse_emails_text(workers)
+
+        if email_client.email_info != {}: # Not everything was quarantined
+            add_email_info_to_mysql(email_client.email_info)
+
+        # Everything up to the window's last UID is now in MySQL
+        for water_station in gv.STATION_INFO:
+            checkpoint.stage(email_client.folder, water_station["email"], window_end)
+        checkpoint.commit()
+
+        print("BACKFILLED UP TO UID {}".format(window_end))
+
+    if parallel_fetcher is not None:
+        parallel_fetcher.close()
+
+    raw_message_store.close()
+    quarantine_ledger.close()
+
+    return None
+
+def add_email_info_to_mysql(email_info):
 
     # Testing DataFrame Handler
-    dataframe_handler = clss.DataFrameHandler(email_client.email_info)
+    dataframe_handler = clss.DataFrameHandler(email_info)
 
     # MySQL Integration
     mysql_client = clss.mysql_client.MySQLClient()
-    mysql_client.fetch_data(limit="None")
 
-    # Testing DataFrame Handler
-    dataframe_handler.trim_to_only_new_entries(mysql_client.mysql_table_df)
-    mysql_client.add_entries(dataframe_handler.all_emails_df)
+    # Only keeping the entries that are not in MySQL yet, without downloading the tables
+    entry_index = get_entry_index(mysql_client)
+    dataframe_handler.trim_to_only_new_entries(entry_index)
+
+    mysql_client.add_entries(dataframe_handler.all_emails_entries)
+    entry_index.add_entries(dataframe_handler.all_emails_entries)
+
+    # Keeping the recent entries used by the data files up to date
+    if station_state_store is not None:
+        station_state_store.add_entries(dataframe_handler.all_emails_entries)
 
     mysql_client.close()
 
     return None
 
-def generate_table_file():
+def get_entry_index(mysql_client):
 
-    # Fetching the last values of each table
-    mysql_client = clss.mysql_client.MySQLClient()
-    mysql_client.fetch_data(limit=1)
+    # Loading the time_ids already in MySQL only once, then keeping them up to date between cycles
+
+    global entry_index
+
+    if entry_index is None:
+        entry_index = clss.EntryIndex()
+
+    entry_index.load(mysql_client)
 
-    # Creating new dataframe with these values and creating a CSV file
-    datafile_generator = clss.DatafileGenerator()
-    datafile_generator.generate_latest_data_table(mysql_client.mysql_table_df)
+    return entry_index
+
+def get_station_state_store():
+
+    # Loading the stations' recent entries from MySQL only once, then they are kept up to date by the ingest
+
+    global station_state_store
+
+    if station_state_store is None:
+        station_state_store = clss.StationStateStore()
+
+    if not station_state_store.loaded:
+        mysql_client = clss.mysql_client.MySQLClient()
+        station_state_store.load(mysql_client)
+        mysql_client.close()
+
+    return station_state_store
+
+def generate_table_file():
+
+    # Creating the CSV file with the latest values of each station
+    datafile_generator = clss.DatafileGenerator(get_station_state_store())
+    datafile_generator.generate_latest_data_table()
 
     return None
 
 def generate_plot_file(size):
 
-    # Fetching the last 30 values of each table
+    station_state_store = get_station_state_store()
+
+    # Creating JPGs -> PDF plots of each station 
+    datafile_generator = clss.DatafileGenerator(station_state_store)
+
+    if size <= station_state_store.capacity:
+        datafile_generator.generate_plots(size = size)
+        return None
+
+    # Fetching the last values of each table, more than the store keeps
     mysql_client = clss.mysql_client.MySQLClient()
     mysql_client.fetch_data(limit=size)
+    mysql_client.close()
 
-    # Creating JPGs -> PDF plots of each station 
-    datafile_generator = clss.DatafileGenerator()
     datafile_generator.generate_plots(mysql_client.mysql_table_df)
 
     return None
 
 def generate_markers_file():
 
-    # Fetching the last 30 values of each table
-    mysql_client = clss.mysql_client.MySQLClient()
-    mysql_client.fetch_data(limit=1)
+    # Creating the CSV file with the location of each station
+    datafile_generator = clss.DatafileGenerator(get_station_state_store())
+    datafile_generator.generate_station_markers()
 
-    # Creating JPGs -> PDF plots of each station 
-    datafile_generator = clss.DatafileGenerator()
-    datafile_generator.generate_station_markers(mysql_client.mysql_table_df)
+    return None
+
+def get_polling_delay(new_data = False):
+
+    """
+    Getting the delay (seconds) until the next cycle from the PollingScheduler.
+    The scheduler is seeded with the stations' recent time_ids of the
+    StationStateStore when it is created, then their latest time_ids are only
+    read when new data was added during the cycle.
+    """
+
+    global polling_scheduler
+
+    if polling_scheduler is None:
+        polling_scheduler = clss.PollingScheduler()
+        polling_scheduler.seed(get_station_state_store().get_time_ids())
+
+    elif new_data:
+        polling_scheduler.update(get_station_state_store().get_latest_time_ids())
+
+    return polling_scheduler.get_polling_delay()
+
+def get_momsn_tracker():
+
+    # Loading the MOMSN tracker only once, so the email cycles and the RockBLOCKReceiver share it
+
+    global momsn_tracker
+
+    if momsn_tracker is None:
+        momsn_tracker = clss.MOMSNTracker()
+
+    return momsn_tracker
+
+def start_rockblock_receiver():
+
+    # Receiving the RockBLOCK HTTP POSTs in background threads, alongside the email cycles
+
+    global rockblock_receiver
+
+    if rockblock_receiver is None:
+        rockblock_receiver = clss.RockBLOCKReceiver(momsn_tracker = get_momsn_tracker())
+        rockblock_receiver.start()
+
+    return rockblock_receiver
+
+def has_received_new_data():
+
+    # Checking (and clearing) if the RockBLOCKReceiver ingested messages since the last check
+
+    if rockblock_receiver is None or not rockblock_receiver.new_data.is_set():
+        return False
+
+    rockblock_receiver.new_data.clear()
+
+    return True
+
+def get_received_data_event():
+
+    # Event set by the RockBLOCKReceiver when it ingests messages, None without the receiver
+
+    if rockblock_receiver is None:
+        return None
+
+    return rockblock_receiver.new_data
+
+def sleep_until_next_poll(polling_delay):
+
+    # Sleeping for the polling delay, waking up early if the RockBLOCKReceiver ingests messages
+
+    received_data_event = get_received_data_event()
+
+    if received_data_event is None:
+        time.sleep(polling_delay)
+    else:
+        received_data_event.wait(polling_delay)
 
     return None
 
+def wait_for_new_emails(timeout, polling_delay):
+
+    """
+    Waiting with IMAP IDLE until a station email arrives or until the timeout
+    runs out. The IDLE connection is kept open between cycles and is recreated
+    if anything goes wrong with it. Without IDLE support on the server, this
+    sleeps for the polling delay instead. The wait also ends when the
+    RockBLOCKReceiver ingests messages.
+    """
+
+    global mailbox_watcher
+
+    if mailbox_watcher is None:
+        mailbox_watcher = clss.MailboxWatcher("INBOX")
+
+    try:
+        new_emails = mailbox_watcher.wait_for_new_emails(timeout, polling_delay, get_received_data_event())
+    except:
+        # Logging out of the broken connection before recreating it next time
+        try:
+            mailbox_watcher.close()
+        except Exception: # e.g. the connection is already gone
+            pass
+        mailbox_watcher = None
+        raise
+
+    return new_emails
+
 def upload_all_data_files():
 
     # Uploading all data files 